@@ -0,0 +1,236 @@
+"""
+Buffered ActivityLog writer.
+
+log_activity() queues entries in memory; a background thread inserts them
+with bulk_create once BATCH_SIZE entries are waiting or FLUSH_INTERVAL
+seconds have passed. Entries logged inside a transaction are queued only
+when it commits, as before. Strict entries (STRICT_ACTIONS or strict=True)
+are still written synchronously inside the caller's transaction.
+
+A failed insert is retried RETRIES times with exponential backoff, then the
+entries are inserted one at a time. Entries that still fail with a database
+error that may pass (a locked table, a lost connection) go back into the
+queue for the next batch; only entries the database rejects outright, or
+that cannot be written at shutdown, are given up, and each of those is
+logged in full at ERROR level.
+
+At exit flush() stops the writer thread, which first writes the batch it is
+collecting, and then writes whatever is left in the queue.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+
+from .metrics import activity_log_lost_total, activity_log_writes_total
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ACTIVITY_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE': 10000,
+    # Retries of a failed batch insert; the delay doubles after each one
+    'RETRIES': 3,
+    'RETRY_DELAY': 0.1,
+    'STRICT_ACTIONS': ['password_change'],
+}
+
+
+def get_activity_log_config():
+    config = dict(DEFAULT_ACTIVITY_LOG)
+    config.update(getattr(settings, 'ACTIVITY_LOG', {}))
+    return config
+
+
+# Errors that can pass on their own; entries failing with them are queued again
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+# Queued by flush(): the writer thread writes its batch and exits
+_STOP = object()
+
+
+class ActivityLogWriter:
+    def __init__(self, batch_size, flush_interval, max_queue, retries=3, retry_delay=0.1):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def enqueue(self, entry):
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Back-pressure instead of dropping audit entries
+            logger.warning("ActivityLog queue full, writing synchronously")
+            self._write([entry], requeue=False)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = None if not batch else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            if batch:
+                close_old_connections()
+                self._write(batch)
+        close_old_connections()
+
+    def _stop_thread(self, timeout):
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("ActivityLog queue full, not waiting for the writer thread")
+                return
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning(f"ActivityLog writer thread still busy after {timeout}s")
+            else:
+                self._thread = None
+
+    def flush(self, timeout=30):
+        """
+        Write everything logged so far: stop the writer thread, which writes
+        the batch it holds, then write what is left in the queue from the
+        calling thread. The next enqueue() starts a new thread.
+        """
+        self._stop_thread(timeout)
+        batch = []
+        while True:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                batch.append(entry)
+        for start in range(0, len(batch), self.batch_size):
+            # Nothing would pick requeued entries up at shutdown
+            self._write(batch[start:start + self.batch_size], requeue=False)
+
+    def _write(self, batch, requeue=True):
+        """Insert batch; returns the entries written"""
+        with self._flush_lock:
+            delay = self.retry_delay
+            for attempt in range(self.retries + 1):
+                try:
+                    ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+                except Exception as e:
+                    logger.warning(f"Failed to write {len(batch)} activity log entries "
+                                   f"(attempt {attempt + 1}): {str(e)}")
+                    close_old_connections()
+                    if attempt < self.retries:
+                        time.sleep(delay)
+                        delay *= 2
+                else:
+                    # bulk_create sends no post_save, which counts the single inserts
+                    for entry in batch:
+                        activity_log_writes_total.inc(action=entry.action)
+                    return batch
+            return self._write_each(batch, requeue)
+
+    def _write_each(self, batch, requeue):
+        written = []
+        for entry in batch:
+            try:
+                entry.save(force_insert=True)
+            except TRANSIENT_ERRORS as e:
+                if requeue and self._requeue(entry):
+                    continue
+                self._lose(entry, e)
+            except Exception as e:
+                self._lose(entry, e)
+            else:
+                written.append(entry)
+        return written
+
+    def _requeue(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            return False
+        return True
+
+    @staticmethod
+    def _lose(entry, error):
+        activity_log_lost_total.inc(action=entry.action)
+        logger.error(
+            f"Lost activity log entry ({str(error)}): user={entry.user_id} action={entry.action} "
+            f"timestamp={entry.timestamp.isoformat()} content_type={entry.content_type_id} "
+            f"object_id={entry.object_id} ip={entry.ip_address} description={entry.description!r}"
+        )
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = get_activity_log_config()
+                _writer = ActivityLogWriter(
+                    config['BATCH_SIZE'], config['FLUSH_INTERVAL'], config['MAX_QUEUE'],
+                    config['RETRIES'], config['RETRY_DELAY'],
+                )
+                atexit.register(_writer.flush)
+    return _writer
+
+
+def flush_activity_logs():
+    if _writer is not None:
+        _writer.flush()
+
+
+def log_activity(strict=False, **fields):
+    """
+    Record an ActivityLog entry. Takes the same keyword arguments as
+    ActivityLog.objects.create(); returns the entry (unsaved when buffered).
+    """
+    config = get_activity_log_config()
+    if strict or not config['ASYNC'] or fields.get('action') in config['STRICT_ACTIONS']:
+        return ActivityLog.objects.create(**fields)
+
+    # Stamp the entry now; the row may be inserted a little later
+    fields.setdefault('timestamp', timezone.now())
+    entry = ActivityLog(**fields)
+    writer = get_writer()
+    transaction.on_commit(lambda: writer.enqueue(entry))
+    return entry
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
 from .models import (
     UserProfile, Flat, TenantRequest, Vehicle, Complaint,
-    MaintenanceBill, CameraAccessRequest, Notification
+    MaintenanceBill, CameraAccessRequest, Notification, OutboxMessage
 )
+from .inbox import announce_notification
+from .outbox import enqueue_notification
 
 
 @admin.register(UserProfile)
@@ -138,10 +141,31 @@ class CameraAccessRequestAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('title', 'priority', 'created_by', 'created_at')
-    list_filter = ('priority', 'created_at')
+    list_display = ('title', 'priority', 'audience', 'audience_building', 'audience_floor', 'created_by', 'created_at')
+    list_filter = ('priority', 'audience', 'created_at')
     search_fields = ('title', 'message', 'created_by__username')
     list_select_related = ('created_by',)  # Performance boost
     list_per_page = 25  # Pagination
     raw_id_fields = ('created_by',)  # Faster than dropdown
-    filter_horizontal = ('recipients', 'read_by')
+    filter_horizontal = ('recipients',)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        notification = form.instance
+        if change:
+            return
+        # The admin saves inside one transaction: the messages commit with the notification
+        if notification.send_email or notification.send_sms:
+            enqueue_notification(notification)
+        transaction.on_commit(lambda: announce_notification(notification))
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('notification', 'channel', 'address', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('address', 'notification__title')
+    list_select_related = ('notification',)  # Performance boost
+    list_per_page = 25  # Pagination
+    raw_id_fields = ('notification', 'user')  # Faster than dropdown
+    readonly_fields = ('claim', 'locked_until', 'last_error', 'created_at', 'sent_at')
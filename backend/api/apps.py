@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.core import checks
+        from . import signals  # noqa: F401
+        from .response_cache import check_response_cache
+        checks.register(check_response_cache, checks.Tags.caches)
+        from .metrics import registry, start_process_flusher
+        from .performance import install_serializer_timing
+        install_serializer_timing()
+        start_process_flusher(registry)
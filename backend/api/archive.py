@@ -0,0 +1,250 @@
+"""
+ActivityLog retention and archival.
+
+archive_activity_logs() keeps the last HOT_DAYS of ActivityLog rows in the
+database and moves older rows, in (timestamp, id) order and in chunks, into
+one gzip-compressed JSONL segment per month. Each chunk is appended as a new
+gzip member, so segments are never rewritten. manifest.json records per
+segment the row count, time range, user ids and actions, which lets
+query_archive() skip segments that cannot match.
+
+Before a chunk is appended, the manifest records the size of every segment
+it is about to grow ("pending"); a run interrupted while appending truncates
+those segments back to the recorded sizes on resume and writes the chunk
+again, so a half-written or unrecorded member never duplicates rows. Once the
+chunk is in its segments, the manifest records its ids ("appended") together
+with the segment statistics, and a run interrupted before deleting them
+resumes by deleting those rows without writing them again. Every other row is
+written before it is deleted, including rows inserted late with an older
+timestamp (the buffered writer of api.activity stamps entries when they are
+logged), so nothing leaves the database without being archived.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ACTIVITY_LOG_RETENTION = {
+    'HOT_DAYS': 90,
+    'CHUNK_SIZE': 5000,
+    'ARCHIVE_DIR': None,    # defaults to BASE_DIR / 'archive' / 'activity_logs'
+}
+
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'action', 'description', 'ip_address', 'user_agent',
+    'content_type_id', 'object_id', 'timestamp',
+]
+
+
+class ArchiveLocked(Exception):
+    pass
+
+
+def get_retention_config():
+    config = dict(DEFAULT_ACTIVITY_LOG_RETENTION)
+    config.update(getattr(settings, 'ACTIVITY_LOG_RETENTION', {}))
+    if config['ARCHIVE_DIR'] is None:
+        config['ARCHIVE_DIR'] = settings.BASE_DIR / 'archive' / 'activity_logs'
+    config['ARCHIVE_DIR'] = Path(config['ARCHIVE_DIR'])
+    return config
+
+
+class ActivityLogArchive:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / 'manifest.json'
+
+    def load_manifest(self):
+        if not self.manifest_path.exists():
+            return {'appended': [], 'segments': {}}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        # Manifests of earlier versions kept a (timestamp, id) watermark instead
+        manifest.pop('watermark', None)
+        manifest.setdefault('appended', [])
+        return manifest
+
+    def save_manifest(self, manifest):
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def recover(self, manifest):
+        """Truncate segments grown by an interrupted append back to their recorded sizes"""
+        pending = manifest.pop('pending', None)
+        if not pending:
+            return
+        for month, size in pending.items():
+            path = self.segment_path(month)
+            if not path.exists():
+                continue
+            if size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+                    os.fsync(f.fileno())
+            else:
+                os.remove(path)
+            logger.warning(f"Truncated {path.name} to {size} bytes after an interrupted archive run")
+        self.save_manifest(manifest)
+
+    def segment_path(self, month):
+        return self.directory / f'{month}.jsonl.gz'
+
+    def segment_size(self, month):
+        path = self.segment_path(month)
+        return path.stat().st_size if path.exists() else 0
+
+    def lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / '.lock'
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise ArchiveLocked(f'{path} exists; another archive run is active or a previous run crashed')
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return path
+
+    def append(self, manifest, month, rows):
+        """Append rows as a new gzip member of the month's segment and update its manifest entry"""
+        path = self.segment_path(month)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for row in rows:
+                    f.write(json.dumps(row, separators=(',', ':')).encode() + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        segment = manifest['segments'].setdefault(month, {
+            'file': path.name, 'rows': 0, 'start': None, 'end': None, 'users': [], 'actions': [],
+        })
+        segment['rows'] += len(rows)
+        timestamps = [row['timestamp'] for row in rows]
+        segment['start'] = min([ts for ts in timestamps + [segment['start']] if ts])
+        segment['end'] = max([ts for ts in timestamps + [segment['end']] if ts])
+        segment['users'] = sorted(set(segment['users']) | {row['user_id'] for row in rows})
+        segment['actions'] = sorted(set(segment['actions']) | {row['action'] for row in rows})
+
+    def query(self, user_id=None, action=None, start=None, end=None, limit=100):
+        """Archived rows matching the filters, oldest first, without touching the database"""
+        manifest = self.load_manifest()
+        start_iso = _to_iso(start) if start else None
+        end_iso = _to_iso(end) if end else None
+        results = []
+        for month in sorted(manifest['segments']):
+            segment = manifest['segments'][month]
+            if start_iso and segment['end'] < start_iso:
+                continue
+            if end_iso and segment['start'] >= end_iso:
+                continue
+            if user_id is not None and user_id not in segment['users']:
+                continue
+            if action and action not in segment['actions']:
+                continue
+            with gzip.open(self.directory / segment['file'], 'rt') as f:
+                for line in f:
+                    row = json.loads(line)
+                    if user_id is not None and row['user_id'] != user_id:
+                        continue
+                    if action and row['action'] != action:
+                        continue
+                    if start_iso and row['timestamp'] < start_iso:
+                        continue
+                    if end_iso and row['timestamp'] >= end_iso:
+                        continue
+                    results.append(row)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+
+def _to_iso(value):
+    # Archived timestamps are UTC ISO strings, which compare in time order
+    return value.astimezone(dt_timezone.utc).isoformat(timespec='microseconds')
+
+
+def _serialize(row):
+    row = dict(row)
+    row['timestamp'] = _to_iso(row['timestamp'])
+    return row
+
+
+def archive_activity_logs(hot_days=None, chunk_size=None, now=None):
+    """Move ActivityLog rows older than hot_days into the archive; returns rows moved"""
+    config = get_retention_config()
+    hot_days = config['HOT_DAYS'] if hot_days is None else hot_days
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    cutoff = (now or timezone.now()) - timedelta(days=hot_days)
+
+    archive = ActivityLogArchive(config['ARCHIVE_DIR'])
+    lock_path = archive.lock()
+    moved = 0
+    try:
+        manifest = archive.load_manifest()
+        archive.recover(manifest)
+        while True:
+            rows = list(
+                ActivityLog.objects.filter(timestamp__lt=cutoff)
+                .order_by('timestamp', 'id')
+                .values(*ARCHIVE_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+
+            # Appended by a run interrupted before it could delete them
+            appended = set(manifest['appended'])
+            pending = [_serialize(row) for row in rows if row['id'] not in appended]
+
+            by_month = {}
+            for row in pending:
+                by_month.setdefault(row['timestamp'][:7], []).append(row)
+            if by_month:
+                manifest['pending'] = {month: archive.segment_size(month) for month in by_month}
+                archive.save_manifest(manifest)
+            for month, month_rows in by_month.items():
+                archive.append(manifest, month, month_rows)
+            # Every row of the chunk is in a segment now; the statistics and ids are saved together
+            manifest.pop('pending', None)
+            manifest['appended'] = [row['id'] for row in rows]
+            archive.save_manifest(manifest)
+
+            with transaction.atomic():
+                ActivityLog.objects.filter(pk__in=manifest['appended']).delete()
+            manifest['appended'] = []
+            archive.save_manifest(manifest)
+            moved += len(rows)
+            logger.info(f"Archived {len(rows)} activity log rows (total {moved})")
+    finally:
+        os.remove(lock_path)
+    return moved
+
+
+def query_archive(**filters):
+    return ActivityLogArchive(get_retention_config()['ARCHIVE_DIR']).query(**filters)
+
+
+def parse_time_filter(value):
+    """Accept ISO datetimes or dates from query strings"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed = datetime.fromisoformat(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
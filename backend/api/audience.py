@@ -0,0 +1,76 @@
+"""
+Notification audiences.
+
+A notification names a rule rather than a list of recipients: audience picks
+the role (everyone, owners, tenants, or the explicit recipients of 'users'),
+and audience_building / audience_floor optionally narrow it to the residents
+of one building and/or floor. Sending a broadcast therefore writes one row
+however many residents there are.
+
+notification_audience_q(user) resolves the rules for one user at query time:
+one query reads the buildings and floors of the user's flats, and the result
+is a Q over the indexed audience columns plus an EXISTS probe of the recipient
+table for 'users' notifications. No join or DISTINCT is needed.
+
+notification_audience_users(notification) goes the other way, for delivery
+(api.outbox): the active users a notification is addressed to.
+audience_includes() applies the rules in Python, for the event streams.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Flat, Notification
+
+
+def user_places(user):
+    """{(building, floor, role)} for the flats the user owns ('owners') or rents ('tenants')"""
+    rows = Flat.objects.filter(Q(owner=user) | Q(tenants=user)).values_list('building', 'floor', 'owner_id')
+    return {(building, floor, 'owners' if owner_id == user.pk else 'tenants') for building, floor, owner_id in rows}
+
+
+def notification_audience_q(user):
+    """Notifications whose audience includes user"""
+    places = user_places(user)
+    recipients = Notification.recipients.through.objects.filter(notification_id=OuterRef('pk'), user_id=user.pk)
+    condition = Q(audience='users') & Q(Exists(recipients))
+    condition |= Q(audience='all', audience_building='', audience_floor__isnull=True)
+    # Each flat matches its role or everyone, society-wide or narrowed to its building/floor
+    for building, floor, role in sorted(places, key=str):
+        floor_matches = Q(audience_floor__isnull=True) if floor is None else \
+            Q(audience_floor__isnull=True) | Q(audience_floor=floor)
+        condition |= Q(audience__in=['all', role], audience_building__in=['', building]) & floor_matches
+    return condition
+
+
+def audience_includes(rules, user, places):
+    """Whether the (audience, building, floor, recipient ids) rules of a notification include user"""
+    audience, building, floor, recipients = rules
+    if audience == 'users':
+        return user.pk in recipients
+    if audience == 'all' and not building and floor is None:
+        return True
+    return any(
+        audience in ('all', role) and building in ('', place_building) and floor in (None, place_floor)
+        for place_building, place_floor, role in places
+    )
+
+
+def notification_audience_users(notification):
+    """Active users whose audience rules include notification"""
+    users = User.objects.filter(is_active=True)
+    if notification.audience == 'users':
+        return users.filter(notifications=notification)
+    if notification.audience == 'all' and not notification.audience_building and notification.audience_floor is None:
+        return users
+
+    flats = Flat.objects.all()
+    if notification.audience_building:
+        flats = flats.filter(building=notification.audience_building)
+    if notification.audience_floor is not None:
+        flats = flats.filter(floor=notification.audience_floor)
+    condition = Q()
+    if notification.audience in ('all', 'owners'):
+        condition |= Q(pk__in=flats.values('owner_id'))
+    if notification.audience in ('all', 'tenants'):
+        condition |= Q(pk__in=Flat.tenants.through.objects.filter(flat__in=flats).values('user_id'))
+    return users.filter(condition)
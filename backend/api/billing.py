@@ -0,0 +1,159 @@
+"""
+Monthly bill generation.
+
+generate_bills() creates one month's bills for every flat of a queryset from
+billing rules, one rule per bill type: a flat amount, or a rate per square
+foot of Flat.area_sqft. Flats are read in chunks of BATCH_SIZE and each chunk
+is written with bulk_create in its own transaction, so a run over 10,000
+flats takes a few dozen queries rather than one request per bill.
+
+Runs are idempotent: bills that already exist for a (flat, month, year,
+bill_type) are left as they are, so a repeated run only fills the gaps. A
+chunk that conflicts with bills a concurrent run inserted since it was read
+is inserted again row by row, skipping those, so each run counts exactly
+the bills it created.
+bulk_create bypasses the model signals, so the run applies the rollup deltas,
+moves the MaintenanceBill version and refreshes the admin dashboard itself,
+and records one ActivityLog entry for the whole run.
+"""
+import calendar
+import logging
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .activity import log_activity
+from .conditional import bump_version
+from .dashboard import invalidate_dashboard
+from .events import hub
+from .models import Flat, MaintenanceBill
+from .rollups import ENTITIES_BY_MODEL, apply_delta
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BILLING = {
+    'BATCH_SIZE': 1000,
+    # Day of the bill month the bills are due on, unless a run names a due date
+    'DUE_DAY': 10,
+}
+
+CENT = Decimal('0.01')
+
+
+def get_billing_config():
+    config = dict(DEFAULT_BILLING)
+    config.update(getattr(settings, 'BILLING', {}))
+    return config
+
+
+class BillingRule:
+    """How one bill type is charged: amount per flat, or rate per square foot"""
+
+    def __init__(self, bill_type, method, value, description=''):
+        self.bill_type = bill_type
+        self.method = method
+        self.value = Decimal(value)
+        self.description = description
+
+    def amount_for(self, area_sqft):
+        """The bill amount for a flat of area_sqft, or None when the rule cannot price it"""
+        if self.method == 'flat':
+            return self.value
+        if not area_sqft:
+            return None
+        return (self.value * area_sqft).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def default_due_date(month, year):
+    day = min(get_billing_config()['DUE_DAY'], calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def _bills_created(entity, count):
+    bump_version(MaintenanceBill)
+    invalidate_dashboard()
+    hub.publish('admin', 'stats.changed', {'entity': entity.name, 'changes': [{'status': 'unpaid', 'delta': count}]})
+
+
+def _insert_bills(bills):
+    """Insert bills, skipping those another run has inserted meanwhile; returns how many were inserted"""
+    try:
+        with transaction.atomic():
+            MaintenanceBill.objects.bulk_create(bills)
+        return len(bills)
+    except IntegrityError:
+        pass
+    inserted = 0
+    for bill in bills:
+        try:
+            with transaction.atomic():
+                MaintenanceBill.objects.bulk_create([bill])
+            inserted += 1
+        except IntegrityError:
+            pass
+    return inserted
+
+
+def generate_bills(month, year, rules, user, flats=None, due_date=None, batch_size=None):
+    """
+    Create the bills of month/year that do not exist yet for flats (default:
+    all flats) and log the run as user. Returns a summary: bills created,
+    bills that already existed and bills a per_sqft rule could not price
+    (flats without area_sqft).
+    """
+    batch_size = batch_size or get_billing_config()['BATCH_SIZE']
+    due_date = due_date or default_due_date(month, year)
+    flats = (Flat.objects.all() if flats is None else flats).order_by('pk')
+    bill_types = [rule.bill_type for rule in rules]
+    entity = ENTITIES_BY_MODEL[MaintenanceBill]
+    summary = {'created': 0, 'existing': 0, 'unpriced': 0}
+
+    last_pk = 0
+    while True:
+        # Keyset chunks: each chunk commits before the next is read
+        chunk = list(flats.filter(pk__gt=last_pk).values_list('pk', 'area_sqft')[:batch_size])
+        if not chunk:
+            break
+        flat_ids = [pk for pk, area_sqft in chunk]
+        last_pk = flat_ids[-1]
+        period = MaintenanceBill.objects.filter(
+            flat_id__in=flat_ids, bill_month=month, bill_year=year, bill_type__in=bill_types,
+        )
+        existing = set(period.values_list('flat_id', 'bill_type'))
+        bills = []
+        for flat_id, area_sqft in chunk:
+            for rule in rules:
+                if (flat_id, rule.bill_type) in existing:
+                    continue
+                amount = rule.amount_for(area_sqft)
+                if amount is None:
+                    summary['unpriced'] += 1
+                    continue
+                bills.append(MaintenanceBill(
+                    flat_id=flat_id, bill_type=rule.bill_type, bill_month=month, bill_year=year,
+                    amount=amount, due_date=due_date, description=rule.description,
+                ))
+
+        with transaction.atomic():
+            # Another run may have created some of them since the SELECT above
+            created = _insert_bills(bills) if bills else 0
+            if created:
+                apply_delta(entity.name, timezone.localdate(), 'unpaid', created)
+                transaction.on_commit(lambda created=created: _bills_created(entity, created))
+        summary['created'] += created
+        summary['existing'] += len(existing) + len(bills) - created
+
+    log_activity(
+        user=user,
+        action='create',
+        description=(
+            f"Generated {summary['created']} bills ({', '.join(bill_types)}) for {month:02d}/{year}: "
+            f"{summary['existing']} already existed, {summary['unpriced']} skipped for flats without area"
+        ),
+    )
+    logger.info(f"Billing run {month:02d}/{year} by {user.username}: {summary}")
+    return summary
@@ -0,0 +1,213 @@
+"""
+Conditional GET for list and detail endpoints.
+
+ConditionalGetMixin sends ETag and Last-Modified on list/retrieve responses
+and answers If-None-Match / If-Modified-Since with 304 Not Modified before
+anything is serialized. The validator is built from one aggregate over the
+filtered queryset (row count and newest timestamp, see TIMESTAMP_FIELDS) and
+from a version per model kept in the cache. The receivers that
+track_changes() connects move a model's version forward after every committed
+save, delete or many-to-many change, which covers what the aggregate cannot
+see: deleted rows, edits to related rows the response renders, votes and read
+marks. The ETag also covers the requesting user, the full path (page,
+filters, ?fields=), the negotiated media type and the current date, so a
+validator only ever matches the same response.
+
+Rows that belong to one user and only show in that user's responses (read
+marks) are tracked with track_changes(..., user_field=...): a change moves
+that user's version of the model, and views list the model in
+user_response_dependencies, so one user's change leaves everyone else's
+validators and cached responses alone.
+
+Versions bumped in one process only reach the others through a shared cache
+backend; with a per-process cache, changes that only show up in the versions
+can be missed by the other processes.
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+DEFAULT_CONDITIONAL_GET = {
+    'ENABLED': True,
+}
+
+# First field found on a model is its change timestamp
+TIMESTAMP_FIELDS = ('updated_at', 'requested_at', 'created_at', 'timestamp', 'date_joined')
+
+
+def get_conditional_get_config():
+    config = dict(DEFAULT_CONDITIONAL_GET)
+    config.update(getattr(settings, 'CONDITIONAL_GET', {}))
+    return config
+
+
+def version_cache_key(model, user_id=None):
+    key = f'model_version:{model._meta.label_lower}'
+    return key if user_id is None else f'{key}:user:{user_id}'
+
+
+def bump_version(model, user_id=None):
+    """Move the version of model forward; with user_id, only that user's version of it"""
+    cache.set(version_cache_key(model, user_id), time.time(), None)
+
+
+def get_versions(models, user_models=(), user_id=None):
+    """
+    {model label: time of its last tracked change}; user_models also get
+    an entry for user_id's own version of them (track_changes user_field)
+    """
+    keys = {version_cache_key(model): model._meta.label_lower for model in models}
+    for model in user_models:
+        keys[version_cache_key(model)] = model._meta.label_lower
+        keys[version_cache_key(model, user_id)] = f'{model._meta.label_lower}:user'
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Lost to a restart or eviction: start over from now, which no earlier validator contains
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update({key: cache.get(key, now) for key in missing})
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def _changed_user_ids(model, user_field, instance, action, pk_set):
+    """Users whose version of model a change moves, or None when it cannot tell"""
+    if action is None:
+        return {getattr(instance, model._meta.get_field(user_field).attname)}
+    # add()/remove() through model: from the user's side, or with the users in pk_set
+    if isinstance(instance, model._meta.get_field(user_field).related_model):
+        return {instance.pk}
+    return pk_set
+
+
+def _version_receiver(model, ignore_fields, user_field=None):
+    def receiver(sender, instance=None, raw=False, update_fields=None, action=None, pk_set=None, using=None, **kwargs):
+        if raw or (update_fields and ignore_fields.issuperset(update_fields)):
+            return
+        if action is not None and not action.startswith('post_'):
+            return
+        user_ids = None
+        if user_field is not None:
+            user_ids = _changed_user_ids(model, user_field, instance, action, pk_set)
+        if user_ids is None:
+            transaction.on_commit(lambda: bump_version(model), using=using)
+            return
+        for user_id in user_ids:
+            transaction.on_commit(lambda user_id=user_id: bump_version(model, user_id), using=using)
+    return receiver
+
+
+def track_changes(*models, ignore_fields=(), user_field=None):
+    """
+    Bump each model's version after saves, deletes and changes to its own
+    many-to-many fields. Saves that only write ignore_fields are skipped.
+    Many-to-many fields with a through model of their own count as changes to
+    that model instead, which is tracked separately. With user_field (a
+    foreign key to the user model) a change only moves the version of the
+    user it names; clear() through the model, which names no one, moves the
+    version of everyone.
+    """
+    ignore_fields = frozenset(ignore_fields)
+    for model in models:
+        receiver = _version_receiver(model, ignore_fields, user_field)
+        uid = f'track_changes:{model._meta.label_lower}'
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+        # add()/remove() through a relation that uses model as its through model
+        m2m_changed.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created:
+                m2m_changed.connect(receiver, sender=through, weak=False, dispatch_uid=f'{uid}:{field.name}')
+
+
+def timestamp_field(model):
+    for name in TIMESTAMP_FIELDS:
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        return name
+    return None
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin: ETag / Last-Modified on list and retrieve, 304 when the
+    client's copy is current. response_dependencies lists the other models
+    whose rows the response renders (nested users, flats, counts);
+    user_response_dependencies those tracked per user (read marks).
+    """
+    response_dependencies = ()
+    user_response_dependencies = ()
+
+    def get_conditional_aggregates(self, queryset):
+        """Aggregates over the filtered queryset covered by the validator; datetimes also set Last-Modified"""
+        aggregates = {'count': Count('pk')}
+        field = timestamp_field(queryset.model)
+        if field is not None:
+            aggregates['newest'] = Max(field)
+        return aggregates
+
+    def get_validators(self, queryset, stats):
+        request = self.request
+        versions = get_versions(
+            {queryset.model, *self.response_dependencies}, self.user_response_dependencies, request.user.pk,
+        )
+        today = timezone.localdate()
+        state = [
+            request.user.pk, request.get_full_path(), request.accepted_media_type, today.isoformat(),
+            sorted(versions.items()), sorted(stats.items()),
+        ]
+        etag = 'W/"%s"' % hashlib.sha1(json.dumps(state, default=str).encode()).hexdigest()
+        # Date-dependent fields (is_overdue) change at midnight
+        midnight = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        moments = [midnight.timestamp(), *versions.values()]
+        moments.extend(value.timestamp() for value in stats.values() if isinstance(value, datetime))
+        return etag, int(max(moments))
+
+    def conditional_response(self, queryset, respond, detail=False):
+        if not get_conditional_get_config()['ENABLED']:
+            return respond()
+        stats = queryset.order_by().aggregate(**self.get_conditional_aggregates(queryset))
+        if detail and not stats['count']:
+            # Missing objects are answered by retrieve()
+            return respond()
+        etag, last_modified = self.get_validators(queryset, stats)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        respond = lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)  # noqa: E731
+        return self.conditional_response(self.filter_queryset(self.get_queryset()), respond)
+
+    def retrieve(self, request, *args, **kwargs):
+        respond = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)  # noqa: E731
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            return respond()
+        return self.conditional_response(queryset, respond, detail=True)
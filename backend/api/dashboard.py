@@ -0,0 +1,110 @@
+"""
+Admin dashboard statistics.
+
+compute_dashboard() gathers the stats with one conditional-aggregation query
+per table (stat_counts() lists each table's counts); the monthly block is read from the StatRollup table. get_dashboard_snapshot() serves a
+cached copy that the receivers in api.signals drop whenever a counted model
+changes, and that otherwise expires after CACHE_TTL. Concurrent misses are
+coalesced: one thread per process recomputes, and across processes a cache
+lock lets a single process recompute while the others wait for its result.
+"""
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .metrics import record_cache_lookup
+from .models import ActivityLog, CameraAccessRequest, Complaint, Flat, MaintenanceBill, Notification, Vehicle
+from .rollups import month_totals
+from .serializers import ActivityLogSerializer
+
+
+DEFAULT_ADMIN_DASHBOARD = {
+    'CACHE_TTL': 30,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 5,
+}
+
+SNAPSHOT_KEY = 'admin_dashboard_snapshot'
+LOCK_KEY = 'admin_dashboard_snapshot_lock'
+
+_compute_lock = threading.Lock()
+
+
+def get_dashboard_config():
+    config = dict(DEFAULT_ADMIN_DASHBOARD)
+    config.update(getattr(settings, 'ADMIN_DASHBOARD', {}))
+    return config
+
+
+def stat_counts(now, today):
+    """[(model, {stat: filter})]: every stat of a table is one Count(filter=...) of a single aggregate query"""
+    return [
+        (User, {'total_users': Q(is_active=True)}),
+        (Flat, {'total_flats': None, 'occupied_flats': Q(is_occupied=True)}),
+        (Vehicle, {'total_vehicles': Q(is_active=True)}),
+        (Complaint, {'pending_complaints': Q(status__in=['open', 'in_progress'])}),
+        (MaintenanceBill, {'overdue_bills': Q(due_date__lt=today, status='unpaid')}),
+        (CameraAccessRequest, {'pending_camera_requests': Q(status='pending')}),
+        (Notification, {'active_notifications': Q(is_active=True, expires_at__gt=now)}),
+    ]
+
+
+def compute_dashboard():
+    now = timezone.now()
+    today = timezone.localdate(now)
+
+    stats = {}
+    for model, counts in stat_counts(now, today):
+        stats.update(model.objects.aggregate(**{name: Count('pk', filter=q) for name, q in counts.items()}))
+    this_month = month_totals(['user', 'complaint', 'bill'], today.replace(day=1))
+
+    recent_activities = ActivityLog.objects.select_related('user').order_by('-timestamp')[:10]
+
+    return {
+        'stats': stats,
+        'monthly_stats': {
+            'new_users_this_month': this_month['user'],
+            'complaints_this_month': this_month['complaint'],
+            'bills_generated_this_month': this_month['bill'],
+        },
+        'recent_activities': ActivityLogSerializer(recent_activities, many=True).data,
+    }
+
+
+def invalidate_dashboard():
+    cache.delete(SNAPSHOT_KEY)
+
+
+def get_dashboard_snapshot():
+    snapshot = cache.get(SNAPSHOT_KEY)
+    record_cache_lookup('admin_dashboard', snapshot is not None)
+    if snapshot is not None:
+        return snapshot
+
+    config = get_dashboard_config()
+    # Threads of this process queue here and reuse the first one's result
+    with _compute_lock:
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+
+        if cache.add(LOCK_KEY, 1, config['LOCK_TIMEOUT']):
+            try:
+                snapshot = compute_dashboard()
+                cache.set(SNAPSHOT_KEY, snapshot, config['CACHE_TTL'])
+            finally:
+                cache.delete(LOCK_KEY)
+            return snapshot
+
+        # Another process is recomputing; wait for it rather than piling on
+        deadline = time.monotonic() + config['WAIT_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            snapshot = cache.get(SNAPSHOT_KEY)
+            if snapshot is not None:
+                return snapshot
+        return compute_dashboard()
@@ -0,0 +1,172 @@
+"""
+In-process event fan-out for server-sent event streams.
+
+Model signals (running in worker threads) publish events to topics; each SSE
+client is a Subscription bound to the event loop of the ASGI server, with a
+bounded queue. Publishing never blocks: events are handed to the loop with
+call_soon_threadsafe, and a subscriber that falls behind loses its oldest
+events and is told to resync. Only events published in the same process are
+seen, so run the ASGI server as a single process per host or accept that
+each process streams its own writes.
+
+Streams need an ASGI server (`python server.py --asgi`): under WSGI a
+response never finishes until its iterator does, so the views answer 501
+instead of holding a worker thread forever. EventSource cannot send an
+Authorization header, so clients exchange their token for a short-lived
+signed ticket (issue_stream_ticket) and pass that as ?ticket=.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+
+DEFAULT_EVENT_STREAM = {
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE': 15,
+    'RETRY_MS': 5000,
+    # Seconds a stream ticket can be used to open a stream
+    'TICKET_MAX_AGE': 60,
+}
+
+TICKET_SALT = 'api.events.stream-ticket'
+
+
+def get_event_stream_config():
+    config = dict(DEFAULT_EVENT_STREAM)
+    config.update(getattr(settings, 'EVENT_STREAM', {}))
+    return config
+
+
+class Subscription:
+    def __init__(self, hub, topics, loop, maxsize):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _push(self, event):
+        # Runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.overflowed = True
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, topics, maxsize=None):
+        """Create a subscription on the running event loop"""
+        maxsize = maxsize or get_event_stream_config()['QUEUE_SIZE']
+        subscription = Subscription(self, topics, asyncio.get_running_loop(), maxsize)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def publish(self, topic, event_type, data):
+        """Send an event to every subscriber of topic; safe to call from any thread"""
+        with self._lock:
+            targets = [sub for sub in self._subscriptions if topic in sub.topics]
+        if not targets:
+            return None
+        event = {'id': next(self._ids), 'type': event_type, 'topic': topic, 'time': time.time(), 'data': data}
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, event)
+            except RuntimeError:
+                # Loop closed under us; the stream's finally block will unsubscribe
+                pass
+        return event
+
+    def publish_on_commit(self, topic, event_type, data):
+        if not self._subscriptions:
+            return
+        transaction.on_commit(lambda: self.publish(topic, event_type, data))
+
+
+hub = EventHub()
+
+
+def issue_stream_ticket(user):
+    """A signed ticket that opens streams as user for TICKET_MAX_AGE seconds, in any process"""
+    return signing.dumps({'user': user.pk}, salt=TICKET_SALT, compress=True)
+
+
+def stream_ticket_user_id(ticket):
+    """The user id of a valid ticket, otherwise None"""
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=get_event_stream_config()['TICKET_MAX_AGE'])['user']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    lines.extend(f'data: {line}' for line in payload.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+def _frame(event):
+    return format_sse(event['type'], event['data'], event['id'])
+
+
+async def stream_subscription(subscription, prelude=(), frame=_frame, poll=None, poll_interval=None):
+    """
+    Async iterator of SSE frames for a subscription; unsubscribes when the
+    client goes away. prelude frames are sent first; frame(event) renders an
+    event, or returns None to skip it. poll, if given, is awaited after
+    poll_interval seconds without events and returns frames to send, e.g.
+    changes made in another process.
+    """
+    config = get_event_stream_config()
+    timeout = min(config['KEEPALIVE'], poll_interval) if poll else config['KEEPALIVE']
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        for text in prelude:
+            yield text
+        while True:
+            try:
+                event = await subscription.get(timeout)
+            except asyncio.TimeoutError:
+                frames = await poll() if poll else []
+                for text in frames:
+                    yield text
+                if not frames:
+                    yield ': keepalive\n\n'
+                continue
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield format_sse('resync', {'reason': 'events dropped, reload the dashboard'})
+            text = frame(event)
+            if text is not None:
+                yield text
+    finally:
+        subscription.close()
@@ -0,0 +1,186 @@
+"""
+Notification expiry and archival.
+
+A notification past its expires_at is left out of residents' lists, inbox
+counts and streams by live_notifications_q(), evaluated in the query against
+the (is_active, expires_at) index. deactivate_expired_notifications() then
+sets is_active=False on those rows in batches, one UPDATE per creation day,
+so they also drop out of the plain is_active filters and the admin
+statistics.
+Run it on a schedule with `manage.py expire_notifications` (from cron, or
+with --every).
+
+With --archive, inactive notifications created more than ARCHIVE_AFTER_DAYS
+ago are written, together with their recipient ids and read marks, to one
+gzip-compressed JSONL segment per month under ARCHIVE_DIR and then deleted.
+Each batch is appended as a new gzip member before it is deleted; a run
+interrupted in between writes the batch again on the next run, so readers
+keep the last line of an id. Notifications with email or SMS still queued
+are kept until their delivery finishes.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .archive import ArchiveLocked, _to_iso
+from .conditional import bump_version
+from .dashboard import invalidate_dashboard
+from .events import hub
+from .models import Notification, NotificationRead, OutboxMessage
+from .rollups import ENTITIES_BY_MODEL, apply_delta
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_NOTIFICATION_EXPIRY = {
+    'BATCH_SIZE': 1000,
+    # Inactive notifications older than this are archived by --archive
+    'ARCHIVE_AFTER_DAYS': 180,
+    'ARCHIVE_DIR': None,    # defaults to BASE_DIR / 'archive' / 'notifications'
+}
+
+ARCHIVE_FIELDS = [
+    'id', 'title', 'message', 'notification_type', 'priority', 'audience', 'audience_building',
+    'audience_floor', 'created_by_id', 'is_active', 'send_email', 'send_sms', 'created_at', 'expires_at',
+]
+
+
+def get_expiry_config():
+    config = dict(DEFAULT_NOTIFICATION_EXPIRY)
+    config.update(getattr(settings, 'NOTIFICATION_EXPIRY', {}))
+    if config['ARCHIVE_DIR'] is None:
+        config['ARCHIVE_DIR'] = settings.BASE_DIR / 'archive' / 'notifications'
+    config['ARCHIVE_DIR'] = Path(config['ARCHIVE_DIR'])
+    return config
+
+
+def live_notifications_q(now=None):
+    """Active notifications that have not expired"""
+    return Q(is_active=True) & (Q(expires_at__isnull=True) | Q(expires_at__gt=now or timezone.now()))
+
+
+def _notifications_changed(entity, changes):
+    bump_version(Notification)
+    invalidate_dashboard()
+    hub.publish('admin', 'stats.changed', {
+        'entity': entity.name,
+        'changes': [{'status': status, 'delta': delta} for status, delta in changes],
+    })
+
+
+def deactivate_expired_notifications(batch_size=None, now=None):
+    """Set is_active=False on active notifications past expires_at; returns how many"""
+    batch_size = batch_size or get_expiry_config()['BATCH_SIZE']
+    now = now or timezone.now()
+    entity = ENTITIES_BY_MODEL[Notification]
+    # Walks the (is_active, expires_at) index
+    expired = Notification.objects.filter(is_active=True, expires_at__lte=now).order_by('expires_at')
+    deactivated = 0
+    while True:
+        with transaction.atomic():
+            rows = list(expired.select_for_update().values_list('pk', 'created_at')[:batch_size])
+            if not rows:
+                break
+            per_day = {}
+            for pk, created_at in rows:
+                per_day.setdefault(timezone.localdate(created_at), []).append(pk)
+
+            # The UPDATE bypasses the rollup signals: move the counts from active to inactive.
+            # select_for_update() locks nothing on SQLite, so count only the rows this UPDATE
+            # changed; another sweep or an edit may have deactivated some since the SELECT.
+            updated = 0
+            for day, ids in per_day.items():
+                count = Notification.objects.filter(pk__in=ids, is_active=True).update(is_active=False)
+                if count:
+                    apply_delta(entity.name, day, 'active', -count)
+                    apply_delta(entity.name, day, 'inactive', count)
+                    updated += count
+            if updated:
+                changes = [('active', -updated), ('inactive', updated)]
+                transaction.on_commit(lambda changes=changes: _notifications_changed(entity, changes))
+        deactivated += updated
+        logger.info(f"Deactivated {updated} expired notifications (total {deactivated})")
+    return deactivated
+
+
+def _archive_rows(rows):
+    """ARCHIVE_FIELDS of the notifications plus their recipients and read marks"""
+    ids = [row['id'] for row in rows]
+    recipients, reads = {}, {}
+    for notification_id, user_id in Notification.recipients.through.objects.filter(
+            notification_id__in=ids).values_list('notification_id', 'user_id'):
+        recipients.setdefault(notification_id, []).append(user_id)
+    for notification_id, user_id, read_at in NotificationRead.objects.filter(
+            notification_id__in=ids).values_list('notification_id', 'user_id', 'read_at'):
+        reads.setdefault(notification_id, []).append([user_id, _to_iso(read_at)])
+
+    archived = []
+    for row in rows:
+        row = dict(row)
+        row['created_at'] = _to_iso(row['created_at'])
+        row['expires_at'] = _to_iso(row['expires_at']) if row['expires_at'] else None
+        row['recipients'] = sorted(recipients.get(row['id'], []))
+        row['reads'] = sorted(reads.get(row['id'], []))
+        archived.append(row)
+    return archived
+
+
+def _append_segment(directory, month, rows):
+    with open(directory / f'{month}.jsonl.gz', 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(',', ':')).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_notifications(older_than_days=None, batch_size=None, now=None):
+    """Move inactive notifications older than older_than_days into the archive; returns how many"""
+    config = get_expiry_config()
+    older_than_days = config['ARCHIVE_AFTER_DAYS'] if older_than_days is None else older_than_days
+    batch_size = batch_size or config['BATCH_SIZE']
+    cutoff = (now or timezone.now()) - timedelta(days=older_than_days)
+    queued = OutboxMessage.objects.filter(status__in=['pending', 'sending']).values('notification_id')
+    candidates = (
+        Notification.objects.filter(is_active=False, created_at__lt=cutoff)
+        .exclude(pk__in=queued).order_by('pk')
+    )
+
+    directory = config['ARCHIVE_DIR']
+    directory.mkdir(parents=True, exist_ok=True)
+    lock_path = directory / '.lock'
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise ArchiveLocked(f'{lock_path} exists; another archive run is active or a previous run crashed')
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+
+    moved = 0
+    try:
+        while True:
+            rows = _archive_rows(candidates.values(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row['created_at'][:7], []).append(row)
+            for month, month_rows in by_month.items():
+                _append_segment(directory, month, month_rows)
+
+            # Recipient rows, read marks and sent messages go with them (rollups via signals)
+            with transaction.atomic():
+                Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
+            logger.info(f"Archived {len(rows)} notifications (total {moved})")
+    finally:
+        os.remove(lock_path)
+    return moved
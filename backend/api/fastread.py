@@ -0,0 +1,239 @@
+"""
+values()-based read path for high-volume list endpoints.
+
+compile_row_reader() turns a bound ModelSerializer into a RowReader: the
+columns to fetch with values() and one precompiled mapper per output field,
+which together produce the same dicts as serializer.data without building
+model or serializer instances per row. It understands model columns, choice
+displays, files, to-one primary keys, nested to-one serializers, id lists of
+many-to-many relations (one query per page), model properties whose columns
+are listed in Meta.property_columns, and SerializerMethodFields the view
+supplies as annotations. For any other field it returns None and the view
+keeps using the serializer.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+DEFAULT_FAST_READ = {
+    'ENABLED': True,
+}
+
+
+def get_fast_read_config():
+    config = dict(DEFAULT_FAST_READ)
+    config.update(getattr(settings, 'FAST_READ', {}))
+    return config
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _null_or(column, convert):
+    def mapper(row):
+        value = row[column]
+        return None if value is None else convert(value)
+    return mapper
+
+
+def _file_mapper(column, field, model_field):
+    use_url = getattr(field, 'use_url', True)
+    storage = model_field.storage
+    request = field.context.get('request')
+
+    def mapper(row):
+        name = row[column]
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return mapper
+
+
+def _display_mapper(column, field, model_field):
+    choices = dict(model_field.flatchoices)
+    to_representation = field.to_representation
+
+    def mapper(row):
+        value = row[column]
+        if value is None:
+            return None
+        return to_representation(str(choices.get(value, value)))
+    return mapper
+
+
+def _property_mapper(prefix, model, source, columns, field):
+    fget = getattr(model, source).fget
+    to_representation = field.to_representation
+    paths = [(name, prefix + name) for name in columns]
+
+    def mapper(row):
+        value = fget(SimpleNamespace(**{name: row[path] for name, path in paths}))
+        return None if value is None else to_representation(value)
+    return mapper
+
+
+class RowReader:
+    def __init__(self, model):
+        self.model = model
+        self.columns = []
+        self.mappers = []
+        self.annotations = {}
+        self.many_relations = []    # (key, through model, source column, target column)
+
+    def add_column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+
+    def prepare(self, queryset):
+        """The queryset to paginate: plain dicts of the needed columns"""
+        self.add_column('pk')
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def render(self, rows):
+        rows = list(rows)
+        if self.many_relations and rows:
+            ids = [row['pk'] for row in rows]
+            for key, through, source, target in self.many_relations:
+                grouped = {}
+                # The serializer reads an unordered prefetch, which databases return by related primary key
+                pairs = through.objects.filter(**{f'{source}__in': ids}).order_by(target).values_list(source, target)
+                for owner, related in pairs:
+                    grouped.setdefault(owner, []).append(related)
+                for row in rows:
+                    row[key] = grouped.get(row['pk'], [])
+        mappers = self.mappers
+        return [{name: mapper(row) for name, mapper in mappers} for row in rows]
+
+
+def compile_row_reader(serializer, annotations=None):
+    """RowReader reproducing serializer's output, or None if a field is not supported"""
+    reader = RowReader(serializer.Meta.model)
+    try:
+        reader.mappers = _compile(reader, serializer, '', annotations or {})
+    except Unsupported:
+        return None
+    return reader
+
+
+def _compile(reader, serializer, prefix, annotations):
+    model = serializer.Meta.model
+    property_columns = getattr(serializer.Meta, 'property_columns', {})
+    mappers = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source
+
+        if isinstance(field, serializers.SerializerMethodField):
+            if prefix or name not in annotations:
+                raise Unsupported(name)
+            column = f'_fast_{name}'
+            reader.annotations[column] = annotations[name]
+            reader.add_column(column)
+            mappers.append((name, lambda row, column=column: row[column]))
+            continue
+
+        if source in property_columns:
+            for column in property_columns[source]:
+                reader.add_column(prefix + column)
+            mappers.append((name, _property_mapper(prefix, model, source, property_columns[source], field)))
+            continue
+
+        if source.startswith('get_') and source.endswith('_display'):
+            model_field = _model_field(model, source[4:-8])
+            if model_field is None or not model_field.choices:
+                raise Unsupported(name)
+            column = prefix + model_field.name
+            reader.add_column(column)
+            mappers.append((name, _display_mapper(column, field, model_field)))
+            continue
+
+        model_field = _model_field(model, source)
+        if model_field is None:
+            raise Unsupported(name)
+
+        if isinstance(field, serializers.ManyRelatedField):
+            if prefix or not model_field.many_to_many or model_field.auto_created or \
+                    not isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+                raise Unsupported(name)
+            through = model_field.remote_field.through
+            key = ('many', name)
+            reader.many_relations.append(
+                (key, through, model_field.m2m_field_name(), model_field.m2m_reverse_field_name())
+            )
+            mappers.append((name, lambda row, key=key: row[key]))
+            continue
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or not (model_field.many_to_one or model_field.one_to_one) \
+                    or model_field.auto_created:
+                raise Unsupported(name)
+            fk_column = prefix + model_field.name
+            reader.add_column(fk_column)
+            nested = _compile(reader, field, f'{fk_column}__', {})
+
+            def nested_mapper(row, fk_column=fk_column, nested=nested):
+                if row[fk_column] is None:
+                    return None
+                return {nested_name: mapper(row) for nested_name, mapper in nested}
+            mappers.append((name, nested_mapper))
+            continue
+
+        if model_field.is_relation:
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is not None or \
+                    not (model_field.many_to_one or model_field.one_to_one):
+                raise Unsupported(name)
+            column = prefix + model_field.name
+            reader.add_column(column)
+            mappers.append((name, lambda row, column=column: row[column]))
+            continue
+
+        column = prefix + model_field.name
+        reader.add_column(column)
+        if isinstance(model_field, models.FileField):
+            mappers.append((name, _file_mapper(column, field, model_field)))
+        else:
+            mappers.append((name, _null_or(column, field.to_representation)))
+    return mappers
+
+
+class FastListMixin:
+    """
+    ViewSet mixin: serve list() through a compiled RowReader when every field
+    of the response can be read from values(). get_fast_annotations() supplies
+    SerializerMethodFields as query expressions.
+    """
+
+    def get_fast_annotations(self):
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        reader = None
+        if get_fast_read_config()['ENABLED']:
+            reader = compile_row_reader(self.get_serializer(), self.get_fast_annotations())
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = reader.prepare(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(queryset))
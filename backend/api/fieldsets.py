@@ -0,0 +1,146 @@
+"""
+Sparse fieldsets and on-demand expansion for serializers.
+
+On GET requests the root serializer reads two query parameters:
+
+    ?fields=id,title,flat.flat_number    only these fields (dotted paths reach into nested objects)
+    ?expand=flat,flat.owner              replace the compact default of these relations with the full serializer
+
+Serializers list the relations that can be expanded in Meta.expandable_fields;
+without expansion those render as IDs or stubs. Unknown fields and relations
+that cannot be expanded are answered with 400. Meta.field_relations names the
+relations read by computed fields (SerializerMethodField, model properties).
+The viewset mixin asks the serializer which relations the selected fields
+touch and applies select_related/prefetch_related for exactly those.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_paths(value):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}; None when the parameter is absent"""
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _relation_path(model, path):
+    """(relation part of path, whether it crosses a to-many relation); (None, False) if path starts at a column"""
+    relation, many = [], False
+    for part in path.split('__'):
+        try:
+            model_field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not model_field.is_relation:
+            break
+        relation.append(part)
+        many = many or model_field.many_to_many or model_field.one_to_many
+        model = model_field.related_model
+    return ('__'.join(relation) or None), many
+
+
+class SparseFieldsetMixin:
+    # Dotted path of this serializer in the request's ?fields= and ?expand=, for error messages
+    sparse_path = ''
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = fields
+        self.requested_expand = expand
+        super().__init__(*args, **kwargs)
+
+    def _is_request_root(self):
+        parent = getattr(self, 'parent', None)
+        if parent is None:
+            return True
+        return isinstance(parent, serializers.ListSerializer) and getattr(parent, 'parent', None) is None
+
+    def get_sparse_spec(self):
+        fields, expand = self.requested_fields, self.requested_expand
+        if fields is None and expand is None and self._is_request_root():
+            request = self.context.get('request')
+            if request is not None and request.method in SAFE_METHODS:
+                fields = parse_field_paths(request.query_params.get('fields'))
+                expand = parse_field_paths(request.query_params.get('expand'))
+        return fields, expand or {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_sparse_spec()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+
+        unknown = [name for name in requested or {} if name not in fields]
+        if unknown:
+            raise serializers.ValidationError({'fields': [f'Unknown field: {self.sparse_path}{name}' for name in unknown]})
+        unexpandable = [name for name in expand if name not in expandable]
+        if unexpandable:
+            raise serializers.ValidationError({'expand': [f'Cannot expand: {self.sparse_path}{name}' for name in unexpandable]})
+
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+
+        for name in list(fields):
+            field = fields[name]
+            if name in expand and name in expandable:
+                kwargs = {'read_only': True}
+                if field._kwargs.get('source'):
+                    kwargs['source'] = field._kwargs['source']
+                many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+                field = fields[name] = expandable[name](many=many, **kwargs)
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, SparseFieldsetMixin):
+                nested.requested_fields = (requested or {}).get(name) or None
+                nested.requested_expand = expand.get(name) or None
+                nested.sparse_path = f'{self.sparse_path}{name}.'
+        return fields
+
+    def get_query_hints(self):
+        """(select_related, prefetch_related) paths needed to render the selected fields"""
+        select, prefetch = set(), set()
+        self._collect_query_hints('', False, select, prefetch)
+        return sorted(select), sorted(prefetch)
+
+    def _collect_query_hints(self, prefix, prefetching, select, prefetch):
+        model = self.Meta.model
+        relations = getattr(self.Meta, 'field_relations', {})
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if name in relations:
+                paths, nested = relations[name], None
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) or field.source == '*':
+                # A to-one primary key is read from the local column
+                continue
+            else:
+                paths = [field.source.replace('.', '__')]
+            for path in paths:
+                relation, to_many = _relation_path(model, path)
+                if relation is None:
+                    continue
+                many = prefetching or to_many
+                (prefetch if many else select).add(prefix + relation)
+                if isinstance(nested, SparseFieldsetMixin) and relation == path:
+                    nested._collect_query_hints(f'{prefix}{relation}__', many, select, prefetch)
+
+
+class SparseFieldsetQuerysetMixin:
+    """ViewSet mixin: join and prefetch only the relations the response will render"""
+
+    def optimize_queryset(self, queryset):
+        serializer = self.get_serializer()
+        if not isinstance(serializer, SparseFieldsetMixin):
+            return queryset
+        select, prefetch = serializer.get_query_hints()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
@@ -0,0 +1,265 @@
+"""
+Per-user notification read state.
+
+A read mark is one NotificationRead row, unique per (user, notification), so
+"which of these notifications has this user read" is an index probe and no
+list of readers is ever loaded.
+
+The unread count of a user is kept in the cache together with the change
+versions (api.conditional) of the models that decide which notifications the
+user sees. mark_read() inserts the marks for a whole queryset in one
+statement and decrements the stored count, so reading does not cost a
+recount; a new, edited or deleted notification, or a change to flats or
+users, moves a version forward and the next unread_count() counts again with
+one query.
+
+Residents can follow their notifications live on an SSE stream (api.events):
+announce_notification() publishes a new notification once, with its audience
+rules, and each stream keeps the events that include its user. The SSE id is
+a cursor, the newest notification id sent; a client reconnecting with
+Last-Event-ID first receives what it missed (up to STREAM_BACKLOG
+notifications, otherwise a resync) and no event twice.
+
+Events only reach streams in the process that published them, so every
+STREAM_POLL_INTERVAL seconds without events a stream also asks the database
+for notifications it has not sent and for a changed unread count
+(NotificationStream.catch_up); with several server processes that poll is
+what delivers the other processes' notifications.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+
+from .audience import audience_includes, notification_audience_q, user_places
+from .conditional import bump_version, get_versions
+from .events import format_sse, hub
+from .expiry import live_notifications_q
+from .metrics import record_cache_lookup
+from .models import Flat, Notification, NotificationRead
+
+
+DEFAULT_INBOX = {
+    # Upper bound on how long a maintained count is trusted without a recount
+    'UNREAD_COUNT_TIMEOUT': 300,
+    # Missed notifications replayed to a resuming stream before it is told to resync
+    'STREAM_BACKLOG': 50,
+    # Seconds without events after which a stream checks the database itself
+    'STREAM_POLL_INTERVAL': 10,
+}
+
+_datetime_field = DateTimeField()
+
+EVENT_FIELDS = ('id', 'title', 'message', 'notification_type', 'priority', 'created_at', 'expires_at')
+
+# Models whose changes can alter the set of notifications a user sees
+VISIBILITY_MODELS = (Notification, Flat, User)
+
+
+def get_inbox_config():
+    config = dict(DEFAULT_INBOX)
+    config.update(getattr(settings, 'INBOX', {}))
+    return config
+
+
+def unread_cache_key(user_id):
+    return f'unread_count:{user_id}'
+
+
+def is_read_expression(user):
+    """Annotation: whether user has read the notification"""
+    return Exists(NotificationRead.objects.filter(notification_id=OuterRef('pk'), user_id=user.pk))
+
+
+def visible_notifications(user):
+    """Active, unexpired notifications the user is shown"""
+    notifications = Notification.objects.filter(live_notifications_q())
+    if user.is_superuser:
+        return notifications
+    return notifications.filter(notification_audience_q(user))
+
+
+def unread_count(user):
+    key = unread_cache_key(user.pk)
+    versions = sorted(get_versions(VISIBILITY_MODELS).items())
+    entry = cache.get(key)
+    current = entry is not None and entry[0] == versions
+    record_cache_lookup('unread_count', current)
+    if current:
+        return entry[1]
+    counted_at = time.time()
+    count = visible_notifications(user).exclude(is_read_expression(user)).count()
+    cache.set(key, (versions, count, counted_at), get_inbox_config()['UNREAD_COUNT_TIMEOUT'])
+    return count
+
+
+def _count_read(user_id, newly_read, marked_at):
+    bump_version(NotificationRead, user_id)
+    key = unread_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        return
+    if entry[2] < marked_at:
+        versions, count, counted_at = entry
+        cache.set(key, (versions, max(count - newly_read, 0), counted_at), get_inbox_config()['UNREAD_COUNT_TIMEOUT'])
+    else:
+        # Counted after the insert, possibly inside the same transaction: it may already include the marks
+        cache.delete(key)
+
+
+def mark_read(user, notifications):
+    """
+    Mark the notifications of a queryset read for user with one INSERT ...
+    SELECT: no rows are loaded and no model instances built, however many
+    are marked. Returns how many were not read before.
+    """
+    unread = notifications.exclude(is_read_expression(user)).order_by().values(marked_id=F('pk'))
+    select_sql, select_params = unread.query.get_compiler(using=unread.db).as_sql()
+    connection = connections[unread.db]
+    quote = connection.ops.quote_name
+    columns = [NotificationRead._meta.get_field(name).column for name in ('user', 'notification', 'read_at')]
+    sql = '%s %s (%s) SELECT %%s, marked.marked_id, %%s FROM (%s) marked WHERE 1 = 1 %s' % (
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        quote(NotificationRead._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        select_sql,
+        # A concurrent request may have marked some of them in between
+        connection.ops.on_conflict_suffix_sql(None, OnConflict.IGNORE, None, None),
+    )
+    marked_at = time.time()
+    read_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic(using=unread.db):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, read_at, *select_params])
+            marked = max(cursor.rowcount, 0)
+        if marked:
+            transaction.on_commit(lambda: _count_read(user.pk, marked, marked_at), using=unread.db)
+    return marked
+
+
+def notification_event_data(notification, is_read=False):
+    """The fields of a notification as the API renders them"""
+    data = {field: getattr(notification, field) for field in EVENT_FIELDS}
+    for field in ('created_at', 'expires_at'):
+        data[field] = _datetime_field.to_representation(data[field]) if data[field] else None
+    data['is_read'] = is_read
+    return data
+
+
+def announce_notification(notification):
+    """Publish a new notification to the streams; call once it is committed"""
+    if not hub.subscriber_count:
+        return
+    recipients = []
+    if notification.audience == 'users':
+        recipients = list(notification.recipients.values_list('pk', flat=True))
+    hub.publish('notifications', 'notification', {
+        'notification': notification_event_data(notification),
+        'rules': [notification.audience, notification.audience_building, notification.audience_floor, recipients],
+    })
+
+
+def announce_unread_count(user, count):
+    """Tell the user's open streams (other tabs and devices) the new unread count"""
+    hub.publish(f'user:{user.pk}', 'unread_count', {'unread_count': count})
+
+
+def notification_topics(user):
+    return {'notifications', f'user:{user.pk}'}
+
+
+def _missed_notifications(user, after, exclude=()):
+    """Up to STREAM_BACKLOG + 1 visible notifications after the id `after`, oldest first"""
+    limit = get_inbox_config()['STREAM_BACKLOG']
+    missed = (
+        visible_notifications(user).filter(pk__gt=after).exclude(pk__in=exclude)
+        .annotate(is_read=is_read_expression(user)).order_by('pk')
+    )
+    return list(missed[:limit + 1]), limit
+
+
+class NotificationStream:
+    """
+    Frames of one user's notification stream. cursor is the newest
+    notification id sent; every id up to polled has been sent or skipped,
+    and live holds the ids above it sent from events.
+    """
+
+    def __init__(self, user, places, cursor, unread=None):
+        self.user = user
+        self.places = places
+        self.cursor = cursor
+        self.polled = cursor
+        self.live = set()
+        self.unread = unread
+
+    def frame(self, event):
+        if event['type'] != 'notification':
+            if event['type'] == 'unread_count':
+                self.unread = event['data']['unread_count']
+            return format_sse(event['type'], event['data'], self.cursor)
+        notification = event['data']['notification']
+        # Already sent from the backlog, or addressed to someone else
+        if notification['id'] <= self.polled or notification['id'] in self.live:
+            return None
+        if not (self.user.is_superuser or audience_includes(event['data']['rules'], self.user, self.places)):
+            return None
+        self.live.add(notification['id'])
+        self.cursor = max(self.cursor, notification['id'])
+        return format_sse('notification', notification, self.cursor)
+
+    def catch_up(self):
+        """Frames for what the database has and the stream has not sent: other processes' notifications"""
+        frames = []
+        missed, limit = _missed_notifications(self.user, self.polled, self.live)
+        if len(missed) > limit:
+            frames.append(format_sse('resync', {'reason': 'too many notifications missed, reload them'}))
+            missed = []
+            self.polled = Notification.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for notification in missed:
+            self.cursor = max(self.cursor, notification.pk)
+            frames.append(format_sse('notification', notification_event_data(notification, notification.is_read), self.cursor))
+        # Everything up to the newest id seen has now been sent
+        self.polled = max([self.polled, *self.live, *(notification.pk for notification in missed)])
+        self.live = {pk for pk in self.live if pk > self.polled}
+        self.cursor = max(self.cursor, self.polled)
+        if missed:
+            # The versions the cached count is checked against may not have moved in this process
+            cache.delete(unread_cache_key(self.user.pk))
+        count = unread_count(self.user)
+        if count != self.unread:
+            self.unread = count
+            frames.append(format_sse('unread_count', {'unread_count': count}, self.cursor))
+        return frames
+
+
+def open_notification_stream(user, cursor=None):
+    """
+    (NotificationStream, prelude frames) for user, resuming after cursor.
+    Subscribe to notification_topics() first, so that nothing created while
+    the backlog is read goes missing.
+    """
+    newest = Notification.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    prelude = []
+    if cursor is None:
+        cursor = newest
+    else:
+        missed, limit = _missed_notifications(user, cursor)
+        if len(missed) > limit:
+            prelude.append(format_sse('resync', {'reason': 'too many notifications missed, reload them'}))
+            cursor = newest
+        else:
+            for notification in missed:
+                cursor = notification.pk
+                data = notification_event_data(notification, notification.is_read)
+                prelude.append(format_sse('notification', data, cursor))
+    count = unread_count(user)
+    prelude.append(format_sse('unread_count', {'unread_count': count}, cursor))
+    places = set() if user.is_superuser else user_places(user)
+    return NotificationStream(user, places, cursor, count), prelude
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.activity import flush_activity_logs
+from api.archive import ArchiveLocked, archive_activity_logs
+
+
+class Command(BaseCommand):
+    help = 'Move ActivityLog rows older than the hot window into compressed monthly archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hot-days', type=int, help='Days kept in the database (default: settings)')
+        parser.add_argument('--chunk-size', type=int, help='Rows moved per chunk (default: settings)')
+
+    def handle(self, *args, **options):
+        flush_activity_logs()
+        try:
+            moved = archive_activity_logs(hot_days=options['hot_days'], chunk_size=options['chunk_size'])
+        except ArchiveLocked as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} activity log rows'))
@@ -0,0 +1,101 @@
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.fastread import compile_row_reader
+from api.models import Complaint, Flat, MaintenanceBill, Notification
+from api.views import ComplaintViewSet, MaintenanceBillViewSet, NotificationViewSet
+
+
+VIEWSETS = {
+    'complaints': ComplaintViewSet,
+    'bills': MaintenanceBillViewSet,
+    'notifications': NotificationViewSet,
+}
+
+
+def seed(rows, admin):
+    today = date.today()
+    owner = User.objects.create_user('benchmark_owner', 'benchmark@example.com')
+    flats = Flat.objects.bulk_create(
+        [Flat(flat_number=f'BM{n}', owner=owner, building='BM') for n in range(rows // 10 + 1)]
+    )
+    Complaint.objects.bulk_create([
+        Complaint(author=owner, flat=flats[n % len(flats)], title=f'Benchmark {n}', description='Seeded',
+                  estimated_resolution_date=today - timedelta(days=n % 5))
+        for n in range(rows)
+    ])
+    # The k-th bill of a flat is for month k, counting from January 2020
+    MaintenanceBill.objects.bulk_create([
+        MaintenanceBill(flat=flats[n % len(flats)], bill_month=1 + n // len(flats) % 12,
+                        bill_year=2020 + n // len(flats) // 12, amount=1000 + n,
+                        due_date=today - timedelta(days=n % 40))
+        for n in range(rows)
+    ])
+    notifications = Notification.objects.bulk_create([
+        Notification(title=f'Benchmark {n}', message='Seeded', created_by=admin) for n in range(rows)
+    ])
+    Notification.read_by.through.objects.bulk_create([
+        Notification.read_by.through(notification_id=notification.pk, user_id=admin.pk)
+        for notification in notifications[::2]
+    ])
+
+
+class Command(BaseCommand):
+    help = 'Rows/sec of the list serializers against the values()-based fast read path (api.fastread)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Rows rendered per measurement')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', action='store_true',
+                            help='Insert --rows rows per endpoint first; rolled back afterwards')
+
+    def handle(self, *args, **options):
+        admin = User.objects.filter(is_superuser=True).first()
+        if admin is None:
+            raise CommandError('Needs a superuser to run the endpoints as')
+
+        with transaction.atomic():
+            if options['seed']:
+                seed(options['rows'], admin)
+            for name, viewset_class in VIEWSETS.items():
+                self.benchmark(name, viewset_class, admin, options['rows'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, name, viewset_class, admin, rows, repeat):
+        request = APIRequestFactory().get(f'/api/{name}/')
+        force_authenticate(request, user=admin)
+        view = viewset_class(action_map={'get': 'list'}, args=(), kwargs={}, format_kwarg=None)
+        view.request = view.initialize_request(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        count = min(rows, queryset.count())
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            return renderer.render(view.get_serializer(queryset[:rows], many=True).data)
+
+        reader = compile_row_reader(view.get_serializer(), view.get_fast_annotations())
+        if reader is None:
+            raise CommandError(f'{name}: serializer has fields the fast path does not support')
+
+        def fast_path():
+            return renderer.render(reader.render(reader.prepare(queryset)[:rows]))
+
+        if serializer_path() != fast_path():
+            raise CommandError(f'{name}: fast path output differs from the serializer')
+
+        results = []
+        for label, run in (('serializer', serializer_path), ('values()', fast_path)):
+            best = float('inf')
+            for _ in range(repeat):
+                began = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - began)
+            results.append(count / best if best else 0)
+            self.stdout.write(f'{name:<14} {label:<11} {count} rows in {best * 1000:.1f}ms ({count / best:,.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS(f'{name:<14} speedup x{results[1] / results[0]:.1f}'))
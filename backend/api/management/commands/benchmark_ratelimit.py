@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ratelimit import CacheBackend, SQLiteBackend, SlidingWindowRateLimiter
+
+
+def _run_worker(backend_name, path, limit, window, threads, requests, cost, now):
+    """Hammer one key from ``threads`` threads and return (admitted cost, elapsed)"""
+    if backend_name == 'sqlite':
+        backend = SQLiteBackend(path=path)
+    else:
+        backend = CacheBackend()
+    limiter = SlidingWindowRateLimiter(backend, limit, window)
+    admitted = 0
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def fire():
+        nonlocal admitted
+        start.wait()
+        local = 0
+        for _ in range(requests):
+            if limiter.hit('benchmark', cost, now=now).allowed:
+                local += cost
+        with lock:
+            admitted += local
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(fire) for _ in range(threads)]:
+            future.result()
+    return admitted, time.perf_counter() - began
+
+
+class Command(BaseCommand):
+    help = 'Concurrency benchmark for the rate limiter; fails if more than LIMIT units are admitted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['sqlite', 'cache'], default='sqlite')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per thread')
+        parser.add_argument('--limit', type=int, default=500)
+        parser.add_argument('--cost', type=int, default=1)
+
+    def handle(self, *args, **options):
+        backend_name = options['backend']
+        processes = options['processes']
+        if backend_name == 'cache' and processes > 1:
+            # The default cache is per-process, so only threads share its counters
+            self.stdout.write('Cache backend: running a single process')
+            processes = 1
+
+        window = 3600
+        # Pin every hit to the same window so the result does not depend on
+        # the benchmark straddling a window boundary
+        now = (time.time() // window) * window + 1
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        worker_args = (
+            backend_name, path, options['limit'], window,
+            options['threads'], options['requests'], options['cost'], now,
+        )
+
+        try:
+            if processes == 1:
+                results = [_run_worker(*worker_args)]
+            else:
+                SQLiteBackend(path=path)  # create the table before the workers race for it
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    results = list(pool.map(_run_worker, *[[arg] * processes for arg in worker_args]))
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+        admitted = sum(result[0] for result in results)
+        elapsed = max(result[1] for result in results)
+        attempts = processes * options['threads'] * options['requests']
+
+        self.stdout.write(
+            f"{attempts} requests from {processes} process(es) x {options['threads']} thread(s) "
+            f"in {elapsed:.2f}s ({attempts / elapsed:.0f} req/s)"
+        )
+        self.stdout.write(f"Admitted {admitted} of {options['limit']} cost units")
+
+        if admitted > options['limit']:
+            raise CommandError(f"Over-admission: {admitted - options['limit']} units above the limit")
+        self.stdout.write(self.style.SUCCESS('No over-admission'))
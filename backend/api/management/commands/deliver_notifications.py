@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.outbox import CHANNELS, OutboxWorkerPool
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails and SMS (api.outbox) with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Worker threads (default: settings)')
+        parser.add_argument('--channel', action='append', choices=CHANNELS, help='Only this channel; repeatable')
+        parser.add_argument('--drain', action='store_true', help='Exit once nothing is due instead of polling')
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        pool = OutboxWorkerPool(workers=options['workers'], channels=options['channel'])
+        began = time.monotonic()
+        try:
+            pool.run(drain=options['drain'])
+        except KeyboardInterrupt:
+            pool.stop()
+        elapsed = time.monotonic() - began
+        for channel, totals in pool.totals.items():
+            rate = totals['sent'] / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{channel:<6} {totals['sent']} sent, {totals['failed']} failed in {elapsed:.1f}s ({rate:,.1f}/s)"
+            )
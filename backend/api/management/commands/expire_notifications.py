@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import ArchiveLocked
+from api.expiry import archive_notifications, deactivate_expired_notifications
+
+
+class Command(BaseCommand):
+    help = 'Deactivate expired notifications and optionally archive old inactive ones (api.expiry)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows updated or archived per batch (default: settings)')
+        parser.add_argument('--archive', action='store_true', help='Also archive and delete old inactive notifications')
+        parser.add_argument('--archive-days', type=int, help='Archive notifications older than this (default: settings)')
+        parser.add_argument('--every', type=float, help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError('--every must be positive')
+        try:
+            while True:
+                self.sweep(options)
+                if options['every'] is None:
+                    return
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
+
+    def sweep(self, options):
+        deactivated = deactivate_expired_notifications(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deactivated {deactivated} expired notifications'))
+        if options['archive']:
+            try:
+                moved = archive_notifications(older_than_days=options['archive_days'], batch_size=options['batch_size'])
+            except ArchiveLocked as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'Archived {moved} notifications'))
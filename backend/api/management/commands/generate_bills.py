@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.billing import BillingRule, generate_bills
+from api.serializers import BillingRunSerializer
+
+
+class Command(BaseCommand):
+    help = "Create a month's maintenance bills for all flats, or a filtered set, from billing rules (api.billing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', type=int)
+        parser.add_argument('year', type=int)
+        parser.add_argument(
+            '--rule', action='append', required=True, metavar='TYPE:METHOD:VALUE',
+            help='e.g. maintenance:per_sqft:2.50 or parking:flat:500; one per bill type, repeatable',
+        )
+        parser.add_argument('--user', required=True, help='Administrator the run is logged as')
+        parser.add_argument('--due-date', help='YYYY-MM-DD (default: the DUE_DAY of the month)')
+        parser.add_argument('--building')
+        parser.add_argument('--floor', type=int)
+        parser.add_argument('--batch-size', type=int, help='Flats per chunk (default: settings)')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user'], is_superuser=True).first()
+        if user is None:
+            raise CommandError(f"No administrator named {options['user']}")
+        rules = []
+        for rule in options['rule']:
+            parts = rule.split(':')
+            if len(parts) != 3:
+                raise CommandError(f'Invalid rule {rule!r}; expected TYPE:METHOD:VALUE')
+            rules.append(dict(zip(('bill_type', 'method', 'value'), parts)))
+
+        data = {'bill_month': options['month'], 'bill_year': options['year'], 'rules': rules}
+        for field in ('due_date', 'building', 'floor'):
+            if options[field] is not None:
+                data[field] = options[field]
+        serializer = BillingRunSerializer(data=data)
+        if not serializer.is_valid():
+            raise CommandError(serializer.errors)
+
+        began = time.monotonic()
+        summary = generate_bills(
+            options['month'], options['year'], [BillingRule(**rule) for rule in serializer.validated_data['rules']],
+            user, flats=serializer.get_flats(), due_date=serializer.validated_data.get('due_date'),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']} bills in {time.monotonic() - began:.1f}s; "
+            f"{summary['existing']} already existed, {summary['unpriced']} skipped for flats without area"
+        ))
@@ -0,0 +1,347 @@
+"""
+Prometheus metrics.
+
+Values are kept in per-thread shards: the hot path only touches a dict owned
+by the calling thread, without locks, and shards are merged when scraped.
+When settings.METRICS['MULTIPROCESS_DIR'] is set every process also writes
+its merged values to a file in that directory, and a scrape sums the files
+of all processes. A process removes its file when it exits, and a scrape
+skips and removes the files of processes that are no longer running, so the
+directory does not grow with restarts; like any process restart, that shows
+up as a counter reset.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_METRICS = {
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 5,
+    # Clients allowed to scrape without logging in as an administrator
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+
+def get_metrics_config():
+    config = dict(DEFAULT_METRICS)
+    config.update(getattr(settings, 'METRICS', {}))
+    return config
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def collect(self):
+        """Merge all thread shards into {(name, labels): value}"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            # Copy first: the owning thread may add keys while we iterate
+            for key, value in list(shard.items()):
+                _merge_value(merged, key, value)
+        return merged
+
+    def collect_all_processes(self):
+        config = get_metrics_config()
+        directory = config['MULTIPROCESS_DIR']
+        if not directory:
+            return self.collect()
+        write_process_file(self)
+        merged = {}
+        for path in Path(directory).glob('metrics_*.json'):
+            if not _process_alive(path):
+                _remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                _merge_value(merged, (name, tuple(labels)), value)
+        return merged
+
+    def exposition(self):
+        values = self.collect_all_processes()
+        by_name = {}
+        for (name, labels), value in values.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, value in sorted(by_name.get(name, [])):
+                lines.extend(metric.render(labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _merge_value(merged, key, value):
+    if isinstance(value, list):
+        current = merged.get(key)
+        if current is None:
+            merged[key] = list(value)
+        else:
+            for index, item in enumerate(value):
+                current[index] += item
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple(str(labels[label]) for label in self.labelnames))
+        shard = self.registry._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def render(self, labels, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}']
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames, buckets):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = (self.name, tuple(str(labels[label]) for label in self.labelnames))
+        shard = self.registry._shard()
+        # Layout: one non-cumulative count per bucket, +Inf count, sum
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[index] += 1
+                break
+        else:
+            values[len(self.buckets)] += 1
+        values[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), value[:-1]):
+            cumulative += count
+            le = bound if bound == '+Inf' else repr(float(bound))
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", le))} {cumulative}')
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(value[-1])}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def write_process_file(registry):
+    """Write this process' merged values to MULTIPROCESS_DIR/metrics_<pid>.json"""
+    directory = get_metrics_config()['MULTIPROCESS_DIR']
+    if not directory:
+        return
+    rows = [[name, list(labels), value] for (name, labels), value in registry.collect().items()]
+    path = process_file_path(directory)
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(rows, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Failed to write metrics file {path}: {str(e)}")
+
+
+def process_file_path(directory, pid=None):
+    return Path(directory) / f'metrics_{pid or os.getpid()}.json'
+
+
+def _process_alive(path):
+    try:
+        pid = int(path.stem.split('_', 1)[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, run by another user
+        return True
+    return True
+
+
+def _remove(path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Failed to remove metrics file {path}: {str(e)}")
+
+
+def remove_process_file():
+    """Drop this process' file from MULTIPROCESS_DIR; runs at exit"""
+    directory = get_metrics_config()['MULTIPROCESS_DIR']
+    if directory:
+        _remove(process_file_path(directory))
+
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def start_process_flusher(registry):
+    """Periodically publish this process' values when running multi-process"""
+    global _flusher_started
+    config = get_metrics_config()
+    if not config['MULTIPROCESS_DIR'] or _flusher_started:
+        return
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+
+    def run():
+        while True:
+            time.sleep(config['FLUSH_INTERVAL'])
+            write_process_file(registry)
+
+    threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+    atexit.register(remove_process_file)
+
+
+def _reset_after_fork():
+    # Threads do not survive fork(): start from empty shards and a fresh
+    # flusher so the child reports only its own values under its own pid
+    global _flusher_started, _flusher_lock
+    registry._shards = []
+    registry._shards_lock = threading.Lock()
+    registry._local = threading.local()
+    _flusher_lock = threading.Lock()
+    if _flusher_started:
+        _flusher_started = False
+        start_process_flusher(registry)
+
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'nconnect_http_requests_total', 'HTTP requests by view, method and status code',
+    ['view', 'method', 'status'],
+)
+http_request_duration_seconds = registry.histogram(
+    'nconnect_http_request_duration_seconds', 'HTTP request latency by view', ['view'],
+)
+rate_limit_rejections_total = registry.counter(
+    'nconnect_rate_limit_rejections_total', 'Requests rejected by the rate limiter',
+)
+activity_log_writes_total = registry.counter(
+    'nconnect_activity_log_writes_total', 'ActivityLog rows written by action', ['action'],
+)
+activity_log_lost_total = registry.counter(
+    'nconnect_activity_log_lost_total', 'ActivityLog entries given up after retries, by action', ['action'],
+)
+pdf_generation_seconds = registry.histogram(
+    'nconnect_pdf_generation_seconds', 'Time spent rendering PDF receipts',
+)
+qr_generation_seconds = registry.histogram(
+    'nconnect_qr_generation_seconds', 'Time spent rendering camera access QR codes',
+)
+outbox_messages_total = registry.counter(
+    'nconnect_outbox_messages_total', 'Notification emails/SMS by channel and result (queued/sent/retried/failed)',
+    ['channel', 'result'],
+)
+outbox_batch_seconds = registry.histogram(
+    'nconnect_outbox_batch_seconds', 'Time spent delivering one outbox batch by channel', ['channel'],
+)
+cache_requests_total = registry.counter(
+    'nconnect_cache_requests_total', 'Application cache lookups by cache and result (hit/miss)',
+    ['cache', 'result'],
+)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def record_cache_lookup(cache_name, hit):
+    cache_requests_total.inc(cache=cache_name, result='hit' if hit else 'miss')
@@ -1,34 +1,62 @@
 import logging
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
-from django.core.cache import cache
 from django.conf import settings
 import time
 
+from .metrics import http_request_duration_seconds, http_requests_total, rate_limit_rejections_total
+from .performance import RequestTimer, current_timings, get_view_name, view_stats
+from .profiler import get_profiler
+from .ratelimit import get_limiter, get_request_cost
+
 logger = logging.getLogger(__name__)
 
 
+def get_client_ip(request):
+    """
+    REMOTE_ADDR, unless the request came through one of settings.TRUSTED_PROXIES:
+    then the right-most X-Forwarded-For address that is not a trusted proxy
+    itself. Addresses further left are whatever the client chose to send.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    trusted = set(getattr(settings, 'TRUSTED_PROXIES', []))
+    if remote_addr not in trusted:
+        return remote_addr
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    for ip in reversed(forwarded):
+        if ip not in trusted:
+            return ip
+    return remote_addr
+
+
 class SecurityMiddleware(MiddlewareMixin):
     """Custom security middleware for additional protection"""
 
     def process_request(self, request):
-        # Rate limiting by IP
+        # Security headers
+        request.start_time = time.time()
+
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Rate limiting by IP, weighted by endpoint cost. Runs here rather than
+        # in process_request so the resolved URL name is available.
         client_ip = self.get_client_ip(request)
-        cache_key = f"rate_limit_{client_ip}"
-        requests = cache.get(cache_key, 0)
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        cost = get_request_cost(request, url_name)
 
-        if requests >= 100:  # 100 requests per minute
+        result = get_limiter().hit(client_ip, cost)
+        if not result.allowed:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JsonResponse(
+            rate_limit_rejections_total.inc()
+            response = JsonResponse(
                 {"error": "Rate limit exceeded. Please try again later."},
                 status=429
             )
+            response['Retry-After'] = str(result.retry_after)
+            return response
 
-        cache.set(cache_key, requests + 1, 60)  # Reset every minute
-
-        # Security headers
-        request.start_time = time.time()
-
+        request.rate_limit = result
         return None
 
     def process_response(self, request, response):
@@ -38,6 +66,11 @@ class SecurityMiddleware(MiddlewareMixin):
         response['X-XSS-Protection'] = '1; mode=block'
         response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
 
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            response['X-RateLimit-Limit'] = str(rate_limit.limit)
+            response['X-RateLimit-Remaining'] = str(rate_limit.remaining)
+
         # Log response time
         if hasattr(request, 'start_time'):
             duration = time.time() - request.start_time
@@ -46,11 +79,79 @@ class SecurityMiddleware(MiddlewareMixin):
 
         return response
 
+    get_client_ip = staticmethod(get_client_ip)
+
+
+class PerformanceMiddleware(MiddlewareMixin):
+    """
+    Records total, DB, serializer and render time for every request, emits
+    them as a Server-Timing header and aggregates them per view. Keep it
+    first in MIDDLEWARE so the total covers the rest of the stack.
+    """
+
+    def process_request(self, request):
+        request.perf_timer = RequestTimer()
+        request.perf_timer.__enter__()
+        request.perf_view_name = None
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.perf_view_name = get_view_name(view_func, request.method)
+        return None
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        timings = current_timings()
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+            response.add_post_render_callback(self._render_finished)
+        return response
+
     @staticmethod
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    def _render_finished(response):
+        timings = current_timings()
+        if timings is not None and timings.render_start is not None:
+            timings.render += time.perf_counter() - timings.render_start
+            timings.render_start = None
+
+    def process_response(self, request, response):
+        timer = getattr(request, 'perf_timer', None)
+        if timer is None:
+            return response
+        timer.__exit__(None, None, None)
+        timings = timer.timings
+        total = timings.total
+
+        response['Server-Timing'] = timings.server_timing(total)
+        view_name = request.perf_view_name or 'unresolved'
+        if request.perf_view_name:
+            view_stats.record(view_name, total, timings)
+        http_requests_total.inc(view=view_name, method=request.method, status=response.status_code)
+        http_request_duration_seconds.observe(total, view=view_name)
+        return response
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Samples the Python stack of requests to the modules listed in
+    settings.PROFILING while profiling is enabled; see api.profiler.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profiler = get_profiler()
+        if profiler is None or not profiler.wants(view_func):
+            return None
+        profiler.start()
+        request.profile_view_name = get_view_name(view_func, request.method)
+        request.profile_start = time.perf_counter()
+        return None
+
+    def process_response(self, request, response):
+        view_name = getattr(request, 'profile_view_name', None)
+        if view_name is None:
+            return response
+        duration = time.perf_counter() - request.profile_start
+        profile_id = get_profiler().finish(view_name, duration)
+        if profile_id:
+            logger.info(f"Stored profile {profile_id} for {view_name}")
+        return response
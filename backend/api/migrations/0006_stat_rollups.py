@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:21
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# api.rollups.TRACKED_ENTITIES as of this migration: (entity, model, date field, status field)
+TRACKED_ENTITIES = [
+    ('user', 'auth.User', 'date_joined', 'is_active'),
+    ('complaint', 'api.Complaint', 'created_at', 'status'),
+    ('bill', 'api.MaintenanceBill', 'created_at', 'status'),
+    ('camera_request', 'api.CameraAccessRequest', 'requested_at', 'status'),
+    ('vehicle', 'api.Vehicle', 'created_at', 'is_active'),
+    ('notification', 'api.Notification', 'created_at', 'is_active'),
+]
+
+
+def backfill_rollups(apps, schema_editor):
+    """The counts api.rollups.rebuild_rollups() would write, for existing rows"""
+    StatRollup = apps.get_model('api', 'StatRollup')
+    rows = {}
+    for name, model, date_field, status_field in TRACKED_ENTITIES:
+        grouped = (
+            apps.get_model(model).objects.order_by()
+            .annotate(day=TruncDate(date_field, tzinfo=timezone.get_current_timezone()))
+            .values('day', status_field)
+            .annotate(total=Count('pk'))
+        )
+        for group in grouped:
+            status = group[status_field]
+            if isinstance(status, bool):
+                status = 'active' if status else 'inactive'
+            for period, period_start in (('day', group['day']), ('month', group['day'].replace(day=1))):
+                key = (period, period_start, name, status)
+                rows[key] = rows.get(key, 0) + group['total']
+    StatRollup.objects.bulk_create(
+        [
+            StatRollup(period=period, period_start=period_start, entity=name, status=status, count=count)
+            for (period, period_start, name, status), count in rows.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_activitylog_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('entity', models.CharField(max_length=30)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'stat_rollups',
+                'unique_together': {('period', 'entity', 'period_start', 'status')},
+            },
+        ),
+        # Existing rows; the signals of api.rollups keep the counts from here on
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
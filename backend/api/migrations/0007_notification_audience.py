@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def recipients_to_audience(apps, schema_editor):
+    # Broadcasts used to list every active user as a recipient; those become
+    # 'all' and lose their recipient rows, other recipient lists become 'users'
+    Notification = apps.get_model('api', 'Notification')
+    User = apps.get_model('auth', 'User')
+    active_users = User.objects.filter(is_active=True).count()
+    broadcasts, targeted = [], []
+    counted = Notification.objects.annotate(
+        total=Count('recipients'),
+        active=Count('recipients', filter=Q(recipients__is_active=True)),
+    ).filter(total__gt=0).values_list('pk', 'active')
+    for pk, active in counted:
+        (broadcasts if active_users and active == active_users else targeted).append(pk)
+    Notification.recipients.through.objects.filter(notification_id__in=broadcasts).delete()
+    Notification.objects.filter(pk__in=targeted).update(audience='users')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_stat_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('all', 'Everyone'), ('owners', 'Owners'), ('tenants', 'Tenants'), ('users', 'Selected users')], default='all', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience_building',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience_floor',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['audience', 'audience_building', 'audience_floor'], name='notification_audience_idx'),
+        ),
+        migrations.RunPython(recipients_to_audience, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_read_marks(apps, schema_editor):
+    # read_by moves from the implicit through table to NotificationRead; Django
+    # cannot alter a many-to-many field onto a through model, so it is re-added
+    Notification = apps.get_model('api', 'Notification')
+    NotificationRead = apps.get_model('api', 'NotificationRead')
+    marks = Notification.read_by.through.objects.values_list('notification_id', 'user_id').iterator()
+    batch = []
+    for notification_id, user_id in marks:
+        batch.append(NotificationRead(notification_id=notification_id, user_id=user_id))
+        if len(batch) == 1000:
+            NotificationRead.objects.bulk_create(batch)
+            batch = []
+    NotificationRead.objects.bulk_create(batch)
+
+
+def restore_read_marks(apps, schema_editor):
+    Notification = apps.get_model('api', 'Notification')
+    NotificationRead = apps.get_model('api', 'NotificationRead')
+    Through = Notification.read_by.through
+    Through.objects.bulk_create(
+        [Through(notification_id=notification_id, user_id=user_id)
+         for notification_id, user_id in NotificationRead.objects.values_list('notification_id', 'user_id')],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_notification_audience'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(auto_now_add=True)),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reads', to='api.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_reads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notification_reads',
+                'unique_together': {('user', 'notification')},
+            },
+        ),
+        migrations.RunPython(copy_read_marks, restore_read_marks),
+        migrations.RemoveField(
+            model_name='notification',
+            name='read_by',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='read_by',
+            field=models.ManyToManyField(blank=True, related_name='read_notifications', through='api.NotificationRead', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -14,6 +14,8 @@ from io import BytesIO
 from django.core.files import File
 from PIL import Image
 
+from .metrics import activity_log_writes_total, qr_generation_seconds
+
 
 def validate_image_file(value):
     """Validate uploaded image files"""
@@ -414,14 +416,15 @@ class CameraAccessRequest(models.Model):
     def generate_qr_code(self):
         """Generate QR code for camera access"""
         if self.access_link:
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(self.access_link)
-            qr.make(fit=True)
+            with qr_generation_seconds.time():
+                qr = qrcode.QRCode(version=1, box_size=10, border=5)
+                qr.add_data(self.access_link)
+                qr.make(fit=True)
 
-            img = qr.make_image(fill_color="black", back_color="white")
-            buffer = BytesIO()
-            img.save(buffer, 'PNG')
-            buffer.seek(0)
+                img = qr.make_image(fill_color="black", back_color="white")
+                buffer = BytesIO()
+                img.save(buffer, 'PNG')
+                buffer.seek(0)
 
             self.qr_code.save(
                 f'qr_camera_{self.id}.png',
@@ -454,12 +457,25 @@ class Notification(models.Model):
         ('emergency', 'Emergency'),
     ]
 
+    # Who sees a notification (api.audience): a role, optionally narrowed to
+    # the flats of one building and/or floor, or the explicit recipients
+    AUDIENCE_CHOICES = [
+        ('all', 'Everyone'),
+        ('owners', 'Owners'),
+        ('tenants', 'Tenants'),
+        ('users', 'Selected users'),
+    ]
+
     title = models.CharField(max_length=255)
     message = models.TextField()
     notification_type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='general')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='normal')
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default='all')
+    audience_building = models.CharField(max_length=50, blank=True)
+    audience_floor = models.PositiveIntegerField(null=True, blank=True)
+    # Only used by the 'users' audience
     recipients = models.ManyToManyField(User, related_name='notifications', blank=True)
-    read_by = models.ManyToManyField(User, related_name='read_notifications', blank=True)
+    read_by = models.ManyToManyField(User, through='NotificationRead', related_name='read_notifications', blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_notifications')
     is_active = models.BooleanField(default=True)
     send_email = models.BooleanField(default=False)
@@ -479,6 +495,66 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['audience', 'audience_building', 'audience_floor'], name='notification_audience_idx'),
+            # Live notifications (api.expiry) and the expiry sweep
+            models.Index(fields=['is_active', 'expires_at'], name='notification_active_idx'),
+        ]
+
+
+class NotificationRead(models.Model):
+    """One user's read mark on one notification (api.inbox)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_reads')
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='reads')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} read {self.notification_id}"
+
+    class Meta:
+        db_table = 'notification_reads'
+        # Leads with user: "has this user read these notifications" is the lookup every page makes
+        unique_together = ['user', 'notification']
+
+
+class OutboxMessage(models.Model):
+    """One email or SMS of a notification waiting for, or past, delivery (api.outbox)"""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='outbox_messages')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='outbox_messages')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    # Email address or phone number at the time the notification was sent
+    address = models.CharField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set while a worker holds the message; a lapsed lease is claimed again
+    claim = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.channel} to {self.address} ({self.status})"
+
+    class Meta:
+        db_table = 'outbox_messages'
+        indexes = [
+            # Workers poll for due messages per channel
+            models.Index(fields=['channel', 'status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
 
 
 class ActivityLog(models.Model):
@@ -502,7 +578,8 @@ class ActivityLog(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
     object_id = models.PositiveIntegerField(null=True, blank=True)
     content_object = GenericForeignKey('content_type', 'object_id')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered entries are stamped when logged, not when inserted
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.timestamp}"
@@ -510,4 +587,38 @@ class ActivityLog(models.Model):
     class Meta:
         db_table = 'activity_logs'
         ordering = ['-timestamp']
+        indexes = [
+            # Retention scans and dashboard "recent activity" ordering
+            models.Index(fields=['timestamp', 'id'], name='activity_ts_id_idx'),
+            # Keyset pagination of the filtered activity log browser
+            models.Index(fields=['user', 'timestamp', 'id'], name='activity_user_ts_idx'),
+            models.Index(fields=['action', 'timestamp', 'id'], name='activity_action_ts_idx'),
+            models.Index(fields=['content_type', 'object_id', 'timestamp', 'id'], name='activity_object_ts_idx'),
+        ]
+
+
+class StatRollup(models.Model):
+    """Per-day and per-month object counts by entity and status, maintained by api.rollups"""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
 
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    entity = models.CharField(max_length=30)
+    status = models.CharField(max_length=20, blank=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.entity}/{self.status or '-'} {self.period} {self.period_start}: {self.count}"
+
+    class Meta:
+        db_table = 'stat_rollups'
+        unique_together = ['period', 'entity', 'period_start', 'status']
+
+
+@receiver(post_save, sender=ActivityLog)
+def count_activity_log_write(sender, instance, created, **kwargs):
+    if created:
+        activity_log_writes_total.inc(action=instance.action)
@@ -0,0 +1,341 @@
+"""
+Email and SMS delivery of notifications.
+
+Creating a notification with send_email / send_sms queues one OutboxMessage
+per channel and recipient in the same transaction (enqueue_notification), so
+a notification is never committed without its messages; the request itself
+only inserts rows. `manage.py deliver_notifications` runs
+a pool of worker threads that claim due messages in batches per channel,
+send each batch over one connection (one SMTP session per batch) and record
+the outcome with one UPDATE per batch. Failed messages are retried with
+exponential backoff up to MAX_ATTEMPTS; messages held by a worker that died
+are claimed again when their lease lapses, and every claim counts as an
+attempt. Sends per channel are limited to
+RATE_LIMITS messages per second in each process.
+
+Email goes through Django's EMAIL_BACKEND (the console and file backends
+work for development). SMS goes through SMS_BACKEND; the console, file and
+in-memory backends below stand in for a provider.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .audience import notification_audience_users
+from .metrics import outbox_batch_seconds, outbox_messages_total
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_OUTBOX = {
+    'WORKERS': 2,
+    'BATCH_SIZE': 50,
+    'POLL_INTERVAL': 2.0,
+    # Seconds a claimed batch stays with its worker before others may take it over
+    'LEASE': 300,
+    'MAX_ATTEMPTS': 5,
+    # Delay before the first retry in seconds, doubled for every further attempt
+    'RETRY_DELAY': 30,
+    'MAX_RETRY_DELAY': 3600,
+    # Messages per second per channel and process; None for no limit
+    'RATE_LIMITS': {'email': 20, 'sms': 5},
+    'SMS_BACKEND': 'api.outbox.ConsoleSMSBackend',
+    'SMS_FILE_PATH': None,
+    'ENQUEUE_BATCH_SIZE': 500,
+}
+
+CHANNELS = [channel for channel, label in OutboxMessage.CHANNEL_CHOICES]
+
+
+def get_outbox_config():
+    config = dict(DEFAULT_OUTBOX)
+    config.update(getattr(settings, 'OUTBOX', {}))
+    return config
+
+
+# SMS backends: the same open()/close()/send_messages() protocol as Django's email backends
+SMSMessage = namedtuple('SMSMessage', ['to', 'body'])
+
+sms_outbox = []     # LocMemSMSBackend's sent messages, like django.core.mail.outbox
+
+
+class BaseSMSBackend:
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        """Send messages; returns how many were sent"""
+        raise NotImplementedError
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_messages(self, messages):
+        for message in messages:
+            self.stream.write(f'SMS to {message.to}: {message.body}\n')
+        self.stream.flush()
+        return len(messages)
+
+
+class FileSMSBackend(BaseSMSBackend):
+    """Appends one JSON line per message to SMS_FILE_PATH"""
+
+    def __init__(self, file_path=None):
+        self.path = Path(file_path or get_outbox_config()['SMS_FILE_PATH'] or settings.BASE_DIR / 'sms_outbox.jsonl')
+
+    def send_messages(self, messages):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a', encoding='utf-8') as output:
+            for message in messages:
+                output.write(json.dumps({'to': message.to, 'body': message.body}) + '\n')
+        return len(messages)
+
+
+class LocMemSMSBackend(BaseSMSBackend):
+    def send_messages(self, messages):
+        sms_outbox.extend(messages)
+        return len(messages)
+
+
+def get_sms_connection():
+    return import_string(get_outbox_config()['SMS_BACKEND'])()
+
+
+class RateLimiter:
+    """Token bucket shared by the workers of one process"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate or 0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def enqueue_notification(notification):
+    """
+    Queue the emails and SMS of a new notification for its audience; returns
+    how many. Call it in the transaction that creates the notification.
+    """
+    users = notification_audience_users(notification)
+    addresses = {}
+    if notification.send_email:
+        addresses['email'] = users.exclude(email='').values_list('pk', 'email')
+    if notification.send_sms:
+        addresses['sms'] = users.filter(profile__phone_number__gt='').values_list('pk', 'profile__phone_number')
+
+    batch_size = get_outbox_config()['ENQUEUE_BATCH_SIZE']
+    total = 0
+    for channel, rows in addresses.items():
+        queued = 0
+        batch = []
+        for user_id, address in rows.iterator(chunk_size=batch_size):
+            batch.append(OutboxMessage(notification=notification, user_id=user_id, channel=channel, address=address))
+            if len(batch) == batch_size:
+                OutboxMessage.objects.bulk_create(batch)
+                queued += len(batch)
+                batch = []
+        OutboxMessage.objects.bulk_create(batch)
+        queued += len(batch)
+        outbox_messages_total.inc(queued, channel=channel, result='queued')
+        total += queued
+    return total
+
+
+def due_messages(now):
+    # Pending and due, or claimed by a worker whose lease has lapsed
+    return Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_until__lt=now)
+
+
+def claim_batch(channel, size, lease, max_attempts):
+    """
+    Up to size due messages of channel, reserved for the caller until the lease lapses.
+
+    Claiming counts as an attempt, so a message whose worker keeps dying is
+    not reclaimed forever: once its attempts are used up it is failed instead.
+    """
+    now = timezone.now()
+    abandoned = OutboxMessage.objects.filter(
+        channel=channel, status='sending', locked_until__lt=now, attempts__gte=max_attempts,
+    ).update(status='failed', claim='', locked_until=None, last_error='Lease lapsed before the message was sent')
+    if abandoned:
+        outbox_messages_total.inc(abandoned, channel=channel, result='failed')
+        logger.warning(f"{abandoned} {channel} messages failed after their last lease lapsed")
+
+    ids = list(
+        OutboxMessage.objects.filter(due_messages(now), channel=channel)
+        .order_by('next_attempt_at').values_list('pk', flat=True)[:size]
+    )
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    # Rows another worker claimed since the SELECT no longer match due_messages()
+    OutboxMessage.objects.filter(due_messages(now), pk__in=ids).update(
+        status='sending', claim=claim, locked_until=now + timedelta(seconds=lease), attempts=F('attempts') + 1,
+    )
+    return list(OutboxMessage.objects.filter(pk__in=ids, claim=claim).select_related('notification'))
+
+
+def retry_delay(attempts, config):
+    return min(config['RETRY_DELAY'] * 2 ** (attempts - 1), config['MAX_RETRY_DELAY'])
+
+
+def record_results(channel, claim, sent, failed, config):
+    """
+    sent: message ids; failed: [(message, error)]
+
+    Only rows still held under claim are updated and counted; a batch whose
+    lease lapsed and was taken over by another worker is that worker's to record.
+    """
+    now = timezone.now()
+    if sent:
+        updated = OutboxMessage.objects.filter(pk__in=sent, claim=claim).update(
+            status='sent', sent_at=now, claim='', locked_until=None, last_error='',
+        )
+        if updated:
+            outbox_messages_total.inc(updated, channel=channel, result='sent')
+
+    # One UPDATE per attempt count and error; a failed connection fails the whole batch alike
+    groups = {}
+    for message, error in failed:
+        groups.setdefault((message.attempts, str(error)[:1000]), []).append(message.pk)
+    for (attempts, error), ids in groups.items():
+        if attempts >= config['MAX_ATTEMPTS']:
+            changes, result = {'status': 'failed'}, 'failed'
+        else:
+            changes = {'status': 'pending', 'next_attempt_at': now + timedelta(seconds=retry_delay(attempts, config))}
+            result = 'retried'
+        updated = OutboxMessage.objects.filter(pk__in=ids, claim=claim).update(
+            claim='', locked_until=None, last_error=error, **changes,
+        )
+        if updated:
+            outbox_messages_total.inc(updated, channel=channel, result=result)
+            logger.warning(f"{updated} {channel} messages {result} after attempt {attempts}: {error}")
+
+
+def _email(connection, message):
+    notification = message.notification
+    return EmailMessage(notification.title, notification.message, to=[message.address], connection=connection)
+
+
+def _sms(connection, message):
+    notification = message.notification
+    return SMSMessage(message.address, f'{notification.title}: {notification.message}')
+
+
+class OutboxWorkerPool:
+    """Threads that claim and deliver due messages of every channel"""
+    BUILDERS = {'email': _email, 'sms': _sms}
+
+    def __init__(self, workers=None, channels=None):
+        self.config = get_outbox_config()
+        self.workers = workers or self.config['WORKERS']
+        self.channels = channels or CHANNELS
+        self.limiters = {channel: RateLimiter(self.config['RATE_LIMITS'].get(channel)) for channel in self.channels}
+        self.stop_event = threading.Event()
+        self.totals = {channel: {'sent': 0, 'failed': 0} for channel in self.channels}
+        self._totals_lock = threading.Lock()
+
+    def open_connection(self, channel):
+        connection = get_connection(fail_silently=False) if channel == 'email' else get_sms_connection()
+        connection.open()
+        return connection
+
+    def deliver(self, channel, batch):
+        sent, failed = [], []
+        build = self.BUILDERS[channel]
+        with outbox_batch_seconds.time(channel=channel):
+            try:
+                connection = self.open_connection(channel)
+            except Exception as e:
+                failed = [(message, e) for message in batch]
+            else:
+                try:
+                    for message in batch:
+                        self.limiters[channel].acquire()
+                        try:
+                            if not connection.send_messages([build(connection, message)]):
+                                raise RuntimeError('Backend reported the message as not sent')
+                        except Exception as e:
+                            failed.append((message, e))
+                        else:
+                            sent.append(message.pk)
+                finally:
+                    connection.close()
+        record_results(channel, batch[0].claim, sent, failed, self.config)
+        with self._totals_lock:
+            self.totals[channel]['sent'] += len(sent)
+            self.totals[channel]['failed'] += len(failed)
+
+    def work(self, drain=False):
+        """Deliver until stopped; with drain, return once nothing is due"""
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                delivered = False
+                for channel in self.channels:
+                    batch = claim_batch(
+                        channel, self.config['BATCH_SIZE'], self.config['LEASE'], self.config['MAX_ATTEMPTS'],
+                    )
+                    if batch:
+                        delivered = True
+                        self.deliver(channel, batch)
+                if not delivered:
+                    if drain:
+                        return
+                    self.stop_event.wait(self.config['POLL_INTERVAL'])
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    def run(self, drain=False):
+        """Run the pool in the calling thread until stopped (or, with drain, until nothing is due)"""
+        if self.workers == 1:
+            return self.work(drain)
+        threads = [
+            threading.Thread(target=self.work, args=(drain,), name=f'outbox-worker-{n}', daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        finally:
+            self.stop_event.set()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,143 @@
+"""
+Resident dashboard bootstrap (GET /api/me/overview/).
+
+build_overview() returns the current user's flats, vehicles, complaints,
+bills, camera requests and notifications in six values() queries, plus one
+for the tenants of the flats and the audience lookup of api.audience for
+notifications: the flat ids from the first query scope the others, so none
+of them needs the owner/tenant joins and DISTINCT of the list endpoints.
+Each collection is capped at its LIMITS entry (newest first) and flagged
+`truncated` when more rows exist.
+
+overview_etag() derives the validator from the model versions of
+api.conditional, so a client whose copy is current gets its 304 before any
+of those queries run.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from .audience import notification_audience_q
+from .conditional import get_versions
+from .expiry import live_notifications_q
+from .inbox import is_read_expression
+from .models import CameraAccessRequest, Complaint, Flat, MaintenanceBill, Notification, NotificationRead, Vehicle
+
+
+DEFAULT_ME_OVERVIEW = {
+    'LIMITS': {
+        'flats': 20,
+        'vehicles': 20,
+        'complaints': 20,
+        'bills': 24,
+        'camera_requests': 20,
+        'notifications': 30,
+    },
+}
+
+# Every model whose changes show in an overview; read marks are tracked per user
+OVERVIEW_DEPENDENCIES = [Flat, Vehicle, Complaint, MaintenanceBill, CameraAccessRequest, Notification]
+
+_datetime = serializers.DateTimeField()
+_decimal = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+def get_overview_config():
+    config = dict(DEFAULT_ME_OVERVIEW)
+    config.update(getattr(settings, 'ME_OVERVIEW', {}))
+    config['LIMITS'] = {**DEFAULT_ME_OVERVIEW['LIMITS'], **config['LIMITS']}
+    return config
+
+
+def _collection(queryset, fields, limit, datetimes=(), decimals=(), related=None):
+    """related: {key: 'fk__field'} values of a related row, read through a join"""
+    related = {key: F(path) for key, path in (related or {}).items()}
+    rows = list(queryset.values(*fields, **related)[:limit + 1])
+    for row in rows:
+        for field in datetimes:
+            row[field] = _datetime.to_representation(row[field]) if row[field] else None
+        for field in decimals:
+            row[field] = _decimal.to_representation(row[field]) if row[field] is not None else None
+    return {'results': rows[:limit], 'truncated': len(rows) > limit}
+
+
+def build_overview(user):
+    limits = get_overview_config()['LIMITS']
+    now = timezone.now()
+
+    flats = _collection(
+        Flat.objects.filter(Q(owner=user) | Q(tenants=user)).distinct().order_by('flat_number'),
+        ['id', 'flat_number', 'building', 'floor', 'bedrooms', 'bathrooms', 'area_sqft',
+         'is_occupied', 'monthly_rent', 'owner_id'],
+        limits['flats'], decimals=['monthly_rent'], related={'owner_username': 'owner__username'},
+    )
+    flat_ids = [flat['id'] for flat in flats['results']]
+    tenants = {}
+    for flat_id, username in Flat.tenants.through.objects.filter(flat_id__in=flat_ids).order_by(
+            'user__username').values_list('flat_id', 'user__username'):
+        tenants.setdefault(flat_id, []).append(username)
+    for flat in flats['results']:
+        flat['role'] = 'owner' if flat.pop('owner_id') == user.pk else 'tenant'
+        flat['tenants'] = tenants.get(flat['id'], [])
+
+    vehicles = _collection(
+        Vehicle.objects.filter(resident=user).order_by('-created_at'),
+        ['id', 'vehicle_number', 'vehicle_type', 'brand', 'model', 'color', 'parking_slot',
+         'is_active', 'created_at'],
+        limits['vehicles'], datetimes=['created_at'],
+    )
+    complaints = _collection(
+        Complaint.objects.filter(Q(author=user) | Q(flat_id__in=flat_ids)).order_by('-created_at'),
+        ['id', 'flat_id', 'title', 'description', 'category', 'priority', 'status', 'admin_response',
+         'created_at', 'resolved_at'],
+        limits['complaints'], datetimes=['created_at', 'resolved_at'], related={'flat_number': 'flat__flat_number'},
+    )
+    bills = _collection(
+        MaintenanceBill.objects.filter(flat_id__in=flat_ids).order_by('-bill_year', '-bill_month', '-id'),
+        ['id', 'flat_id', 'bill_type', 'bill_month', 'bill_year', 'amount', 'due_date', 'status',
+         'payment_date'],
+        limits['bills'], datetimes=['payment_date'], decimals=['amount'], related={'flat_number': 'flat__flat_number'},
+    )
+    camera_requests = _collection(
+        CameraAccessRequest.objects.filter(Q(requester=user) | Q(flat_id__in=flat_ids)).order_by('-requested_at'),
+        ['id', 'flat_id', 'reason', 'requested_date', 'duration_hours', 'status', 'access_link', 'requested_at'],
+        limits['camera_requests'], datetimes=['requested_at'], related={'flat_number': 'flat__flat_number'},
+    )
+
+    notifications = _collection(
+        Notification.objects.filter(
+            notification_audience_q(user), live_notifications_q(now),
+        ).annotate(
+            is_read=is_read_expression(user)
+        ).order_by('-created_at'),
+        ['id', 'title', 'message', 'notification_type', 'priority', 'created_at', 'expires_at', 'is_read'],
+        limits['notifications'], datetimes=['created_at', 'expires_at'],
+    )
+
+    return {
+        'flats': flats,
+        'vehicles': vehicles,
+        'complaints': complaints,
+        'bills': bills,
+        'camera_requests': camera_requests,
+        'notifications': notifications,
+    }
+
+
+def overview_etag(user, media_type):
+    """
+    Validator of user's overview, built from model versions only so a
+    current copy is answered without running build_overview(). The
+    Notification version also moves when the expiry sweep deactivates
+    notifications; the date bounds anything else that depends on time.
+    """
+    versions = get_versions(OVERVIEW_DEPENDENCIES, [NotificationRead], user.pk)
+    state = [
+        user.pk, media_type, timezone.localdate().isoformat(), sorted(versions.items()),
+        sorted(get_overview_config()['LIMITS'].items()),
+    ]
+    return 'W/"%s"' % hashlib.sha1(json.dumps(state).encode()).hexdigest()
@@ -0,0 +1,209 @@
+"""
+Per-request performance accounting.
+
+PerformanceMiddleware collects total, DB, serializer and render time for each
+request, emits them as a Server-Timing header and aggregates them per view
+into latency histograms. Aggregates live in process memory; every worker
+process reports its own numbers.
+"""
+import bisect
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+_local = threading.local()
+
+
+class RequestTimings:
+    __slots__ = ('start', 'queries', 'db', 'serializer', 'render', 'render_start', 'serializer_depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.render = 0.0
+        self.render_start = None
+        self.serializer_depth = 0
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'render;dur={self.render * 1000:.1f}',
+        ])
+
+
+def current_timings():
+    """Timings of the request being handled by this thread, or None"""
+    return getattr(_local, 'timings', None)
+
+
+class QueryTimer:
+    """connection.execute_wrapper() hook counting queries and their duration"""
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings.queries += 1
+            self.timings.db += time.perf_counter() - start
+
+
+class RequestTimer:
+    """Context manager activating timings and DB accounting for one request"""
+
+    def __init__(self):
+        self.timings = RequestTimings()
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        _local.timings = self.timings
+        timer = QueryTimer(self.timings)
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(timer))
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        _local.timings = None
+        return False
+
+
+def install_serializer_timing():
+    """
+    Wrap BaseSerializer.data so top-level serialization time is attributed to
+    the current request. Nested .data calls (e.g. SerializerMethodFields that
+    build their own serializer) are counted once through the depth guard.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, '_timed', False):
+        return
+
+    def data(self):
+        timings = current_timings()
+        if timings is None or timings.serializer_depth:
+            return original.fget(self)
+        timings.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            timings.serializer += time.perf_counter() - start
+            timings.serializer_depth -= 1
+
+    data._timed = True
+    BaseSerializer.data = property(data)
+
+
+class LatencyHistogram:
+    """Fixed log-scale buckets from 1ms to ~65s; percentiles are bucket upper bounds"""
+
+    BOUNDS = tuple(0.001 * 2 ** (i / 2) for i in range(33))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                if index == len(self.BOUNDS):
+                    return self.max
+                return min(self.BOUNDS[index], self.max)
+        return self.max
+
+
+class ViewStats:
+    __slots__ = ('latency', 'queries', 'db', 'serializer', 'render')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.render = 0.0
+
+    def record(self, total, timings):
+        self.latency.observe(total)
+        self.queries += timings.queries
+        self.db += timings.db
+        self.serializer += timings.serializer
+        self.render += timings.render
+
+    def as_dict(self):
+        count = self.latency.count or 1
+        return {
+            'count': self.latency.count,
+            'p50_ms': round(self.latency.percentile(0.50) * 1000, 2),
+            'p95_ms': round(self.latency.percentile(0.95) * 1000, 2),
+            'p99_ms': round(self.latency.percentile(0.99) * 1000, 2),
+            'max_ms': round(self.latency.max * 1000, 2),
+            'total_ms': round(self.latency.sum * 1000, 2),
+            'avg_queries': round(self.queries / count, 2),
+            'avg_db_ms': round(self.db / count * 1000, 2),
+            'avg_serializer_ms': round(self.serializer / count * 1000, 2),
+            'avg_render_ms': round(self.render / count * 1000, 2),
+        }
+
+
+class ViewStatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, view_name, total, timings):
+        with self._lock:
+            stats = self._stats.get(view_name)
+            if stats is None:
+                stats = self._stats[view_name] = ViewStats()
+            stats.record(total, timings)
+
+    def snapshot(self):
+        with self._lock:
+            rows = [dict(view=name, **stats.as_dict()) for name, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+view_stats = ViewStatsRegistry()
+
+
+def get_view_name(view_func, method):
+    """Readable view name: 'ComplaintViewSet.list' for DRF viewsets, the function name otherwise"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
@@ -0,0 +1,217 @@
+"""
+Opt-in sampling profiler for API requests.
+
+While profiling is enabled, every request to a profiled module is registered
+with a background sampler thread that periodically snapshots the request
+thread's Python stack. When the request finishes the profile is kept if the
+request was picked by the sample rate or went over the latency threshold, and
+written in collapsed-stack format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,        # fraction of requests always kept
+    'SLOW_THRESHOLD': 1.0,      # seconds; slower requests are always kept
+    'INTERVAL': 0.005,          # seconds between stack samples
+    'MODULES': ['api.views', 'forum.views'],
+    'DIRECTORY': None,          # defaults to BASE_DIR / 'profiles'
+    'MAX_PER_VIEW': 50,
+}
+
+PROFILE_SUFFIX = '.folded'
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+# <milliseconds since epoch>-<pid>-<duration>ms-<reason>, as written by ProfileStore.save()
+_PROFILE_ID = re.compile(r'(?P<timestamp>\d+)-(?P<pid>\d+)-(?P<duration>\d+)ms-(?P<reason>\w+)')
+
+
+def get_profiling_config():
+    config = dict(DEFAULT_PROFILING)
+    config.update(getattr(settings, 'PROFILING', {}))
+    if config['DIRECTORY'] is None:
+        config['DIRECTORY'] = settings.BASE_DIR / 'profiles'
+    config['DIRECTORY'] = Path(config['DIRECTORY'])
+    return config
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+
+
+class StackSampler:
+    """One background thread sampling the stacks of all registered threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._active[thread_id] = stacks
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        return stacks
+
+    def unregister(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for thread_id, stacks in active:
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                if names:
+                    stacks[';'.join(reversed(names))] += 1
+
+
+class ProfileStore:
+    """Collapsed-stack files grouped in one directory per view"""
+
+    def __init__(self, directory, max_per_view):
+        self.directory = Path(directory)
+        self.max_per_view = max_per_view
+
+    def _view_dir(self, view_name):
+        """The directory of view_name, or None for a name that would leave self.directory"""
+        name = _SAFE_NAME.sub('_', view_name or '')
+        if name in ('', '.', '..'):
+            return None
+        return self.directory / name
+
+    def save(self, view_name, stacks, duration, reason):
+        view_dir = self._view_dir(view_name)
+        if view_dir is None:
+            return None
+        view_dir.mkdir(parents=True, exist_ok=True)
+        profile_id = f'{int(time.time() * 1000)}-{os.getpid()}-{int(duration * 1000)}ms-{reason}'
+        path = view_dir / f'{profile_id}{PROFILE_SUFFIX}'
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        self._prune(view_dir)
+        return profile_id
+
+    def _prune(self, view_dir):
+        profiles = sorted(view_dir.glob(f'*{PROFILE_SUFFIX}'))
+        for path in profiles[:-self.max_per_view]:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def list(self, view_name=None):
+        if not self.directory.exists():
+            return []
+        if view_name:
+            view_dir = self._view_dir(view_name)
+            view_dirs = [view_dir] if view_dir is not None and view_dir.is_dir() else []
+        else:
+            view_dirs = [path for path in self.directory.iterdir() if path.is_dir()]
+        profiles = []
+        for view_dir in view_dirs:
+            for path in view_dir.glob(f'*{PROFILE_SUFFIX}'):
+                match = _PROFILE_ID.fullmatch(path.stem)
+                if match is None:
+                    logger.warning(f"Skipping {path}: not a profile name")
+                    continue
+                profiles.append({
+                    'id': path.stem,
+                    'view': view_dir.name,
+                    'captured_at': int(match['timestamp']) / 1000,
+                    'pid': int(match['pid']),
+                    'duration_ms': int(match['duration']),
+                    'reason': match['reason'],
+                })
+        return sorted(profiles, key=lambda profile: profile['captured_at'], reverse=True)
+
+    def read(self, view_name, profile_id):
+        view_dir = self._view_dir(view_name)
+        if view_dir is None:
+            return None
+        path = view_dir / f'{_SAFE_NAME.sub("_", profile_id)}{PROFILE_SUFFIX}'
+        if not path.is_file():
+            return None
+        return path.read_text()
+
+
+class RequestProfiler:
+    def __init__(self, config):
+        self.config = config
+        self.sampler = StackSampler(config['INTERVAL'])
+        self.store = ProfileStore(config['DIRECTORY'], config['MAX_PER_VIEW'])
+        self.modules = tuple(config['MODULES'])
+
+    def wants(self, view_func):
+        cls = getattr(view_func, 'cls', None)
+        module = (cls or view_func).__module__
+        return module in self.modules
+
+    def start(self):
+        return self.sampler.register(threading.get_ident())
+
+    def finish(self, view_name, duration):
+        stacks = self.sampler.unregister(threading.get_ident())
+        if duration >= self.config['SLOW_THRESHOLD']:
+            reason = 'slow'
+        elif random.random() < self.config['SAMPLE_RATE']:
+            reason = 'sampled'
+        else:
+            return None
+        if not stacks:
+            return None
+        try:
+            return self.store.save(view_name, stacks, duration, reason)
+        except OSError as e:
+            logger.error(f"Failed to store profile for {view_name}: {str(e)}")
+            return None
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Process-wide profiler, or None when settings.PROFILING['ENABLED'] is off"""
+    global _profiler
+    if _profiler is None:
+        config = get_profiling_config()
+        if not config['ENABLED']:
+            return None
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = RequestProfiler(config)
+    return _profiler
+
+
+def get_profile_store():
+    config = get_profiling_config()
+    return ProfileStore(config['DIRECTORY'], config['MAX_PER_VIEW'])
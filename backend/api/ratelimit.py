@@ -0,0 +1,193 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+
+DEFAULT_RATE_LIMIT = {
+    'BACKEND': 'api.ratelimit.CacheBackend',
+    'OPTIONS': {},
+    'LIMIT': 100,       # cost units per window
+    'WINDOW': 60,       # seconds
+    'DEFAULT_COST': 1,
+    # Cost per HTTP method, used when the URL name has no explicit cost
+    'METHOD_COSTS': {'POST': 2, 'PUT': 2, 'PATCH': 2, 'DELETE': 2},
+    # Cost per URL name (see api/urls.py)
+    'COSTS': {'receipt-pdf': 10},
+}
+
+
+class BaseBackend:
+    """Storage for rate limit counters. Implementations must make incr() atomic."""
+
+    def incr(self, key, amount, ttl):
+        """Add ``amount`` to ``key`` and return the new value"""
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+
+class CacheBackend(BaseBackend):
+    """
+    Counters in a Django cache. Cross-process only when the cache itself is
+    shared (Redis, Memcached); LocMemCache gives every process its own budget.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def incr(self, key, amount, ttl):
+        # add() is a no-op when the key exists, so the counter is never reset
+        # by a concurrent request; incr() is atomic on every built-in backend
+        # except FileBasedCache.
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key, amount)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.add(key, 0, ttl)
+            return self.cache.incr(key, amount)
+
+    def get(self, key):
+        return self.cache.get(key, 0)
+
+
+class SQLiteBackend(BaseBackend):
+    """
+    Counters in a standalone SQLite file, shared by every process on the host.
+    Meant for local development and single-host deployments without Redis.
+    """
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path=None, timeout=5.0):
+        self.path = str(path or settings.BASE_DIR / 'ratelimit.sqlite3')
+        self.timeout = timeout
+        self._local = threading.local()
+        self._last_purge = 0
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limits ('
+            'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key, amount, ttl):
+        now = time.time()
+        conn = self._connection()
+        # A single UPSERT statement is atomic, no explicit transaction needed.
+        # An expired row is restarted from zero instead of being incremented.
+        row = conn.execute(
+            'INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'count = CASE WHEN expires_at < ? THEN excluded.count ELSE count + excluded.count END, '
+            'expires_at = CASE WHEN expires_at < ? THEN excluded.expires_at ELSE expires_at END '
+            'RETURNING count',
+            (key, amount, now + ttl, now, now)
+        ).fetchone()
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            conn.execute('DELETE FROM rate_limits WHERE expires_at < ?', (now,))
+        return row[0]
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT count FROM rate_limits WHERE key = ? AND expires_at >= ?',
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+
+class SlidingWindowRateLimiter:
+    """
+    Sliding window counter: the previous fixed window is weighted by how much
+    of it still overlaps the sliding window. Capacity is reserved with an
+    atomic increment and refunded when the request is rejected, so concurrent
+    requests can never be admitted beyond ``limit``.
+    """
+
+    def __init__(self, backend, limit, window):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+
+    def hit(self, key, cost=1, now=None):
+        now = time.time() if now is None else now
+        index, offset = divmod(now, self.window)
+        index = int(index)
+        current_key = f'rl:{key}:{index}'
+        previous_key = f'rl:{key}:{index - 1}'
+
+        previous = self.backend.get(previous_key)
+        weight = 1 - offset / self.window
+        carried = previous * weight
+
+        count = self.backend.incr(current_key, cost, self.window * 2)
+        used = carried + count
+        if used <= self.limit:
+            return RateLimitResult(True, self.limit, int(self.limit - used), 0)
+
+        self.backend.incr(current_key, -cost, self.window * 2)
+        # Earliest moment the decaying previous window frees enough room,
+        # otherwise wait for the next window to start
+        if previous and count <= self.limit:
+            retry_after = math.ceil(self.window * (1 - (self.limit - count) / previous) - offset)
+        else:
+            retry_after = math.ceil(self.window - offset)
+        return RateLimitResult(False, self.limit, 0, max(1, min(retry_after, self.window)))
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limit_config():
+    config = dict(DEFAULT_RATE_LIMIT)
+    config.update(getattr(settings, 'RATE_LIMIT', {}))
+    return config
+
+
+def get_limiter():
+    """Return the process-wide limiter configured by ``settings.RATE_LIMIT``"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                config = get_rate_limit_config()
+                backend_class = import_string(config['BACKEND'])
+                backend = backend_class(**config['OPTIONS'])
+                _limiter = SlidingWindowRateLimiter(backend, config['LIMIT'], config['WINDOW'])
+    return _limiter
+
+
+def reset_limiter():
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+def get_request_cost(request, url_name=None):
+    config = get_rate_limit_config()
+    if url_name and url_name in config['COSTS']:
+        return config['COSTS'][url_name]
+    return config['METHOD_COSTS'].get(request.method, config['DEFAULT_COST'])
@@ -0,0 +1,167 @@
+"""
+Response renderers.
+
+FastJSONRenderer encodes with orjson when it is installed and writes the same
+bytes as DRF's JSONRenderer: compact separators, 'Z' for UTC datetimes, and
+types orjson does not know natively (Decimal, lazy strings, querysets) passed
+through DRF's encoder. Indented output (Accept: application/json; indent=4)
+and values orjson rejects fall back to the DRF renderer.
+
+MessagePackRenderer answers Accept: application/msgpack or ?format=msgpack
+with the same values in MessagePack, encoded by the msgpack package.
+
+Both renderers can also write a response incrementally (stream()).
+StreamingListMixin uses that for pages of at least STREAM_MIN_ROWS rows: the
+rows are serialized and encoded STREAM_CHUNK_ROWS at a time while the body is
+sent, so neither the serialized page nor the encoded body is ever held in
+memory as a whole.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+import msgpack
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+DEFAULT_RENDERERS = {
+    'STREAM_MIN_ROWS': 200,
+    'STREAM_CHUNK_ROWS': 100,
+}
+
+
+def get_renderers_config():
+    config = dict(DEFAULT_RENDERERS)
+    config.update(getattr(settings, 'RENDERERS', {}))
+    return config
+
+
+# DRF's conversions for everything the encoders do not handle themselves
+_encode_default = JSONEncoder().default
+
+
+class RowStream:
+    """The rows of a page, serialized chunk by chunk as the response is written"""
+
+    def __init__(self, serializer, instances, chunk_size):
+        self.serializer = serializer
+        self.instances = instances
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return len(self.instances)
+
+    def chunks(self):
+        to_representation = self.serializer.to_representation
+        for start in range(0, len(self.instances), self.chunk_size):
+            yield [to_representation(instance) for instance in self.instances[start:start + self.chunk_size]]
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+
+class FastJSONRenderer(JSONRenderer):
+    def encode(self, data):
+        if orjson is None:
+            return super().render(data)
+        try:
+            content = orjson.dumps(data, default=_encode_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data)
+        # Same as JSONRenderer: keep the output valid JavaScript
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.encode(data)
+
+    def stream(self, data):
+        yield b'{'
+        for position, (key, value) in enumerate(data.items()):
+            yield (b',' if position else b'') + self.encode(str(key)) + b':'
+            if not isinstance(value, RowStream):
+                yield self.encode(value)
+                continue
+            yield b'['
+            separator = b''
+            for chunk in value.chunks():
+                if chunk:
+                    yield separator + b','.join(self.encode(row) for row in chunk)
+                    separator = b','
+            yield b']'
+        yield b'}'
+
+
+def packb(value):
+    """MessagePack encoding of value; types outside MessagePack are converted as for JSON"""
+    return msgpack.packb(value, default=_encode_default, use_bin_type=True)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data)
+
+    def stream(self, data):
+        packer = msgpack.Packer(default=_encode_default, use_bin_type=True)
+        yield packer.pack_map_header(len(data))
+        for key, value in data.items():
+            yield packer.pack(key)
+            if not isinstance(value, RowStream):
+                yield packer.pack(value)
+                continue
+            yield packer.pack_array_header(len(value))
+            for chunk in value.chunks():
+                yield b''.join(packer.pack(row) for row in chunk)
+
+
+class StreamingListMixin:
+    """
+    ViewSet mixin: write pages of at least STREAM_MIN_ROWS rows with the
+    accepted renderer's stream(), serializing the rows as they are sent.
+
+    Only ActivityLogViewSet uses it: its keyset pages take ?page_size= up to
+    500 rows, the only list that large. Every other list is paginated at
+    PAGE_SIZE (20) rows and never reaches STREAM_MIN_ROWS.
+    """
+
+    def can_stream(self, renderer):
+        if not hasattr(renderer, 'stream'):
+            return False
+        # Indented JSON is left to JSONRenderer
+        return not (isinstance(renderer, JSONRenderer) and
+                    renderer.get_indent(self.request.accepted_media_type, {}))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        config = get_renderers_config()
+        renderer = request.accepted_renderer
+        if len(page) < config['STREAM_MIN_ROWS'] or not self.can_stream(renderer):
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        rows = RowStream(self.get_serializer(page, many=True).child, page, config['STREAM_CHUNK_ROWS'])
+        envelope = self.get_paginated_response(rows).data
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        return StreamingHttpResponse(renderer.stream(envelope), content_type=content_type)
@@ -0,0 +1,219 @@
+"""
+Response cache for list endpoints.
+
+ResponseCacheMixin stores the rendered body of list responses. The key covers
+the requesting user, the full path (page, filters, ?fields=), the negotiated
+media type, the date and the change versions (api.conditional) of the models
+the response renders. A save or delete moves its model's version forward,
+which invalidates every dependent entry at once without looking up or
+deleting a single key; the stale entries are never read again and age out of
+the LRU.
+
+Entries live in an LRU per process bounded by MAX_BYTES and, when
+SHARED_CACHE names a Django cache alias, also in that cache so the other
+processes can serve them. Writes that bypass model signals (queryset.update(),
+bulk_create()) must call api.conditional.bump_version() themselves.
+
+The versions are kept in the default cache. If that cache is local to each
+process, a write handled by one process leaves the others serving the old
+body until it times out, so the cache is off by default and the api.E001
+system check fails when it is enabled on such a backend.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .conditional import get_versions
+from .metrics import record_cache_lookup
+
+
+DEFAULT_RESPONSE_CACHE = {
+    # Needs CACHES['default'] shared by all server processes (see check_response_cache)
+    'ENABLED': False,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'TIMEOUT': 300,
+    'SHARED_CACHE': None,
+}
+
+
+def get_response_cache_config():
+    config = dict(DEFAULT_RESPONSE_CACHE)
+    config.update(getattr(settings, 'RESPONSE_CACHE', {}))
+    return config
+
+
+# Cache backends that keep their values inside one process
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def check_response_cache(app_configs=None, **kwargs):
+    """System check: cached bodies are only invalidated across processes through a shared version cache"""
+    if not get_response_cache_config()['ENABLED']:
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Error(
+        'RESPONSE_CACHE is enabled but the model versions it is keyed on live in a per-process cache',
+        hint="Point CACHES['default'] at a cache all server processes share (Redis, Memcached, the "
+             "database), or set RESPONSE_CACHE['ENABLED'] = False.",
+        id='api.E001',
+    )]
+
+
+class LRUTier:
+    """In-process entries, least recently used evicted first once max_bytes is exceeded"""
+
+    def __init__(self):
+        self._entries = OrderedDict()    # key -> (expires, content_type, content)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, max_bytes):
+        size = len(entry[2])
+        if size > max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += size
+            while self.size > max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self.size -= len(self._entries.pop(key)[2])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class ResponseCache:
+    def __init__(self):
+        self.local = LRUTier()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0}
+        self.local.evictions = 0
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _shared(self):
+        alias = get_response_cache_config()['SHARED_CACHE']
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        """(content_type, content) or None"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('local_hits')
+        else:
+            shared = self._shared()
+            entry = shared.get(key) if shared is not None else None
+            if entry is not None:
+                self._count('shared_hits')
+                self.local.set(key, entry, get_response_cache_config()['MAX_BYTES'])
+            else:
+                self._count('misses')
+        record_cache_lookup('response_cache', entry is not None)
+        return entry[1:] if entry is not None else None
+
+    def set(self, key, content_type, content, timeout):
+        entry = (time.time() + timeout, content_type, bytes(content))
+        self.local.set(key, entry, get_response_cache_config()['MAX_BYTES'])
+        shared = self._shared()
+        if shared is not None:
+            shared.set(key, entry, timeout)
+        self._count('stores')
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        lookups = counts['local_hits'] + counts['shared_hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_ratio': round((lookups - counts['misses']) / lookups, 4) if lookups else None,
+            'evictions': self.local.evictions,
+            'entries': len(self.local),
+            'bytes': self.local.size,
+            'max_bytes': get_response_cache_config()['MAX_BYTES'],
+        }
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMixin:
+    """
+    ViewSet mixin: serve list() from the response cache. Like
+    ConditionalGetMixin it reads response_dependencies, the other models whose
+    rows the response renders, and user_response_dependencies.
+    """
+    response_dependencies = ()
+    user_response_dependencies = ()
+    # Seconds an entry is served; defaults to RESPONSE_CACHE['TIMEOUT']
+    response_cache_timeout = None
+
+    def get_response_cache_key(self):
+        request = self.request
+        models = {self.get_serializer_class().Meta.model, *self.response_dependencies}
+        versions = get_versions(models, self.user_response_dependencies, request.user.pk)
+        state = [
+            request.user.pk, request.get_full_path(), request.accepted_media_type,
+            timezone.localdate().isoformat(), sorted(versions.items()),
+        ]
+        return 'response_cache:' + hashlib.sha1(json.dumps(state).encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        config = get_response_cache_config()
+        if not config['ENABLED']:
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_response_cache_key()
+        cached = response_cache.get(key)
+        if cached is not None:
+            content_type, content = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.response_cache_timeout or config['TIMEOUT']
+
+            def store(rendered):
+                response_cache.set(key, rendered['Content-Type'], rendered.content, timeout)
+            response.add_post_render_callback(store)
+        return response
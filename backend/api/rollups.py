@@ -0,0 +1,158 @@
+"""
+Incrementally maintained statistics rollups.
+
+StatRollup holds, for every tracked entity, the number of objects created
+per local day and per month, split by their current status. The receivers
+in api.signals apply +1/-1 deltas inside the saving transaction: on create,
+on a status change (moving the count between statuses) and on delete.
+Bulk writes that bypass signals should call apply_delta() themselves;
+`manage.py rebuild_stat_rollups` recomputes everything from the source
+tables to repair any drift.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CameraAccessRequest, Complaint, MaintenanceBill, Notification, StatRollup, Vehicle
+
+
+class TrackedEntity:
+    def __init__(self, name, model, date_field, status_field=None):
+        self.name = name
+        self.model = model
+        self.date_field = date_field
+        self.status_field = status_field
+
+    def status_of(self, instance):
+        if self.status_field is None:
+            return ''
+        value = getattr(instance, self.status_field)
+        if isinstance(value, bool):
+            return 'active' if value else 'inactive'
+        return value
+
+    def created_on(self, instance):
+        return timezone.localdate(getattr(instance, self.date_field))
+
+
+TRACKED_ENTITIES = [
+    TrackedEntity('user', User, 'date_joined', 'is_active'),
+    TrackedEntity('complaint', Complaint, 'created_at', 'status'),
+    TrackedEntity('bill', MaintenanceBill, 'created_at', 'status'),
+    TrackedEntity('camera_request', CameraAccessRequest, 'requested_at', 'status'),
+    TrackedEntity('vehicle', Vehicle, 'created_at', 'is_active'),
+    TrackedEntity('notification', Notification, 'created_at', 'is_active'),
+]
+
+ENTITIES_BY_MODEL = {entity.model: entity for entity in TRACKED_ENTITIES}
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def apply_delta(entity_name, day, status, delta):
+    """Add delta to the day and month counters of entity_name/status"""
+    for period, period_start in (('day', day), ('month', month_start(day))):
+        lookup = {'period': period, 'period_start': period_start, 'entity': entity_name, 'status': status}
+        if StatRollup.objects.filter(**lookup).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                StatRollup.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # Created concurrently between our update and insert
+            StatRollup.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def remember_status(entity, instance, update_fields=None):
+    """pre_save hook: keep the stored status so post_save can detect a change"""
+    instance._rollup_previous_status = None
+    if instance.pk is None or entity.status_field is None:
+        return
+    if update_fields is not None and entity.status_field not in update_fields:
+        return
+    previous = entity.model.objects.filter(pk=instance.pk).values_list(entity.status_field, flat=True).first()
+    if isinstance(previous, bool):
+        previous = 'active' if previous else 'inactive'
+    instance._rollup_previous_status = previous
+
+
+def record_save(entity, instance, created):
+    """Apply the deltas for a save; returns the (status, delta) pairs applied"""
+    status = entity.status_of(instance)
+    day = entity.created_on(instance)
+    if created:
+        changes = [(status, 1)]
+    else:
+        previous = getattr(instance, '_rollup_previous_status', None)
+        if previous is None or previous == status:
+            return []
+        changes = [(previous, -1), (status, 1)]
+    for changed_status, delta in changes:
+        apply_delta(entity.name, day, changed_status, delta)
+    return changes
+
+
+def record_delete(entity, instance):
+    changes = [(entity.status_of(instance), -1)]
+    apply_delta(entity.name, entity.created_on(instance), changes[0][0], -1)
+    return changes
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from the source tables; returns rows written"""
+    rows = {}
+    for entity in TRACKED_ENTITIES:
+        values = ['day'] + ([entity.status_field] if entity.status_field else [])
+        grouped = (
+            entity.model.objects.order_by()
+            .annotate(day=TruncDate(entity.date_field, tzinfo=timezone.get_current_timezone()))
+            .values(*values)
+            .annotate(total=Count('pk'))
+        )
+        for group in grouped:
+            status = group.get(entity.status_field, '') if entity.status_field else ''
+            if isinstance(status, bool):
+                status = 'active' if status else 'inactive'
+            for period, period_start in (('day', group['day']), ('month', month_start(group['day']))):
+                key = (period, period_start, entity.name, status)
+                rows[key] = rows.get(key, 0) + group['total']
+
+    with transaction.atomic():
+        StatRollup.objects.all().delete()
+        StatRollup.objects.bulk_create(
+            [
+                StatRollup(period=period, period_start=period_start, entity=name, status=status, count=count)
+                for (period, period_start, name, status), count in rows.items()
+            ],
+            batch_size=1000
+        )
+    return len(rows)
+
+
+def month_totals(entities, month):
+    """{entity: objects created in the month starting at `month`}, one query"""
+    totals = dict.fromkeys(entities, 0)
+    rows = (
+        StatRollup.objects.filter(period='month', period_start=month, entity__in=entities)
+        .values('entity').annotate(total=Sum('count'))
+    )
+    for row in rows:
+        totals[row['entity']] = row['total']
+    return totals
+
+
+def daily_series(entity, start, end, status=None):
+    """[{date, status, count}] for start <= date <= end, read from O(days) rollup rows"""
+    queryset = StatRollup.objects.filter(
+        period='day', entity=entity, period_start__gte=start, period_start__lte=end
+    )
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    return [
+        {'date': row['period_start'], 'status': row['status'], 'count': row['count']}
+        for row in queryset.order_by('period_start', 'status').values('period_start', 'status', 'count')
+    ]
@@ -1,10 +1,19 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from .fieldsets import SparseFieldsetMixin
 from .models import *
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserStubSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Default rendering of related users; ?expand=<field> gives the full UserSerializer"""
+
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -22,13 +31,14 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = UserStubSerializer(read_only=True)
 
     class Meta:
         model = UserProfile
         fields = '__all__'
         read_only_fields = ['failed_login_attempts', 'account_locked_until', 'last_login_ip']
+        expandable_fields = {'user': UserSerializer}
 
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
@@ -102,15 +112,25 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
-class FlatSerializer(serializers.ModelSerializer):
-    owner = UserSerializer(read_only=True)
-    tenants = UserSerializer(many=True, read_only=True)
+class FlatStubSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Default rendering of related flats; ?expand=flat gives the full FlatSerializer"""
+
+    class Meta:
+        model = Flat
+        fields = ['id', 'flat_number', 'building']
+
+
+class FlatSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    owner = UserStubSerializer(read_only=True)
+    tenants = UserStubSerializer(many=True, read_only=True)
     tenant_count = serializers.SerializerMethodField()
     current_occupants = serializers.SerializerMethodField()
 
     class Meta:
         model = Flat
         fields = '__all__'
+        expandable_fields = {'owner': UserSerializer, 'tenants': UserSerializer}
+        field_relations = {'tenant_count': ['tenants'], 'current_occupants': ['owner', 'tenants']}
 
     def get_tenant_count(self, obj):
         return obj.tenants.count()
@@ -132,43 +152,46 @@ class FlatSerializer(serializers.ModelSerializer):
         return occupants
 
 
-class FlatAssignmentSerializer(serializers.ModelSerializer):
-    flat = FlatSerializer(read_only=True)
-    user = UserSerializer(read_only=True)
-    assigned_by = UserSerializer(read_only=True)
+class FlatAssignmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    flat = FlatStubSerializer(read_only=True)
+    user = UserStubSerializer(read_only=True)
+    assigned_by = UserStubSerializer(read_only=True)
 
     class Meta:
         model = FlatAssignment
         fields = '__all__'
+        expandable_fields = {'flat': FlatSerializer, 'user': UserSerializer, 'assigned_by': UserSerializer}
 
 
-class TenantRequestSerializer(serializers.ModelSerializer):
-    tenant = UserSerializer(read_only=True)
-    flat = FlatSerializer(read_only=True)
-    processed_by = UserSerializer(read_only=True)
+class TenantRequestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    tenant = UserStubSerializer(read_only=True)
+    flat = FlatStubSerializer(read_only=True)
+    processed_by = UserStubSerializer(read_only=True)
 
     class Meta:
         model = TenantRequest
         fields = '__all__'
+        expandable_fields = {'tenant': UserSerializer, 'flat': FlatSerializer, 'processed_by': UserSerializer}
 
 
-class VehicleSerializer(serializers.ModelSerializer):
-    resident = UserSerializer(read_only=True)
+class VehicleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    resident = UserStubSerializer(read_only=True)
     vehicle_type_display = serializers.CharField(source='get_vehicle_type_display', read_only=True)
 
     class Meta:
         model = Vehicle
         fields = '__all__'
+        expandable_fields = {'resident': UserSerializer}
 
 
-class ComplaintSerializer(serializers.ModelSerializer):
+class ComplaintSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # ✅ FIX: Allow writing flat ID while still showing full details on read
-    author = UserSerializer(read_only=True)
-    flat = FlatSerializer(read_only=True)
+    author = UserStubSerializer(read_only=True)
+    flat = FlatStubSerializer(read_only=True)
     flat_id = serializers.PrimaryKeyRelatedField(
         queryset=Flat.objects.all(), source='flat', write_only=True
     )
-    resolved_by = UserSerializer(read_only=True)
+    resolved_by = UserStubSerializer(read_only=True)
     priority_display = serializers.CharField(source='get_priority_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     category_display = serializers.CharField(source='get_category_display', read_only=True)
@@ -177,15 +200,17 @@ class ComplaintSerializer(serializers.ModelSerializer):
     class Meta:
         model = Complaint
         fields = '__all__'
+        expandable_fields = {'author': UserSerializer, 'flat': FlatSerializer, 'resolved_by': UserSerializer}
+        property_columns = {'is_overdue': ['estimated_resolution_date', 'status']}
 
 
-class MaintenanceBillSerializer(serializers.ModelSerializer):
+class MaintenanceBillSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # ✅ FIX: Allow writing flat ID while still showing full details on read
-    flat = FlatSerializer(read_only=True)
+    flat = FlatStubSerializer(read_only=True)
     flat_id = serializers.PrimaryKeyRelatedField(
         queryset=Flat.objects.all(), source='flat', write_only=True
     )
-    verified_by = UserSerializer(read_only=True)
+    verified_by = UserStubSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     bill_type_display = serializers.CharField(source='get_bill_type_display', read_only=True)
     total_amount = serializers.ReadOnlyField()
@@ -201,44 +226,134 @@ class MaintenanceBillSerializer(serializers.ModelSerializer):
             'verified_by', 'verified_at', 'created_at', 'updated_at',
             'status_display', 'bill_type_display', 'total_amount', 'is_overdue'
         ]
-
-
-class CameraAccessRequestSerializer(serializers.ModelSerializer):
+        expandable_fields = {'flat': FlatSerializer, 'verified_by': UserSerializer}
+        property_columns = {'total_amount': ['amount', 'late_fee', 'discount'], 'is_overdue': ['due_date', 'status']}
+
+
+class BillingRuleSerializer(serializers.Serializer):
+    bill_type = serializers.ChoiceField(choices=MaintenanceBill.BILL_TYPE_CHOICES)
+    # api.billing.BillingRule
+    method = serializers.ChoiceField(choices=[('flat', 'Flat amount'), ('per_sqft', 'Per square foot')])
+    # Amount per flat, or rate per square foot
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class BillingRunSerializer(serializers.Serializer):
+    """A billing run (api.billing): the month, its rules and optionally which flats"""
+    bill_month = serializers.IntegerField(min_value=1, max_value=12)
+    bill_year = serializers.IntegerField(min_value=2020)
+    rules = BillingRuleSerializer(many=True, allow_empty=False)
+    due_date = serializers.DateField(required=False)
+    building = serializers.CharField(required=False)
+    floor = serializers.IntegerField(required=False, min_value=0)
+    flat_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    def validate_rules(self, rules):
+        bill_types = [rule['bill_type'] for rule in rules]
+        if len(set(bill_types)) != len(bill_types):
+            raise serializers.ValidationError('One rule per bill type')
+        return rules
+
+    def get_flats(self):
+        flats = Flat.objects.all()
+        for field in ('building', 'floor'):
+            if field in self.validated_data:
+                flats = flats.filter(**{field: self.validated_data[field]})
+        if 'flat_ids' in self.validated_data:
+            flats = flats.filter(pk__in=self.validated_data['flat_ids'])
+        return flats
+
+
+class CameraAccessRequestSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     # ✅ FIX: Allow writing flat ID while still showing full details on read
-    requester = UserSerializer(read_only=True)
-    flat = FlatSerializer(read_only=True)
+    requester = UserStubSerializer(read_only=True)
+    flat = FlatStubSerializer(read_only=True)
     flat_id = serializers.PrimaryKeyRelatedField(
         queryset=Flat.objects.all(), source='flat', write_only=True
     )
-    processed_by = UserSerializer(read_only=True)
+    processed_by = UserStubSerializer(read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
 
     class Meta:
         model = CameraAccessRequest
         fields = '__all__'
+        expandable_fields = {'requester': UserSerializer, 'flat': FlatSerializer, 'processed_by': UserSerializer}
 
 
-class NotificationSerializer(serializers.ModelSerializer):
-    created_by = UserSerializer(read_only=True)
-    recipients = UserSerializer(many=True, read_only=True)
-    read_by = UserSerializer(many=True, read_only=True)
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # recipients defaults to an id list; read marks are per user (api.inbox), readers are not listed
+    created_by = UserStubSerializer(read_only=True)
+    recipients = serializers.PrimaryKeyRelatedField(many=True, queryset=User.objects.filter(is_active=True), required=False)
     is_read = serializers.SerializerMethodField()
     is_expired = serializers.ReadOnlyField()
 
     class Meta:
         model = Notification
-        fields = '__all__'
+        exclude = ['read_by']
+        expandable_fields = {'created_by': UserSerializer, 'recipients': UserStubSerializer}
+        property_columns = {'is_expired': ['expires_at']}
 
     def get_is_read(self, obj):
+        # NotificationViewSet annotates is_read; otherwise look up the one read mark
+        if hasattr(obj, 'is_read'):
+            return obj.is_read
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return request.user in obj.read_by.all()
+            return obj.reads.filter(user=request.user).exists()
         return False
 
+    def validate(self, attrs):
+        def current(name):
+            return attrs.get(name, getattr(self.instance, name, None) if self.instance else None)
+
+        if attrs.get('recipients') and 'audience' not in attrs:
+            # Recipients without an audience mean those users, not a broadcast
+            attrs['audience'] = 'users'
+        audience = current('audience') or 'all'
+        if audience == 'users':
+            if current('audience_building') or current('audience_floor') is not None:
+                raise serializers.ValidationError('Building and floor do not apply to selected users')
+            if not attrs.get('recipients') and (self.instance is None or 'recipients' in attrs):
+                raise serializers.ValidationError({'recipients': 'Select at least one user'})
+        else:
+            # Other audiences are resolved per user when read; recipients sent with one are ignored
+            attrs.pop('recipients', None)
+            if self.instance is not None and self.instance.audience == 'users':
+                attrs['recipients'] = []
+        return attrs
 
-class ActivityLogSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+
+class ActivityLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    user = UserStubSerializer(read_only=True)
 
     class Meta:
         model = ActivityLog
         fields = '__all__'
+        expandable_fields = {'user': UserSerializer}
+
+
+class ActivityLogEntrySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Compact activity log row; expects user/content_type joined and content_object prefetched"""
+    user = serializers.SerializerMethodField()
+    content_type = serializers.SerializerMethodField()
+    object_repr = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ActivityLog
+        fields = [
+            'id', 'timestamp', 'action', 'description', 'user', 'ip_address',
+            'content_type', 'object_id', 'object_repr'
+        ]
+
+    def get_user(self, obj):
+        return {'id': obj.user_id, 'username': obj.user.username}
+
+    def get_content_type(self, obj):
+        if obj.content_type_id is None:
+            return None
+        return f'{obj.content_type.app_label}.{obj.content_type.model}'
+
+    def get_object_repr(self, obj):
+        content_object = obj.content_object
+        return str(content_object) if content_object is not None else None
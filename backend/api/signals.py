@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .conditional import track_changes
+from .dashboard import invalidate_dashboard
+from .events import hub
+from .models import (
+    ActivityLog, CameraAccessRequest, Complaint, Flat, MaintenanceBill, Notification, NotificationRead, UserProfile,
+    Vehicle,
+)
+from .rollups import ENTITIES_BY_MODEL, record_delete, record_save, remember_status
+from .user_status import invalidate_user_status
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_status_for_user(sender, instance, **kwargs):
+    invalidate_user_status(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_status_for_profile(sender, instance, **kwargs):
+    invalidate_user_status(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Flat)
+@receiver([post_save, post_delete], sender=Vehicle)
+@receiver([post_save, post_delete], sender=Complaint)
+@receiver([post_save, post_delete], sender=MaintenanceBill)
+@receiver([post_save, post_delete], sender=CameraAccessRequest)
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_admin_dashboard(sender, **kwargs):
+    invalidate_dashboard()
+
+
+# Conditional GET validators (api.conditional); logins only write last_login
+track_changes(User, ignore_fields=['last_login'])
+track_changes(Flat, Vehicle, Complaint, MaintenanceBill, CameraAccessRequest, Notification, ActivityLog)
+# A read mark only changes its reader's notifications
+track_changes(NotificationRead, user_field='user')
+
+
+# Statistics rollups (api.rollups)
+def rollup_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        remember_status(ENTITIES_BY_MODEL[sender], instance, update_fields)
+
+
+def rollup_post_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        entity = ENTITIES_BY_MODEL[sender]
+        publish_stat_changes(entity, record_save(entity, instance, created))
+
+
+def rollup_post_delete(sender, instance, **kwargs):
+    entity = ENTITIES_BY_MODEL[sender]
+    publish_stat_changes(entity, record_delete(entity, instance))
+
+
+for tracked_model in ENTITIES_BY_MODEL:
+    pre_save.connect(rollup_pre_save, sender=tracked_model)
+    post_save.connect(rollup_post_save, sender=tracked_model)
+    post_delete.connect(rollup_post_delete, sender=tracked_model)
+
+
+# Admin dashboard event stream (api.events)
+def publish_stat_changes(entity, changes):
+    if changes:
+        hub.publish_on_commit('admin', 'stats.changed', {
+            'entity': entity.name,
+            'changes': [{'status': status, 'delta': delta} for status, delta in changes],
+        })
+
+
+@receiver(post_save, sender=Complaint)
+def publish_new_complaint(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        hub.publish_on_commit('admin', 'complaint.created', {
+            'id': instance.pk,
+            'flat': instance.flat_id,
+            'title': instance.title,
+            'category': instance.category,
+            'priority': instance.priority,
+        })
+
+
+@receiver(post_save, sender=MaintenanceBill)
+def publish_paid_bill(sender, instance, created, raw=False, **kwargs):
+    # _rollup_previous_status is set by rollup_pre_save
+    if raw or instance.status != 'paid':
+        return
+    if created or getattr(instance, '_rollup_previous_status', None) not in (None, 'paid'):
+        hub.publish_on_commit('admin', 'bill.paid', {
+            'id': instance.pk,
+            'flat': instance.flat_id,
+            'amount': str(instance.amount),
+            'bill_month': instance.bill_month,
+            'bill_year': instance.bill_year,
+        })
+
+
+@receiver(post_save, sender=CameraAccessRequest)
+def publish_camera_request(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.status == 'pending':
+        hub.publish_on_commit('admin', 'camera_request.pending', {
+            'id': instance.pk,
+            'flat': instance.flat_id,
+            'requester': instance.requester_id,
+            'requested_date': instance.requested_date,
+        })
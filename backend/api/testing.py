@@ -0,0 +1,102 @@
+"""
+Helpers shared by the api and forum test suites.
+
+API_TEST_SETTINGS are the settings every test that calls the API runs
+under; reset_api_state() clears what the previous test left in the caches
+and the rate limiter. ApiTestCase sets both up, with an admin and a resident
+to call the API as; QueryBudgetTestCase adds the query-budget helpers.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .ratelimit import reset_limiter
+from .response_cache import response_cache
+
+
+API_TEST_SETTINGS = {
+    # No 429s halfway through a test; the limiter has tests of its own
+    'RATE_LIMIT': {'BACKEND': 'api.ratelimit.CacheBackend', 'LIMIT': 10 ** 9},
+    # Activity logs are written in the request: the background writer's own
+    # connection cannot see, or write next to, the test's open transaction
+    'ACTIVITY_LOG': {'ASYNC': False},
+}
+
+TEST_PASSWORD = 'Test-pass-1'
+
+
+def reset_api_state():
+    """Forget cached versions, counts, responses and rate limit windows"""
+    reset_limiter()
+    cache.clear()
+    response_cache.clear()
+
+
+def token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+@override_settings(**API_TEST_SETTINGS)
+class ApiTestCase(TestCase):
+    """Runs under API_TEST_SETTINGS with an admin and a resident, each with a token client in clients"""
+
+    def setUp(self):
+        reset_api_state()
+        self.addCleanup(reset_limiter)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', TEST_PASSWORD)
+        self.resident = User.objects.create_user('resident', 'resident@example.com', TEST_PASSWORD)
+        self.clients = {'admin': token_client(self.admin), 'resident': token_client(self.resident)}
+
+
+class QueryBudgetTestCase(ApiTestCase):
+    """
+    Base class for query-budget tests: seed() adds a batch of related rows,
+    measure() counts the queries of one GET. Subclasses call every endpoint
+    at a small and a large data size (the default page of 20 not full, then
+    full) and assert that the count is the same and within its budget.
+    """
+    SMALL = 3
+    LARGE = 25
+
+    def setUp(self):
+        super().setUp()
+        self.seeded = 0
+
+    def seed(self, count):
+        raise NotImplementedError
+
+    def grow_to(self, size):
+        self.seed(size - self.seeded)
+        self.seeded = size
+
+    def measure(self, role, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.clients[role].get(url)
+        self.assertLess(response.status_code, 400, f'GET {url} as {role}: {response.status_code}')
+        return [query['sql'] for query in context.captured_queries]
+
+    def assertQueryBudgets(self, endpoints, budgets):
+        """endpoints: [(name, role, url_factory)]; url_factory runs after seeding"""
+        self.grow_to(self.SMALL)
+        small = {name: self.measure(role, url()) for name, role, url in endpoints}
+        self.grow_to(self.LARGE)
+        report, failures = [], []
+        for name, role, url in endpoints:
+            large = self.measure(role, url())
+            budget = budgets[name]
+            report.append(f'{name:<40} {len(small[name]):>3} -> {len(large):>3} (budget {budget})')
+            if len(large) != len(small[name]) or len(large) > budget:
+                queries = '\n    '.join(large)
+                failures.append(
+                    f'{name}: {len(small[name])} queries at {self.SMALL} rows, {len(large)} at '
+                    f'{self.LARGE} rows, budget {budget}\n    {queries}'
+                )
+        if failures:
+            self.fail('Query budget exceeded\n' + '\n'.join(report) + '\n\n' + '\n\n'.join(failures))
@@ -1,3 +1,1822 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from pathlib import Path
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from . import urls as api_urls
+from .models import (
+    ActivityLog, CameraAccessRequest, Complaint, Flat, MaintenanceBill, Notification, NotificationRead, OutboxMessage,
+    StatRollup, UserProfile, Vehicle,
+)
+from .activity import ActivityLogWriter
+from .archive import ActivityLogArchive, archive_activity_logs, get_retention_config, query_archive
+from .dashboard import LOCK_KEY, SNAPSHOT_KEY, compute_dashboard, get_dashboard_snapshot, invalidate_dashboard
+from .events import EventHub, hub, issue_stream_ticket, stream_subscription, stream_ticket_user_id
+from .expiry import archive_notifications, deactivate_expired_notifications
+from .inbox import open_notification_stream, unread_count
+from .metrics import process_file_path, registry as metrics_registry, remove_process_file
+from .outbox import BaseSMSBackend, OutboxWorkerPool, claim_batch, get_outbox_config, record_results, sms_outbox
+from .middleware import get_client_ip
+from .performance import LatencyHistogram, RequestTimer, install_serializer_timing, view_stats
+from .profiler import ProfileStore, RequestProfiler, get_profiling_config
+from .ratelimit import CacheBackend, SlidingWindowRateLimiter, reset_limiter
+from .renderers import FastJSONRenderer, packb
+from .response_cache import LRUTier, check_response_cache, response_cache
+from .rollups import apply_delta, rebuild_rollups
+from .serializers import ComplaintSerializer
+from .testing import TEST_PASSWORD, ApiTestCase, QueryBudgetTestCase
+from .user_status import get_user_status, record_status_check
+
+
+# Queries per request, including the token lookup, the pagination COUNT and the
+# conditional GET aggregate (api.conditional) on router endpoints
+API_QUERY_BUDGETS = {
+    'user-list': 4,
+    'user-detail': 3,
+    'flat-list': 5,
+    'flat-detail': 4,
+    'vehicle-list': 4,
+    'vehicle-detail': 3,
+    'complaint-list': 4,
+    'complaint-detail': 3,
+    'bill-list': 4,
+    'bill-detail': 3,
+    'camerarequest-list': 4,
+    'camerarequest-detail': 3,
+    'notification-list': 5,
+    'notification-detail': 4,
+    # One query per content type on the page resolves content_object
+    'activitylog-list': 10,
+    'activitylog-detail': 4,
+    'resident:flat-list': 5,
+    'resident:complaint-list': 4,
+    'resident:bill-list': 4,
+    'resident:camerarequest-list': 4,
+    # Plus the user's flats for the notification audiences (api.audience)
+    'resident:notification-list': 6,
+    # Recounted once the seeding has moved the notification versions (api.inbox)
+    'notification-unread-count': 3,
+    'user-status': 3,
+    'me-overview': 9,
+    'admin-dashboard': 10,
+    'admin-daily-stats': 2,
+}
+
+
+class ApiQueryBudgetTests(QueryBudgetTestCase):
+    def seed(self, count):
+        today = date.today()
+        for _ in range(count):
+            n = Flat.objects.count()
+            owner = User.objects.create_user(f'owner{n}', f'owner{n}@example.com', TEST_PASSWORD)
+            tenant = User.objects.create_user(f'tenant{n}', f'tenant{n}@example.com', TEST_PASSWORD)
+            flat = Flat.objects.create(flat_number=f'B{n}', owner=owner, building='B', floor=n % 10)
+            flat.tenants.add(tenant, self.resident)
+            complaint = Complaint.objects.create(author=tenant, flat=flat, title=f'Leak {n}', description='Water')
+            bill = MaintenanceBill.objects.create(
+                flat=flat, bill_month=1 + n % 12, bill_year=2025, amount=1500, due_date=today - timedelta(days=n)
+            )
+            camera_request = CameraAccessRequest.objects.create(requester=tenant, flat=flat, reason='Parcel', requested_date=today)
+            vehicle = Vehicle.objects.create(resident=owner, vehicle_number=f'MH12AB{n:04d}')
+            notification = Notification.objects.create(
+                title=f'Notice {n}', message='Water cut', created_by=self.admin, audience='users'
+            )
+            notification.recipients.add(owner, tenant, self.resident)
+            notification.read_by.add(owner, self.admin)
+            # One log entry per content type, so every page resolves all of them
+            for target in (complaint, flat, bill, camera_request, vehicle, notification, owner):
+                ActivityLog.objects.create(user=tenant, action='create', description='Seeded', content_object=target)
+
+    def router_endpoints(self):
+        endpoints = []
+        for prefix, viewset, basename in api_urls.router.registry:
+            model = viewset.serializer_class.Meta.model
+            endpoints.append((f'{basename}-list', 'admin', lambda b=basename: reverse(f'{b}-list')))
+            endpoints.append((
+                f'{basename}-detail', 'admin',
+                lambda b=basename, m=model: reverse(f'{b}-detail', args=[m.objects.order_by('pk').last().pk])
+            ))
+        return endpoints
+
+    def test_every_router_endpoint_has_a_budget(self):
+        names = {name for name, role, url in self.router_endpoints()}
+        self.assertEqual(names - set(API_QUERY_BUDGETS), set())
+
+    def test_query_counts_do_not_grow_with_page_size(self):
+        resident_lists = ['flat-list', 'complaint-list', 'bill-list', 'camerarequest-list', 'notification-list']
+        endpoints = self.router_endpoints() + [
+            (f'resident:{name}', 'resident', lambda n=name: reverse(n)) for name in resident_lists
+        ] + [
+            ('notification-unread-count', 'resident', lambda: reverse('notification-unread-count')),
+            ('user-status', 'resident', lambda: reverse('user-status')),
+            ('me-overview', 'resident', lambda: reverse('me-overview')),
+            ('admin-dashboard', 'admin', lambda: reverse('admin-dashboard')),
+            ('admin-daily-stats', 'admin', lambda: reverse('admin-daily-stats') + '?entity=complaint'),
+        ]
+        self.assertQueryBudgets(endpoints, API_QUERY_BUDGETS)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class FastReadParityTests(ApiTestCase):
+    """The values()-based list path (api.fastread) must render byte-identical JSON"""
+
+    def create_flats(self, count):
+        """Flats with a complaint, a bill and a notification each, every optional field set on some"""
+        today = date.today()
+        for n in range(count):
+            owner = User.objects.create_user(f'parity{n}', f'parity{n}@example.com', TEST_PASSWORD)
+            flat = Flat.objects.create(flat_number=f'P{n}', owner=owner if n % 3 else None, building='P')
+            flat.tenants.add(self.resident)
+            complaint = Complaint.objects.create(
+                author=owner, flat=flat, title=f'Noise {n}', description='Loud', priority='urgent',
+                category=['noise', 'parking', 'other'][n % 3], status=['open', 'resolved'][n % 2],
+                estimated_resolution_date=today - timedelta(days=1) if n % 2 == 0 else None,
+            )
+            if n % 2:
+                Complaint.objects.filter(pk=complaint.pk).update(resolved_by=self.admin, image='complaints/p.png')
+            bill = MaintenanceBill.objects.create(
+                flat=flat, bill_month=1 + n % 12, bill_year=2025, amount='1250.50', late_fee=n, discount='0.25',
+                due_date=today + timedelta(days=n - 2), status=['unpaid', 'paid'][n % 2],
+            )
+            if n % 2:
+                MaintenanceBill.objects.filter(pk=bill.pk).update(
+                    verified_by=self.admin, payment_screenshot='payments/p.png', payment_mode='upi'
+                )
+            notification = Notification.objects.create(
+                title=f'Lift {n}', message='Maintenance', created_by=self.admin, priority='high',
+                audience='users' if n % 2 else 'all', expires_at=timezone.now() + timedelta(days=n - 1) if n % 3 else None,
+            )
+            if n % 2:
+                notification.recipients.add(owner, self.resident)
+            if n % 3 == 0:
+                notification.read_by.add(self.resident, self.admin)
+
+    def test_list_endpoints_match_serializer_output(self):
+        self.create_flats(8)
+        urls = [
+            '/api/complaints/', '/api/complaints/?ordering=title', '/api/complaints/?status=open',
+            '/api/complaints/?fields=id,title,flat.flat_number,is_overdue',
+            '/api/bills/', '/api/bills/?status=paid', '/api/bills/?fields=id,total_amount,verified_by',
+            '/api/notifications/', '/api/notifications/?fields=id,is_read,recipients',
+        ]
+        for role in ('admin', 'resident'):
+            for url in urls:
+                with override_settings(FAST_READ={'ENABLED': False}):
+                    expected = self.clients[role].get(url)
+                fast = self.clients[role].get(url)
+                self.assertEqual(expected.status_code, 200, url)
+                self.assertEqual(fast.content, expected.content, f'{url} as {role}')
+
+    def test_unsupported_fields_fall_back_to_serializer(self):
+        self.create_flats(1)
+        response = self.clients['admin'].get('/api/complaints/?expand=flat')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tenants', response.json()['results'][0]['flat'])
+
+
+class SparseFieldsetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = User.objects.create_user('owner', 'owner@example.com', TEST_PASSWORD)
+        self.flat = Flat.objects.create(flat_number='S1', owner=owner, building='S')
+        self.flat.tenants.add(self.resident)
+        Complaint.objects.create(author=self.resident, flat=self.flat, title='Leak', description='Water')
+
+    def get_complaint(self, query):
+        response = self.clients['admin'].get(f'/api/complaints/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results'][0]
+
+    def test_fields_select_top_level_and_nested_fields(self):
+        self.assertEqual(set(self.get_complaint('fields=id,title')), {'id', 'title'})
+        complaint = self.get_complaint('fields=id,flat.flat_number')
+        self.assertEqual(complaint['flat'], {'flat_number': 'S1'})
+
+    def test_expand_replaces_the_stub(self):
+        self.assertEqual(set(self.get_complaint('fields=flat')['flat']), {'id', 'flat_number', 'building'})
+        flat = self.get_complaint('expand=flat')['flat']
+        self.assertEqual([tenant['username'] for tenant in flat['tenants']], ['resident'])
+        flat = self.get_complaint('expand=flat,flat.owner&fields=flat.owner.email')['flat']
+        self.assertEqual(flat, {'owner': {'email': 'owner@example.com'}})
+
+    def test_unknown_fields_are_rejected(self):
+        for fast_read in (True, False):
+            with override_settings(FAST_READ={'ENABLED': fast_read}):
+                response = self.clients['admin'].get('/api/complaints/?fields=id,colour')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'fields': ['Unknown field: colour']})
+                response = self.clients['admin'].get('/api/complaints/?fields=flat.colour')
+                self.assertEqual(response.json(), {'fields': ['Unknown field: flat.colour']})
+                response = self.clients['admin'].get('/api/complaints/?expand=title')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'expand': ['Cannot expand: title']})
+
+    def test_query_hints_follow_the_selected_fields(self):
+        def hints(**kwargs):
+            return ComplaintSerializer(**kwargs).get_query_hints()
+
+        self.assertEqual(hints(), (['author', 'flat', 'resolved_by'], []))
+        self.assertEqual(hints(fields={'id': {}, 'title': {}}), ([], []))
+        self.assertEqual(hints(fields={'flat': {}}), (['flat'], []))
+        self.assertEqual(
+            hints(fields={'flat': {}}, expand={'flat': {}}), (['flat', 'flat__owner'], ['flat__tenants'])
+        )
+        # Computed fields pull in the relations they read
+        self.assertEqual(hints(fields={'flat': {'tenant_count': {}}}, expand={'flat': {}}), (['flat'], ['flat__tenants']))
+
+    @override_settings(FAST_READ={'ENABLED': False})
+    def test_omitted_relations_are_not_joined(self):
+        def complaint_query(query):
+            with CaptureQueriesContext(connection) as queries:
+                self.get_complaint(query)
+            table = f'FROM "{Complaint._meta.db_table}"'
+            return [q['sql'] for q in queries.captured_queries if table in q['sql'] and 'COUNT' not in q['sql']]
+
+        [sql] = complaint_query('fields=id,title')
+        self.assertNotIn('JOIN', sql)
+        [sql] = complaint_query('fields=id,flat.flat_number')
+        self.assertIn(f'JOIN "{Flat._meta.db_table}"', sql)
+        self.assertNotIn(f'"{User._meta.db_table}"', sql)
+
+
+class ConditionalGetTests(ApiTestCase):
+    """ETag / Last-Modified validators of the router endpoints (api.conditional)"""
+
+    def create_complaints(self, count):
+        for n in range(count):
+            flat = Flat.objects.create(flat_number=f'C{n}', owner=self.resident, building='C')
+            Complaint.objects.create(author=self.resident, flat=flat, title=f'Lift {n}', description='Stuck')
+
+    def create_notifications(self, count):
+        for n in range(count):
+            notification = Notification.objects.create(
+                title=f'Notice {n}', message='Water cut', created_by=self.admin, audience='users'
+            )
+            notification.recipients.add(self.resident)
+
+    def revalidate(self, role, url, response):
+        return self.clients[role].get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_responses_are_not_modified(self):
+        self.create_complaints(1)
+        complaint = Complaint.objects.first()
+        for url in ['/api/complaints/', '/api/complaints/?status=open', f'/api/complaints/{complaint.pk}/']:
+            response = self.clients['resident'].get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+            # Token lookup and the aggregate, nothing serialized
+            with self.assertNumQueries(2):
+                revalidated = self.revalidate('resident', url, response)
+            self.assertEqual(revalidated.status_code, 304, url)
+            self.assertEqual(revalidated.content, b'')
+            since = self.clients['resident'].get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(since.status_code, 304, url)
+
+    def test_changes_to_rows_and_related_rows_invalidate(self):
+        self.create_complaints(2)
+        url = '/api/complaints/'
+        changes = [
+            lambda: Complaint.objects.first().save(),
+            lambda: Flat.objects.filter(pk=Complaint.objects.first().flat_id).get().save(),
+            lambda: Complaint.objects.last().delete(),
+        ]
+        for change in changes:
+            response = self.clients['resident'].get(url)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(self.revalidate('resident', url, response).status_code, 200)
+
+    def test_read_marks_invalidate_notifications(self):
+        self.create_notifications(1)
+        url = '/api/notifications/'
+        response = self.clients['resident'].get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.first().read_by.add(self.resident)
+        self.assertEqual(self.revalidate('resident', url, response).status_code, 200)
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True})
+    def test_read_marks_only_invalidate_their_reader(self):
+        self.create_notifications(1)
+        url = '/api/notifications/'
+        response = self.clients['resident'].get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['admin'].post(f'/api/notifications/{Notification.objects.first().pk}/mark_read/')
+        self.assertEqual(self.revalidate('resident', url, response).status_code, 304)
+        # The body still comes from the response cache: token, flats and the aggregate only
+        with self.assertNumQueries(3):
+            self.assertEqual(self.clients['resident'].get(url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['resident'].post(f'/api/notifications/{Notification.objects.first().pk}/mark_read/')
+        self.assertEqual(self.revalidate('resident', url, response).status_code, 200)
+
+    def test_validators_differ_per_user_and_query(self):
+        self.create_complaints(1)
+        response = self.clients['admin'].get('/api/complaints/')
+        self.assertEqual(self.revalidate('resident', '/api/complaints/', response).status_code, 200)
+        self.assertEqual(self.revalidate('admin', '/api/complaints/?fields=id', response).status_code, 200)
+        self.assertEqual(self.revalidate('admin', '/api/complaints/', response).status_code, 304)
+
+    def test_missing_objects_still_404(self):
+        self.assertEqual(self.clients['resident'].get('/api/complaints/999999/').status_code, 404)
+
+
+class UserStatusTests(ApiTestCase):
+    """Cached status payload and login-session folding (api.user_status)"""
+
+    def login_rows(self, user):
+        return ActivityLog.objects.filter(user=user, action='login')
+
+    def test_payload_is_cached_until_the_user_or_profile_changes(self):
+        get_user_status(self.resident)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_status(self.resident)['bio'], '')
+
+        profile = UserProfile.objects.get(user=self.resident)
+        profile.bio = 'Flat A1'
+        profile.save()
+        self.assertEqual(get_user_status(self.resident)['bio'], 'Flat A1')
+
+        self.resident.first_name = 'Asha'
+        self.resident.save()
+        self.assertEqual(get_user_status(self.resident)['first_name'], 'Asha')
+        # Only the changed user is dropped
+        get_user_status(self.admin)
+        self.resident.save()
+        with self.assertNumQueries(0):
+            get_user_status(self.admin)
+
+    def test_endpoint_serves_the_cached_payload(self):
+        url = reverse('user-status')
+        first = self.clients['resident'].get(url)
+        self.assertEqual(first.json()['username'], 'resident')
+        # Only the token lookup: the payload and the session both come from the cache
+        with self.assertNumQueries(1):
+            second = self.clients['resident'].get(url)
+        self.assertEqual(second.json(), first.json())
+
+    def test_checks_fold_into_one_login_row_per_session(self):
+        start = timezone.now()
+        with mock.patch('django.utils.timezone.now') as now:
+            now.return_value = start
+            for _ in range(3):
+                record_status_check(self.resident, '10.0.0.1', 'tests')
+            [row] = self.login_rows(self.resident)
+            self.assertEqual(row.description, 'User resident checked status')
+
+            # Refreshed at most once per SESSION_UPDATE_INTERVAL
+            now.return_value = start + timedelta(minutes=6)
+            record_status_check(self.resident, '10.0.0.1', 'tests')
+            row.refresh_from_db()
+            self.assertTrue(row.description.startswith('User resident checked status 4 times'))
+            now.return_value = start + timedelta(minutes=7)
+            record_status_check(self.resident, '10.0.0.1', 'tests')
+            self.assertEqual(self.login_rows(self.resident).get().description, row.description)
+
+            # Other users have sessions of their own
+            record_status_check(self.admin, '10.0.0.2', 'tests')
+            self.assertEqual(self.login_rows(self.admin).count(), 1)
+
+            # An idle gap starts a new session
+            now.return_value = start + timedelta(minutes=40)
+            record_status_check(self.resident, '10.0.0.1', 'tests')
+            self.assertEqual(self.login_rows(self.resident).count(), 2)
+
+    def test_repeated_requests_log_one_login(self):
+        for _ in range(5):
+            self.assertEqual(self.clients['resident'].get(reverse('user-status')).status_code, 200)
+        self.assertEqual(self.login_rows(self.resident).count(), 1)
+
+
+class MeOverviewTests(ApiTestCase):
+    """Resident dashboard bootstrap and its version-based validator (api.overview)"""
+
+    def overview(self, **headers):
+        return self.clients['resident'].get('/api/me/overview/', **headers)
+
+    def test_payload_holds_the_users_own_rows(self):
+        neighbour = User.objects.create_user('neighbour', 'neighbour@example.com', TEST_PASSWORD)
+        owned = Flat.objects.create(flat_number='A-101', building='A', owner=self.resident)
+        owned.tenants.add(neighbour)
+        rented = Flat.objects.create(flat_number='B-202', building='B', owner=neighbour)
+        rented.tenants.add(self.resident)
+        other = Flat.objects.create(flat_number='C-303', building='C', owner=neighbour)
+        Vehicle.objects.create(resident=self.resident, vehicle_number='MH12AB0001')
+        Complaint.objects.create(author=self.resident, flat=owned, title='Leak', description='Kitchen')
+        Complaint.objects.create(author=neighbour, flat=other, title='Noise', description='Elsewhere')
+        MaintenanceBill.objects.create(flat=rented, bill_month=5, bill_year=2026, amount='1250.50',
+                                       due_date=date(2026, 5, 10))
+        CameraAccessRequest.objects.create(requester=self.resident, flat=owned, reason='Parcel',
+                                           requested_date=date(2026, 5, 1))
+        read, unread = (Notification.objects.create(title=title, message='-', created_by=self.admin)
+                        for title in ('Lift', 'Water'))
+        NotificationRead.objects.create(user=self.resident, notification=read)
+
+        payload = self.overview().json()
+        self.assertEqual([(flat['flat_number'], flat['role'], flat['owner_username'], flat['tenants'])
+                          for flat in payload['flats']['results']],
+                         [('A-101', 'owner', 'resident', ['neighbour']), ('B-202', 'tenant', 'neighbour', ['resident'])])
+        self.assertEqual([row['vehicle_number'] for row in payload['vehicles']['results']], ['MH12AB0001'])
+        self.assertEqual([(row['title'], row['description'], row['flat_number'])
+                          for row in payload['complaints']['results']], [('Leak', 'Kitchen', 'A-101')])
+        self.assertEqual([(row['amount'], row['flat_number']) for row in payload['bills']['results']],
+                         [('1250.50', 'B-202')])
+        self.assertEqual([(row['reason'], row['flat_number']) for row in payload['camera_requests']['results']],
+                         [('Parcel', 'A-101')])
+        self.assertEqual({row['id']: row['is_read'] for row in payload['notifications']['results']},
+                         {read.pk: True, unread.pk: False})
+        self.assertFalse(any(collection['truncated'] for collection in payload.values()))
+
+    @override_settings(ME_OVERVIEW={'LIMITS': {'vehicles': 2}})
+    def test_collections_are_capped_newest_first(self):
+        for n in range(3):
+            Vehicle.objects.create(resident=self.resident, vehicle_number=f'MH12AB{n:04d}')
+        Vehicle.objects.filter(vehicle_number='MH12AB0000').update(created_at=timezone.now() - timedelta(days=1))
+        vehicles = self.overview().json()['vehicles']
+        self.assertEqual(len(vehicles['results']), 2)
+        self.assertNotIn('MH12AB0000', [row['vehicle_number'] for row in vehicles['results']])
+        self.assertTrue(vehicles['truncated'])
+
+    def test_current_copies_are_not_rebuilt(self):
+        flat = Flat.objects.create(flat_number='A-101', building='A', owner=self.resident)
+        notification = Notification.objects.create(title='Lift', message='-', created_by=self.admin)
+        etag = self.overview()['ETag']
+        # Token lookup only: the validator comes from the cached versions
+        with self.assertNumQueries(1):
+            response = self.overview(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Another user's read mark leaves this validator alone, the resident's own does not
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationRead.objects.create(user=self.admin, notification=notification)
+        self.assertEqual(self.overview(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationRead.objects.create(user=self.resident, notification=notification)
+        response = self.overview(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.create(author=self.resident, flat=flat, title='Leak', description='Kitchen')
+        self.assertEqual(self.overview(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.clients['admin'].get('/api/me/overview/')['ETag'], etag)
+
+
+# One test process: the per-process default cache holds every version
+@override_settings(RESPONSE_CACHE={'ENABLED': True})
+class ResponseCacheTests(ApiTestCase):
+    """Rendered list responses (api.response_cache)"""
+
+    def create_complaints(self, count):
+        for n in range(count):
+            flat = Flat.objects.create(flat_number=f'R{n}', owner=self.resident, building='R')
+            Complaint.objects.create(author=self.resident, flat=flat, title=f'Leak {n}', description='Water')
+
+    def test_repeated_lists_are_served_from_cache(self):
+        self.create_complaints(2)
+        response_cache.reset_stats()
+        first = self.clients['resident'].get('/api/complaints/')
+        # Token lookup and the conditional GET aggregate
+        with self.assertNumQueries(2):
+            second = self.clients['resident'].get('/api/complaints/')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        stats = response_cache.stats()
+        self.assertEqual((stats['local_hits'], stats['misses'], stats['stores']), (1, 1, 1))
+
+    def test_writes_invalidate_dependent_entries(self):
+        self.create_complaints(2)
+        url = '/api/complaints/?fields=id,title,flat.flat_number'
+        self.clients['resident'].get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            flat = Flat.objects.get(flat_number='R0')
+            flat.flat_number = 'R0-renamed'
+            flat.save()
+        self.assertContains(self.clients['resident'].get(url), 'R0-renamed')
+        with self.captureOnCommitCallbacks(execute=True):
+            Complaint.objects.filter(title='Leak 1').get().delete()
+        self.assertNotContains(self.clients['resident'].get(url), 'Leak 1')
+
+    def test_entries_are_per_user(self):
+        self.create_complaints(1)
+        flat = Flat.objects.create(flat_number='R-other', building='R')
+        Complaint.objects.create(author=self.admin, flat=flat, title='Admin only', description='Lobby')
+        url = '/api/complaints/?fields=id,title'
+        self.assertContains(self.clients['admin'].get(url), 'Admin only')
+        self.assertNotContains(self.clients['resident'].get(url), 'Admin only')
+
+    def test_enabling_needs_a_shared_version_cache(self):
+        self.assertEqual([error.id for error in check_response_cache()], ['api.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_response_cache(), [])
+        with override_settings(RESPONSE_CACHE={'ENABLED': False}):
+            self.assertEqual(check_response_cache(), [])
+
+    def test_lru_tier_stays_within_max_bytes(self):
+        tier = LRUTier()
+        entry = (time.time() + 60, 'application/json', b'x' * 40)
+        tier.set('first', entry, max_bytes=100)
+        tier.set('second', entry, max_bytes=100)
+        tier.get('first')
+        tier.set('third', entry, max_bytes=100)
+        self.assertEqual(tier.size, 80)
+        self.assertIsNotNone(tier.get('first'))
+        self.assertIsNone(tier.get('second'))
+        self.assertEqual(tier.evictions, 1)
+
+
+class RendererTests(ApiTestCase):
+    """FastJSONRenderer, MessagePackRenderer and streamed pages (api.renderers)"""
+
+    def create_logs(self, count):
+        ActivityLog.objects.bulk_create([
+            ActivityLog(user=self.admin, action='update', description=f'Entry {n}', content_object=self.resident)
+            for n in range(count)
+        ])
+
+    def test_fast_json_matches_drf_renderer(self):
+        ist = dt_timezone(timedelta(hours=5, minutes=30))
+        data = {
+            'amount': Decimal('1250.50'), 'now': timezone.now(), 'local': datetime(2025, 1, 2, 3, 4, 5, 120000, ist),
+            'naive': datetime(2025, 1, 2, 3, 4, 5), 'day': date(2025, 1, 2), 'id': uuid.uuid4(),
+            'label': gettext_lazy('Open'), 'text': 'line\u2028separator é', 'values': [1, None, True, 2.5, -3],
+            'huge': 2 ** 70, 'nested': {'ids': (1, 2)},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_messagepack_encoding(self):
+        self.assertEqual(packb({'a': [1, None, True]}), b'\x81\xa1a\x93\x01\xc0\xc3')
+        self.assertEqual(packb([0] * 16)[:3], b'\xdc\x00\x10')
+        self.assertEqual(packb('x' * 40)[:2], b'\xd9\x28')
+        self.assertEqual(packb([-1, -33, 300, 1.5]), b'\x94\xff\xd0\xdf\xcd\x01\x2c\xcb?\xf8\x00\x00\x00\x00\x00\x00')
+        # Values outside MessagePack are converted as for JSON
+        self.assertEqual(msgpack.unpackb(packb({'amount': Decimal('1250.50'), 'day': date(2025, 1, 2)})),
+                         {'amount': 1250.5, 'day': '2025-01-02'})
+
+    def test_messagepack_is_negotiated(self):
+        self.create_logs(3)
+        as_json = self.clients['admin'].get('/api/activity-logs/')
+        as_msgpack = self.clients['admin'].get('/api/activity-logs/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(as_msgpack['Content-Type'], 'application/msgpack')
+        self.assertEqual(as_msgpack.content, packb(as_json.json()))
+        self.assertEqual(self.clients['admin'].get('/api/activity-logs/?format=msgpack').content, as_msgpack.content)
+
+    def test_large_pages_are_streamed(self):
+        self.create_logs(250)
+        for accept in ('application/json', 'application/msgpack'):
+            streamed = self.clients['admin'].get('/api/activity-logs/?page_size=250', HTTP_ACCEPT=accept)
+            self.assertTrue(streamed.streaming)
+            with override_settings(RENDERERS={'STREAM_MIN_ROWS': 10 ** 6}):
+                whole = self.clients['admin'].get('/api/activity-logs/?page_size=250', HTTP_ACCEPT=accept)
+            self.assertFalse(whole.streaming)
+            self.assertEqual(b''.join(streamed.streaming_content), whole.content, accept)
+
+
+class NotificationAudienceTests(ApiTestCase):
+    """Audience rules resolved per user at query time (api.audience)"""
+
+    def visible_titles(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return {row['title'] for row in client.get('/api/notifications/?fields=title').json()['results']}
+
+    def notify(self, title, **audience):
+        return Notification.objects.create(title=title, message='-', created_by=self.admin, **audience)
+
+    def test_broadcast_writes_no_recipient_rows(self):
+        response = self.clients['admin'].post('/api/notifications/', {
+            'title': 'Water cut', 'message': 'Tomorrow 10-12', 'audience': 'all',
+            # Ignored for every audience but 'users'
+            'recipients': [self.admin.pk, self.resident.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['audience'], 'all')
+        self.assertFalse(Notification.recipients.through.objects.exists())
+        later = User.objects.create_user('newcomer', 'newcomer@example.com', TEST_PASSWORD)
+        self.assertEqual(self.visible_titles(later), {'Water cut'})
+
+    def test_recipients_without_audience_target_those_users(self):
+        response = self.clients['admin'].post('/api/notifications/', {
+            'title': 'Parking', 'message': 'Move your car', 'recipients': [self.resident.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['audience'], 'users')
+        self.assertEqual(list(Notification.objects.get().recipients.all()), [self.resident])
+        later = User.objects.create_user('newcomer', 'newcomer@example.com', TEST_PASSWORD)
+        self.assertEqual(self.visible_titles(later), set())
+        self.assertEqual(self.visible_titles(self.resident), {'Parking'})
+
+    def test_rules_match_roles_buildings_and_floors(self):
+        owner = User.objects.create_user('owner_a', 'owner_a@example.com', TEST_PASSWORD)
+        Flat.objects.create(flat_number='A-301', building='A', floor=3, owner=owner)
+        Flat.objects.create(flat_number='B-102', building='B', floor=1).tenants.add(self.resident)
+        outsider = User.objects.create_user('outsider', 'outsider@example.com', TEST_PASSWORD)
+
+        self.notify('Everyone')
+        self.notify('Owners', audience='owners')
+        self.notify('Tenants', audience='tenants')
+        self.notify('Building A', audience_building='A')
+        self.notify('Floor 1', audience_floor=1)
+        self.notify('Building B floor 1', audience_building='B', audience_floor=1)
+        self.notify('Building B floor 3', audience_building='B', audience_floor=3)
+        self.notify('Owners in B', audience='owners', audience_building='B')
+        self.notify('Inactive', is_active=False)
+        self.notify('Picked', audience='users').recipients.add(outsider)
+
+        self.assertEqual(self.visible_titles(owner), {'Everyone', 'Owners', 'Building A'})
+        self.assertEqual(self.visible_titles(self.resident), {'Everyone', 'Tenants', 'Floor 1', 'Building B floor 1'})
+        self.assertEqual(self.visible_titles(outsider), {'Everyone', 'Picked'})
+
+    def test_selected_users_need_recipients(self):
+        response = self.clients['admin'].post('/api/notifications/', {
+            'title': 'Parcel', 'message': 'At the gate', 'audience': 'users',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.clients['admin'].post('/api/notifications/', {
+            'title': 'Parcel', 'message': 'At the gate', 'audience': 'users', 'recipients': [self.resident.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.visible_titles(self.resident), {'Parcel'})
+
+
+class InboxTests(ApiTestCase):
+    """Read marks and maintained unread counts (api.inbox)"""
+
+    def create_notifications(self, count):
+        for n in range(count):
+            Notification.objects.create(title=f'Notice {n}', message='-', created_by=self.admin)
+
+    def unread(self):
+        return self.clients['resident'].get('/api/notifications/unread_count/').json()['unread_count']
+
+    def test_pages_carry_read_state_not_readers(self):
+        self.create_notifications(3)
+        first, second = Notification.objects.order_by('pk')[:2]
+        NotificationRead.objects.create(user=self.admin, notification=first)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['resident'].post(f'/api/notifications/{second.pk}/mark_read/')
+        for url in ['/api/notifications/', f'/api/notifications/{second.pk}/']:
+            response = self.clients['resident'].get(url).json()
+            rows = response.get('results', [response])
+            self.assertNotIn('read_by', rows[0])
+            self.assertEqual({row['id'] for row in rows if row['is_read']}, {second.pk}, url)
+
+    def test_unread_count_is_maintained_without_recounting(self):
+        self.create_notifications(3)
+        self.assertEqual(self.unread(), 3)
+        notification = Notification.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['resident'].post(f'/api/notifications/{notification.pk}/mark_read/')
+            # Marking twice counts once
+            self.clients['resident'].post(f'/api/notifications/{notification.pk}/mark_read/')
+        # Token lookup only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread(), 2)
+        # Another user's read marks leave the count alone
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['admin'].post(f'/api/notifications/{notification.pk}/mark_read/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread(), 2)
+
+    def test_new_and_retargeted_notifications_are_recounted(self):
+        self.create_notifications(2)
+        self.assertEqual(self.unread(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_notifications(1)
+        self.assertEqual(self.unread(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.first()
+            notification.audience = 'owners'
+            notification.save()
+        self.assertEqual(self.unread(), 2)
+
+    def test_bulk_mark_read_is_one_insert(self):
+        self.create_notifications(25)
+        ids = list(Notification.objects.order_by('pk').values_list('pk', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clients['resident'].post(f'/api/notifications/{ids[0]}/mark_read/')
+        self.assertEqual(self.unread(), 24)
+        with self.captureOnCommitCallbacks(execute=True):
+            # Token, the user's flats and one INSERT ... SELECT in a savepoint; the count is not redone
+            with self.assertNumQueries(5):
+                response = self.clients['resident'].post(
+                    '/api/notifications/mark_read/', {'ids': ids[:10] + [999999]}, format='json'
+                )
+        self.assertEqual(response.json()['marked'], 9)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread(), 15)
+        self.assertEqual(NotificationRead.objects.filter(user=self.resident).count(), 10)
+        self.assertEqual(self.clients['resident'].post(
+            '/api/notifications/mark_read/', {'ids': 'all'}, format='json').status_code, 400)
+
+    def test_mark_all_read_up_to_a_timestamp(self):
+        self.create_notifications(3)
+        Notification.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        cutoff = timezone.now() - timedelta(minutes=30)
+        Notification.objects.create(title='Later', message='-', created_by=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients['resident'].post(
+                '/api/notifications/mark_all_read/', {'before': cutoff.isoformat()}, format='json'
+            )
+        self.assertEqual(response.json(), {'marked': 3, 'unread_count': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients['resident'].post('/api/notifications/mark_all_read/')
+        self.assertEqual(response.json(), {'marked': 1, 'unread_count': 0})
+
+
+class FailingSMSBackend(BaseSMSBackend):
+    def open(self):
+        raise ConnectionError('SMS provider unreachable')
+
+
+@override_settings(OUTBOX={'SMS_BACKEND': 'api.outbox.LocMemSMSBackend', 'RATE_LIMITS': {}, 'MAX_ATTEMPTS': 2})
+class OutboxTests(ApiTestCase):
+    """Queued email/SMS delivery of notifications (api.outbox)"""
+
+    def create_owners(self, count):
+        """Owners of flats in building O, with an email address and a phone number each"""
+        for n in range(count):
+            owner = User.objects.create_user(f'outbox{n}', f'outbox{n}@example.com', TEST_PASSWORD)
+            UserProfile.objects.update_or_create(user=owner, defaults={'phone_number': f'+9198765{n:05d}'})
+            Flat.objects.create(flat_number=f'O{n}', owner=owner, building='O')
+        sms_outbox.clear()
+
+    def create(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.clients['admin'].post('/api/notifications/', {
+                'title': 'Water cut', 'message': 'Tomorrow 10-12', 'send_email': True, 'send_sms': True, **fields,
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Notification.objects.get(pk=response.json()['id'])
+
+    def test_messages_are_queued_then_delivered_in_batches(self):
+        self.create_owners(3)
+        notification = self.create(audience='owners', audience_building='O')
+        # Nothing is sent inside the request
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxMessage.objects.filter(notification=notification)
+        self.assertEqual(queued.filter(channel='email', status='pending').count(), 3)
+        self.assertEqual(queued.filter(channel='sms', status='pending').count(), 3)
+
+        OutboxWorkerPool(workers=1).run(drain=True)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['outbox0@example.com', 'outbox1@example.com', 'outbox2@example.com'])
+        self.assertEqual(len(sms_outbox), 3)
+        self.assertEqual(sms_outbox[0].body, 'Water cut: Tomorrow 10-12')
+        self.assertEqual(queued.filter(status='sent').count(), 6)
+
+    def test_messages_commit_with_the_notification(self):
+        self.create_owners(3)
+        before = metrics_registry.collect()
+        # No on_commit callbacks run: the rows are written by the request's own transaction
+        response = self.clients['admin'].post('/api/notifications/', {
+            'title': 'Water cut', 'message': '-', 'send_email': True, 'send_sms': True,
+            'audience': 'owners', 'audience_building': 'O',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(OutboxMessage.objects.filter(notification_id=response.json()['id']).count(), 6)
+        after = metrics_registry.collect()
+        for channel in ('email', 'sms'):
+            key = ('nconnect_outbox_messages_total', (channel, 'queued'))
+            self.assertEqual(after[key] - before.get(key, 0), 3)
+
+        # A failed enqueue takes the notification with it
+        client = self.clients['admin']
+        client.raise_request_exception = False
+        with mock.patch.object(OutboxMessage.objects, 'bulk_create', side_effect=OperationalError('disk full')):
+            response = client.post('/api/notifications/', {'title': 'Lift', 'message': '-', 'send_email': True}, format='json')
+        self.assertGreaterEqual(response.status_code, 400)
+        self.assertFalse(Notification.objects.filter(title='Lift').exists())
+
+    def test_failures_back_off_then_give_up(self):
+        self.create_owners(2)
+        notification = self.create(send_email=False)
+        with override_settings(OUTBOX={'SMS_BACKEND': 'api.tests.FailingSMSBackend', 'MAX_ATTEMPTS': 2}):
+            OutboxWorkerPool(workers=1).run(drain=True)
+            messages = OutboxMessage.objects.filter(notification=notification)
+            self.assertEqual({(m.status, m.attempts) for m in messages}, {('pending', 1)})
+            self.assertTrue(all(m.next_attempt_at > timezone.now() for m in messages))
+            self.assertIn('unreachable', messages[0].last_error)
+
+            messages.update(next_attempt_at=timezone.now())
+            OutboxWorkerPool(workers=1).run(drain=True)
+            self.assertEqual({(m.status, m.attempts) for m in messages}, {('failed', 2)})
+
+    def test_lapsed_claims_are_taken_over(self):
+        self.create_owners(1)
+        notification = self.create(send_sms=False, audience='owners')
+        OutboxMessage.objects.filter(notification=notification).update(
+            status='sending', claim='dead-worker', locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        OutboxWorkerPool(workers=1).run(drain=True)
+        self.assertEqual(len(mail.outbox), 1)
+        message = OutboxMessage.objects.get(notification=notification)
+        # The lapsed claim counts as an attempt of its own
+        self.assertEqual((message.status, message.attempts), ('sent', 1))
+
+    def test_lapsed_claims_use_up_attempts(self):
+        self.create_owners(1)
+        notification = self.create(send_sms=False, audience='owners')
+        messages = OutboxMessage.objects.filter(notification=notification)
+        for attempt in (1, 2):
+            self.assertEqual(len(claim_batch('email', 10, lease=60, max_attempts=2)), 1)
+            self.assertEqual(messages.get().attempts, attempt)
+            # The worker dies holding the batch
+            messages.update(locked_until=timezone.now() - timedelta(seconds=1))
+        before = metrics_registry.collect()
+        self.assertEqual(claim_batch('email', 10, lease=60, max_attempts=2), [])
+        self.assertEqual((messages.get().status, messages.get().attempts), ('failed', 2))
+        key = ('nconnect_outbox_messages_total', ('email', 'failed'))
+        self.assertEqual(metrics_registry.collect()[key] - before.get(key, 0), 1)
+
+    def test_results_of_a_lost_claim_are_not_counted(self):
+        self.create_owners(1)
+        notification = self.create(send_sms=False, audience='owners')
+        message, = claim_batch('email', 10, lease=60, max_attempts=5)
+        # Another worker took the batch over after the lease lapsed
+        OutboxMessage.objects.filter(pk=message.pk).update(claim='other-worker')
+        before = metrics_registry.collect()
+        record_results('email', message.claim, [message.pk], [], get_outbox_config())
+        record_results('email', message.claim, [], [(message, RuntimeError('timeout'))], get_outbox_config())
+        after = metrics_registry.collect()
+        for result in ('sent', 'retried'):
+            key = ('nconnect_outbox_messages_total', ('email', result))
+            self.assertEqual(after.get(key, 0), before.get(key, 0))
+        self.assertEqual(OutboxMessage.objects.get(notification=notification).status, 'sending')
+
+
+class NotificationStreamTests(ApiTestCase):
+    """Per-user notification stream frames and resume cursor (api.inbox)"""
+
+    def create_notifications(self, count):
+        for n in range(count):
+            Notification.objects.create(title=f'Notice {n}', message='-', created_by=self.admin)
+
+    def event(self, notification_id, rules):
+        return {'id': 1, 'type': 'notification', 'topic': 'notifications', 'time': 0, 'data': {
+            'notification': {'id': notification_id, 'title': 'Lift'}, 'rules': rules,
+        }}
+
+    def test_resume_replays_missed_notifications_once(self):
+        self.create_notifications(3)
+        first, second, third = Notification.objects.order_by('pk')
+        NotificationRead.objects.create(user=self.resident, notification=third)
+        stream, prelude = open_notification_stream(self.resident, cursor=first.pk)
+        self.assertEqual([frame.split('\n')[:2] for frame in prelude], [
+            [f'id: {second.pk}', 'event: notification'],
+            [f'id: {third.pk}', 'event: notification'],
+            [f'id: {third.pk}', 'event: unread_count'],
+        ])
+        self.assertIn('"is_read":true', prelude[1])
+        self.assertIn('"unread_count":2', prelude[2])
+        # The same notification arriving live is not sent again
+        self.assertIsNone(stream.frame(self.event(third.pk, ['all', '', None, []])))
+
+    def test_live_events_follow_the_audience_rules(self):
+        Flat.objects.create(flat_number='S-101', building='S', floor=1).tenants.add(self.resident)
+        stream, prelude = open_notification_stream(self.resident)
+        self.assertEqual(stream.cursor, 0)
+        self.assertIsNone(stream.frame(self.event(1, ['owners', '', None, []])))
+        self.assertIsNone(stream.frame(self.event(2, ['all', 'T', None, []])))
+        self.assertIsNone(stream.frame(self.event(3, ['users', '', None, [self.admin.pk]])))
+        self.assertIn('id: 4', stream.frame(self.event(4, ['tenants', 'S', 1, []])))
+        self.assertIn('id: 5', stream.frame(self.event(5, ['users', '', None, [self.resident.pk]])))
+        count = {'id': 2, 'type': 'unread_count', 'topic': f'user:{self.resident.pk}', 'time': 0,
+                 'data': {'unread_count': 7}}
+        self.assertTrue(stream.frame(count).startswith('id: 5\nevent: unread_count'))
+
+    def test_catch_up_sends_what_other_processes_saved(self):
+        stream, prelude = open_notification_stream(self.resident)
+        self.assertEqual(stream.catch_up(), [])
+        self.create_notifications(2)
+        older, newer = Notification.objects.order_by('pk')
+        # The newer one arrives live first; the older one was published elsewhere
+        self.assertIn(f'id: {newer.pk}', stream.frame(self.event(newer.pk, ['all', '', None, []])))
+        frames = stream.catch_up()
+        self.assertEqual([frame.split('\n')[1] for frame in frames], ['event: notification', 'event: unread_count'])
+        self.assertIn(f'"id":{older.pk}', frames[0])
+        self.assertEqual(stream.catch_up(), [])
+        self.assertIsNone(stream.frame(self.event(older.pk, ['all', '', None, []])))
+
+    @override_settings(INBOX={'STREAM_POLL_INTERVAL': 0.05})
+    async def test_stream_view_resumes_and_polls(self):
+        first = await sync_to_async(Notification.objects.create)(title='Lift', message='-', created_by=self.admin)
+        ticket = await sync_to_async(issue_stream_ticket)(self.resident)
+        response = await self.async_client.get(reverse('me-events'), {'ticket': ticket, 'cursor': first.pk - 1})
+        self.assertEqual(response.status_code, 200)
+        frames = response.streaming_content
+        self.assertTrue((await anext(frames)).startswith(b'retry:'))
+        self.assertIn(f'id: {first.pk}\nevent: notification'.encode(), await anext(frames))
+        self.assertIn(b'"unread_count":1', await anext(frames))
+        # Saved without an event reaching this process: the poll finds it
+        second = await sync_to_async(Notification.objects.create)(title='Water', message='-', created_by=self.admin)
+        self.assertIn(f'id: {second.pk}\nevent: notification'.encode(), await anext(frames))
+        self.assertIn(b'"unread_count":2', await anext(frames))
+        await frames.aclose()
+
+    @override_settings(INBOX={'STREAM_BACKLOG': 1})
+    def test_long_absences_resync(self):
+        self.create_notifications(3)
+        stream, prelude = open_notification_stream(self.resident, cursor=0)
+        self.assertIn('event: resync', prelude[0])
+        self.assertEqual(stream.cursor, Notification.objects.order_by('-pk').first().pk)
+
+
+class EventStreamTests(TestCase):
+    """Event hub fan-out, stream tickets and the ASGI-only stream views (api.events)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.resident = User.objects.create_user('resident', 'resident@example.com', 'pw')
+        self.hub = EventHub()
+
+    async def test_publish_reaches_subscribers_of_the_topic(self):
+        admin = self.hub.subscribe({'admin'})
+        other = self.hub.subscribe({'user:1'})
+        event = self.hub.publish('admin', 'complaint.created', {'id': 7})
+        self.assertEqual((await admin.get(1))['data'], {'id': 7})
+        with self.assertRaises(asyncio.TimeoutError):
+            await other.get(0.01)
+        admin.close()
+        other.close()
+        self.assertEqual(self.hub.subscriber_count, 0)
+        self.assertIsNone(self.hub.publish('admin', 'complaint.created', {'id': 8}))
+        self.assertEqual(event['topic'], 'admin')
+
+    async def test_overflow_drops_the_oldest_and_resyncs(self):
+        subscription = self.hub.subscribe({'admin'}, maxsize=2)
+        for n in range(3):
+            self.hub.publish('admin', 'bill.paid', {'id': n})
+        await asyncio.sleep(0)
+        frames = stream_subscription(subscription)
+        self.assertTrue((await anext(frames)).startswith('retry:'))
+        self.assertIn('event: resync', await anext(frames))
+        self.assertIn('"id":1', await anext(frames))
+        self.assertIn('"id":2', await anext(frames))
+        await frames.aclose()
+        self.assertEqual(self.hub.subscriber_count, 0)
+
+    def test_streams_answer_501_under_wsgi(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('admin-events')).status_code, 501)
+        self.assertEqual(self.client.get(reverse('me-events')).status_code, 501)
+
+    async def test_admin_stream_opens_with_a_ticket(self):
+        ticket = await sync_to_async(issue_stream_ticket)(self.admin)
+        response = await self.async_client.get(reverse('admin-events'), {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = response.streaming_content
+        self.assertTrue((await anext(frames)).startswith(b'retry:'))
+        hub.publish('admin', 'complaint.created', {'id': 7})
+        self.assertIn(b'event: complaint.created', await anext(frames))
+        await frames.aclose()
+
+    async def test_stream_auth_rejects_tokens_in_the_url_and_stale_tickets(self):
+        token = await sync_to_async(Token.objects.create)(user=self.admin)
+        response = await self.async_client.get(reverse('admin-events'), {'token': token.key})
+        self.assertEqual(response.status_code, 401)
+        ticket = await sync_to_async(issue_stream_ticket)(self.resident)
+        response = await self.async_client.get(reverse('admin-events'), {'ticket': ticket})
+        self.assertEqual(response.status_code, 403)
+        with override_settings(EVENT_STREAM={'TICKET_MAX_AGE': -1}):
+            response = await self.async_client.get(reverse('admin-events'), {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+
+    def test_ticket_endpoint_needs_the_token(self):
+        client = APIClient()
+        self.assertEqual(client.post(reverse('stream-ticket')).status_code, 401)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.resident).key}')
+        response = client.post(reverse('stream-ticket'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(stream_ticket_user_id(response.data['ticket']), self.resident.pk)
+
+
+class NotificationExpiryTests(ApiTestCase):
+    """Expired notifications are filtered in the database, swept and archived (api.expiry)"""
+
+    def create_expired(self, count):
+        for n in range(count):
+            Notification.objects.create(
+                title=f'Expired {n}', message='-', created_by=self.admin,
+                expires_at=timezone.now() - timedelta(hours=n + 1),
+            )
+
+    def rollup(self, status):
+        return StatRollup.objects.filter(period='month', entity='notification', status=status).values_list(
+            'count', flat=True).first() or 0
+
+    def test_expired_notifications_are_hidden_then_deactivated_in_batches(self):
+        live = Notification.objects.create(title='Live', message='-', created_by=self.admin,
+                                           expires_at=timezone.now() + timedelta(days=1))
+        self.create_expired(3)
+        response = self.clients['resident'].get('/api/notifications/')
+        self.assertEqual([row['id'] for row in response.json()['results']], [live.pk])
+        self.assertEqual(unread_count(self.resident), 1)
+        self.assertEqual((self.rollup('active'), self.rollup('inactive')), (4, 0))
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as context:
+            self.assertEqual(deactivate_expired_notifications(batch_size=2), 3)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "notifications"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(list(Notification.objects.filter(is_active=True)), [live])
+        self.assertEqual((self.rollup('active'), self.rollup('inactive')), (1, 3))
+        self.assertEqual(deactivate_expired_notifications(), 0)
+
+    def test_rows_deactivated_by_someone_else_are_not_counted(self):
+        self.create_expired(3)
+        taken = Notification.objects.order_by('pk').first()
+        update = QuerySet.update
+
+        def racing_update(queryset, **values):
+            # Another sweep deactivates one of the selected rows first (and moves its own counts)
+            if update(Notification.objects.filter(pk=taken.pk, is_active=True), is_active=False):
+                apply_delta('notification', timezone.localdate(taken.created_at), 'active', -1)
+                apply_delta('notification', timezone.localdate(taken.created_at), 'inactive', 1)
+            return update(queryset, **values)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+            self.assertEqual(deactivate_expired_notifications(), 2)
+        self.assertEqual((self.rollup('active'), self.rollup('inactive')), (0, 3))
+
+    def test_archive_keeps_recipients_and_read_marks(self):
+        self.create_expired(2)
+        deactivate_expired_notifications()
+        first, second = Notification.objects.order_by('pk')
+        first.recipients.add(self.resident)
+        NotificationRead.objects.create(user=self.resident, notification=first)
+        OutboxMessage.objects.create(notification=second, user=self.resident, channel='email', address='r@example.com')
+
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(NOTIFICATION_EXPIRY={'ARCHIVE_DIR': directory}):
+                self.assertEqual(archive_notifications(older_than_days=0), 1)
+            segment = f'{directory}/{first.created_at.astimezone(dt_timezone.utc):%Y-%m}.jsonl.gz'
+            with gzip.open(segment, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual([(row['id'], row['recipients']) for row in rows], [(first.pk, [self.resident.pk])])
+        self.assertEqual([user_id for user_id, read_at in rows[0]['reads']], [self.resident.pk])
+        # The notification still waiting for its email stays
+        self.assertEqual(list(Notification.objects.all()), [second])
+        self.assertFalse(NotificationRead.objects.exists())
+
+
+class BillingRunTests(ApiTestCase):
+    """Bulk monthly bill generation (api.billing)"""
+
+    def create_flats(self, count):
+        start = Flat.objects.count()
+        Flat.objects.bulk_create([
+            Flat(flat_number=f'B{start + n}', building='B', area_sqft=1000 + n if n % 5 else None)
+            for n in range(count)
+        ])
+
+    def generate(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.clients['admin'].post('/api/bills/generate/', {
+                'bill_month': 5, 'bill_year': 2026,
+                'rules': [
+                    {'bill_type': 'maintenance', 'method': 'per_sqft', 'value': '2.50'},
+                    {'bill_type': 'parking', 'method': 'flat', 'value': '500'},
+                ],
+                **fields,
+            }, format='json')
+
+    def test_run_creates_missing_bills_once(self):
+        self.create_flats(10)
+        flat = Flat.objects.get(flat_number='B1')
+        MaintenanceBill.objects.create(flat=flat, bill_type='parking', bill_month=5, bill_year=2026,
+                                       amount=450, due_date=date(2026, 5, 10))
+        response = self.generate()
+        self.assertEqual(response.status_code, 201, response.content)
+        # B0 and B5 have no area: their maintenance bills are skipped
+        self.assertEqual(response.json(), {'created': 17, 'existing': 1, 'unpriced': 2})
+        self.assertEqual(MaintenanceBill.objects.get(flat=flat, bill_type='maintenance').amount, Decimal('2502.50'))
+        self.assertEqual(MaintenanceBill.objects.get(flat=flat, bill_type='parking').amount, Decimal('450.00'))
+        self.assertEqual(ActivityLog.objects.filter(description__startswith='Generated').count(), 1)
+        unpaid = StatRollup.objects.get(period='month', entity='bill', status='unpaid')
+        self.assertEqual(unpaid.count, 18)
+
+        response = self.generate()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 0, 'existing': 18, 'unpriced': 2})
+
+    def test_concurrent_runs_count_only_their_own_bills(self):
+        self.create_flats(4)
+        bulk_create = MaintenanceBill.objects.bulk_create
+        flat = Flat.objects.get(flat_number='B1')
+
+        def racing_bulk_create(bills, *args, **kwargs):
+            # Another run inserts one bill of the chunk after this run read the existing ones
+            if not MaintenanceBill.objects.filter(flat=flat, bill_type='parking').exists():
+                bulk_create([MaintenanceBill(flat=flat, bill_type='parking', bill_month=5, bill_year=2026,
+                                             amount=500, due_date=date(2026, 5, 10))])
+            return bulk_create(bills, *args, **kwargs)
+
+        with mock.patch.object(MaintenanceBill.objects, 'bulk_create', side_effect=racing_bulk_create):
+            response = self.generate()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'created': 6, 'existing': 1, 'unpriced': 1})
+        self.assertEqual(MaintenanceBill.objects.count(), 7)
+        self.assertEqual(StatRollup.objects.get(period='month', entity='bill', status='unpaid').count, 6)
+
+    def test_queries_grow_with_chunks_not_flats(self):
+        counts = []
+        for size in (3, 25):
+            self.create_flats(size - Flat.objects.count())
+            MaintenanceBill.objects.all().delete()
+            StatRollup.objects.all().delete()
+            with override_settings(BILLING={'BATCH_SIZE': 100}), CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.generate(building='B').status_code, 201)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_only_administrators_with_valid_rules(self):
+        self.assertEqual(self.clients['resident'].post('/api/bills/generate/', {}, format='json').status_code, 403)
+        response = self.generate(rules=[
+            {'bill_type': 'water', 'method': 'flat', 'value': '1'},
+            {'bill_type': 'water', 'method': 'flat', 'value': '2'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rules', response.json())
+
+
+class StatRollupTests(TestCase):
+    """Day and month counters kept by the model signals, and their rebuild (api.rollups)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('rollup', 'rollup@example.com', TEST_PASSWORD)
+        self.flat = Flat.objects.create(flat_number='R-1', building='R')
+        self.today = timezone.localdate()
+        self.month = self.today.replace(day=1)
+
+    def counts(self, entity):
+        """{(period, status): count} of today and this month, zero counts left out"""
+        rows = StatRollup.objects.filter(entity=entity, period_start__in=[self.today, self.month])
+        return {(row.period, row.status): row.count for row in rows
+                if row.count and row.period_start == (self.today if row.period == 'day' else self.month)}
+
+    def test_saves_and_deletes_move_the_counts(self):
+        complaint = Complaint.objects.create(author=self.user, flat=self.flat, title='Leak', description='-')
+        self.assertEqual(self.counts('complaint'), {('day', 'open'): 1, ('month', 'open'): 1})
+
+        complaint.status = 'resolved'
+        complaint.save()
+        self.assertEqual(self.counts('complaint'), {('day', 'resolved'): 1, ('month', 'resolved'): 1})
+        # Saves that leave the status alone, or do not write it, move nothing
+        complaint.save()
+        complaint.status = 'open'
+        complaint.save(update_fields=['title'])
+        self.assertEqual(self.counts('complaint'), {('day', 'resolved'): 1, ('month', 'resolved'): 1})
+
+        Complaint.objects.get(pk=complaint.pk).delete()
+        self.assertEqual(self.counts('complaint'), {})
+
+    def test_boolean_statuses_count_as_active_and_inactive(self):
+        vehicle = Vehicle.objects.create(resident=self.user, vehicle_number='MH12AB0001')
+        vehicle.is_active = False
+        vehicle.save()
+        self.assertEqual(self.counts('vehicle'), {('day', 'inactive'): 1, ('month', 'inactive'): 1})
+
+    def test_apply_delta_creates_then_moves_rows(self):
+        apply_delta('bill', date(2026, 3, 10), 'unpaid', 3)
+        apply_delta('bill', date(2026, 3, 10), 'unpaid', -1)
+        apply_delta('bill', date(2026, 3, 31), 'unpaid', 1)
+        apply_delta('bill', date(2026, 4, 1), 'unpaid', 1)
+        rows = {(row.period, row.period_start): row.count
+                for row in StatRollup.objects.filter(entity='bill', status='unpaid')}
+        self.assertEqual(rows, {
+            ('day', date(2026, 3, 10)): 2, ('day', date(2026, 3, 31)): 1, ('day', date(2026, 4, 1)): 1,
+            ('month', date(2026, 3, 1)): 3, ('month', date(2026, 4, 1)): 1,
+        })
+
+    def test_rebuild_matches_the_maintained_counts(self):
+        for n, status in enumerate(['open', 'in_progress', 'resolved']):
+            Complaint.objects.create(author=self.user, flat=self.flat, title=f'C{n}', description='-', status=status)
+        complaint = Complaint.objects.get(title='C0')
+        complaint.status = 'closed'
+        complaint.save()
+        Complaint.objects.get(title='C1').delete()
+        bill = MaintenanceBill.objects.create(flat=self.flat, bill_month=5, bill_year=2026, amount=100,
+                                              due_date=date(2026, 5, 10))
+        bill.status = 'paid'
+        bill.save()
+        maintained = {entity: self.counts(entity) for entity in ('user', 'complaint', 'bill')}
+        self.assertEqual(maintained['complaint'], {
+            ('day', 'closed'): 1, ('month', 'closed'): 1, ('day', 'resolved'): 1, ('month', 'resolved'): 1,
+        })
+
+        # Drift, as left by bulk writes that bypassed the signals, is repaired
+        StatRollup.objects.update(count=99)
+        rebuild_rollups()
+        self.assertEqual({entity: self.counts(entity) for entity in maintained}, maintained)
+
+
+class DashboardSnapshotTests(ApiTestCase):
+    """Admin dashboard stats and their cached snapshot (api.dashboard)"""
+
+    def test_each_table_is_aggregated_once(self):
+        flat = Flat.objects.create(flat_number='D-1', building='D', is_occupied=True)
+        Flat.objects.create(flat_number='D-2', building='D')
+        for status in ('open', 'in_progress', 'resolved'):
+            Complaint.objects.create(author=self.resident, flat=flat, title=status, description='-', status=status)
+        MaintenanceBill.objects.create(flat=flat, bill_month=1, bill_year=2025, amount=100, due_date=date(2025, 1, 10))
+        MaintenanceBill.objects.create(flat=flat, bill_month=2, bill_year=2025, amount=100,
+                                       due_date=date(2025, 2, 10), status='paid')
+
+        with CaptureQueriesContext(connection) as context:
+            stats = compute_dashboard()['stats']
+        self.assertEqual(stats, {
+            'total_users': 2, 'total_flats': 2, 'occupied_flats': 1, 'total_vehicles': 0, 'pending_complaints': 2,
+            'overdue_bills': 1, 'pending_camera_requests': 0, 'active_notifications': 0,
+        })
+        counted = Counter(
+            table for query in context.captured_queries if 'COUNT(' in query['sql']
+            for table in ('auth_user', 'flats', 'vehicles', 'complaints', 'maintenance_bills', 'camera_requests',
+                          'notifications')
+            if query['sql'].split(' FROM ')[1].startswith(f'"{table}"')
+        )
+        self.assertEqual(set(counted.values()), {1})
+        self.assertEqual(len(counted), 7)
+
+    def test_snapshot_is_cached_until_a_counted_model_changes(self):
+        first = get_dashboard_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_snapshot(), first)
+        Flat.objects.create(flat_number='D-1', building='D')
+        self.assertEqual(get_dashboard_snapshot()['stats']['total_flats'], 1)
+
+        cache.set(SNAPSHOT_KEY, {'stats': 'stale'})
+        invalidate_dashboard()
+        self.assertEqual(get_dashboard_snapshot()['stats']['total_flats'], 1)
+
+    @override_settings(ADMIN_DASHBOARD={'WAIT_TIMEOUT': 5})
+    def test_other_processes_wait_for_the_lock_holder(self):
+        # Another process holds the lock and stores its snapshot a moment later
+        cache.add(LOCK_KEY, 1)
+        snapshot = {'stats': {'total_users': 99}}
+        timer = threading.Timer(0.2, cache.set, (SNAPSHOT_KEY, snapshot))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with mock.patch('api.dashboard.compute_dashboard') as compute:
+            self.assertEqual(get_dashboard_snapshot(), snapshot)
+        compute.assert_not_called()
+
+    @override_settings(ADMIN_DASHBOARD={'WAIT_TIMEOUT': 0.1})
+    def test_a_stuck_lock_holder_is_not_waited_for_forever(self):
+        cache.add(LOCK_KEY, 1)
+        with mock.patch('api.dashboard.compute_dashboard', return_value={'stats': {}}) as compute:
+            self.assertEqual(get_dashboard_snapshot(), {'stats': {}})
+        compute.assert_called_once()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'stats': {'total_users': len(calls)}}
+
+        results = []
+        with mock.patch('api.dashboard.compute_dashboard', side_effect=slow_compute):
+            threads = [threading.Thread(target=lambda: results.append(get_dashboard_snapshot())) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'stats': {'total_users': 1}}] * 4)
+
+
+@override_settings(RATE_LIMIT={'BACKEND': 'api.ratelimit.CacheBackend', 'LIMIT': 5, 'WINDOW': 60,
+                               'COSTS': {'receipt-pdf': 3}})
+class RateLimitTests(TestCase):
+    """Sliding-window limits per client IP (api.ratelimit, SecurityMiddleware)"""
+
+    def setUp(self):
+        cache.clear()
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        self.limiter = SlidingWindowRateLimiter(CacheBackend(), limit=5, window=60)
+
+    def test_window_slides(self):
+        start = 600 * 60    # the start of a window
+        for n in range(5):
+            self.assertTrue(self.limiter.hit('k', now=start + n).allowed)
+        result = self.limiter.hit('k', now=start + 10)
+        self.assertEqual((result.allowed, result.retry_after), (False, 50))
+        # Halfway through the next window half of the previous one still counts: 2.5 + 1
+        self.assertEqual(self.limiter.hit('k', now=start + 90).remaining, 1)
+        self.assertFalse(self.limiter.hit('k', now=start + 90, cost=3).allowed)
+        # Once a whole window has passed without requests nothing is carried over
+        self.assertEqual(self.limiter.hit('k', now=start + 240).remaining, 4)
+
+    def test_costs_weight_requests(self):
+        start = 600 * 60
+        self.assertEqual(self.limiter.hit('k', cost=4, now=start).remaining, 1)
+        result = self.limiter.hit('k', cost=2, now=start)
+        self.assertFalse(result.allowed)
+        # The rejected request did not use up capacity
+        self.assertEqual(self.limiter.hit('k', now=start).remaining, 0)
+
+    def test_middleware_rejects_with_retry_after(self):
+        for n in range(5):
+            response = self.client.get('/api/notifications/')
+            self.assertEqual(response['X-RateLimit-Remaining'], str(4 - n))
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        # Other clients have their own budget; receipt-pdf costs 3
+        response = self.client.get('/api/bills/1/receipt/', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response['X-RateLimit-Remaining'], '2')
+
+    def test_forwarded_for_is_ignored_from_untrusted_clients(self):
+        for n in range(6):
+            response = self.client.get('/api/notifications/', HTTP_X_FORWARDED_FOR=f'10.1.0.{n}')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1'])
+    def test_forwarded_for_names_the_client_behind_a_trusted_proxy(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.9.9.9, 127.0.0.1',
+                                       REMOTE_ADDR='127.0.0.1')
+        # The client can prepend anything; the last untrusted hop is what the proxy saw
+        self.assertEqual(get_client_ip(request), '10.9.9.9')
+        self.assertEqual(get_client_ip(RequestFactory().get('/', REMOTE_ADDR='127.0.0.1')), '127.0.0.1')
+
+
+class PerformanceTests(ApiTestCase):
+    """Request timings, the Server-Timing header and per-view latency stats (api.performance)"""
+
+    def setUp(self):
+        super().setUp()
+        view_stats.reset()
+        self.addCleanup(view_stats.reset)
+        flat = Flat.objects.create(flat_number='T1', building='T')
+        Complaint.objects.create(author=self.resident, flat=flat, title='Leak', description='Water')
+
+    def server_timing(self, response):
+        """{'total': (ms, desc), ...} from the Server-Timing header"""
+        metrics = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            metrics[name] = (float(params['dur']), params.get('desc'))
+        return metrics
+
+    def test_server_timing_header(self):
+        complaint = Complaint.objects.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.clients['admin'].get(f'/api/complaints/{complaint.pk}/')
+        metrics = self.server_timing(response)
+        self.assertEqual(list(metrics), ['total', 'db', 'serializer', 'render'])
+        self.assertEqual(metrics['db'][1], f'"{len(queries)} queries"')
+        self.assertGreaterEqual(
+            metrics['total'][0], metrics['db'][0] + metrics['serializer'][0] + metrics['render'][0] - 0.3
+        )
+        [stats] = view_stats.snapshot()
+        self.assertEqual(stats['view'], 'ComplaintViewSet.retrieve')
+        self.assertEqual(stats['avg_queries'], len(queries))
+        self.assertGreater(stats['avg_serializer_ms'], 0)
+        self.assertGreater(stats['avg_render_ms'], 0)
+
+        # Requests that never reach a view are timed but not aggregated
+        self.assertIn('Server-Timing', self.client.get('/api/no-such-endpoint/'))
+        self.assertEqual(len(view_stats.snapshot()), 1)
+
+    def test_latency_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+        for value in [0.002] * 94 + [0.05] * 5 + [3.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.sum, 3.438)
+        # Percentiles report the upper bound of their bucket, never more than the maximum
+        self.assertAlmostEqual(histogram.percentile(0.50), 0.002)
+        self.assertAlmostEqual(histogram.percentile(0.95), 0.064)
+        self.assertAlmostEqual(histogram.percentile(0.99), 0.064)
+        self.assertEqual(histogram.percentile(1.0), 3.0)
+
+        small = LatencyHistogram()
+        small.observe(0.0004)
+        self.assertEqual(small.percentile(0.5), 0.0004)
+        # Beyond the last bucket only the maximum is known
+        histogram.observe(100.0)
+        self.assertEqual(histogram.percentile(1.0), 100.0)
+
+    def test_admin_endpoint_reports_and_resets_stats(self):
+        for _ in range(3):
+            self.clients['admin'].get('/api/complaints/')
+        self.clients['resident'].get('/api/complaints/')
+        url = reverse('admin-performance')
+        self.assertEqual(self.clients['resident'].get(url).status_code, 403)
+
+        body = self.clients['admin'].get(url).json()
+        self.assertEqual(body['pid'], os.getpid())
+        self.assertIn('response_cache', body)
+        views = {row['view']: row for row in body['views']}
+        self.assertEqual(views['ComplaintViewSet.list']['count'], 4)
+        self.assertGreater(views['ComplaintViewSet.list']['avg_queries'], 0)
+        self.assertLessEqual(views['ComplaintViewSet.list']['p50_ms'], views['ComplaintViewSet.list']['max_ms'])
+
+        self.assertEqual(self.clients['admin'].delete(url).status_code, 204)
+        # Only the reset itself has been recorded since
+        self.assertEqual([row['view'] for row in self.clients['admin'].get(url).json()['views']], ['PerformanceStatsView'])
+
+    def test_serializer_data_is_timed_once_per_request(self):
+        class ItemSerializer(serializers.Serializer):
+            name = serializers.CharField()
+
+        class WrapperSerializer(serializers.Serializer):
+            item = serializers.SerializerMethodField()
+
+            def get_item(self, obj):
+                return ItemSerializer(obj).data
+
+        self.assertTrue(BaseSerializer.data.fget._timed)
+        wrapped = BaseSerializer.data
+        install_serializer_timing()
+        self.assertIs(BaseSerializer.data, wrapped)
+
+        # Outside a request the property only renders
+        self.assertEqual(WrapperSerializer({'name': 'Leak'}).data, {'item': {'name': 'Leak'}})
+        with RequestTimer() as timings:
+            # Each call returns the next second: the nested .data must not read the clock
+            with mock.patch('api.performance.time.perf_counter', side_effect=itertools.count()):
+                data = WrapperSerializer({'name': 'Leak'}).data
+        self.assertEqual(data, {'item': {'name': 'Leak'}})
+        self.assertEqual(timings.serializer, 1)
+        self.assertEqual(timings.serializer_depth, 0)
+
+
+class ProfilerTests(TestCase):
+    """Stack sampling and profile storage (api.profiler)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.config = dict(get_profiling_config(), DIRECTORY=self.directory, INTERVAL=0.001, MAX_PER_VIEW=2)
+
+    def profile(self, profiler, duration):
+        profiler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return profiler.finish('FlatViewSet.list', duration)
+
+    def test_slow_and_sampled_requests_are_kept(self):
+        profiler = RequestProfiler(dict(self.config, SAMPLE_RATE=0, SLOW_THRESHOLD=1.0))
+        self.assertIsNone(self.profile(profiler, 0.2))
+        slow = self.profile(profiler, 1.5)
+        self.assertTrue(slow.endswith('-1500ms-slow'))
+        profiler = RequestProfiler(dict(self.config, SAMPLE_RATE=1, SLOW_THRESHOLD=1.0))
+        self.assertTrue(self.profile(profiler, 0.2).endswith('-200ms-sampled'))
+
+        content = profiler.store.read('FlatViewSet.list', slow)
+        # Collapsed stacks, outermost frame first, ending in the sampled function
+        self.assertIn('api.tests:profile', content.splitlines()[0])
+        self.assertRegex(content.splitlines()[0], r' \d+$')
+
+    def test_store_lists_newest_first_prunes_and_skips_stray_files(self):
+        store = ProfileStore(self.directory, max_per_view=2)
+        ids = []
+        for n in range(3):
+            ids.append(store.save('FlatViewSet.list', Counter({'a;b': n + 1}), 0.01 * (n + 1), 'sampled'))
+            time.sleep(0.002)
+        (self.directory / 'FlatViewSet.list' / 'notes.folded').write_text('a 1\n')
+        with self.assertLogs('api.profiler', 'WARNING'):
+            profiles = store.list()
+        self.assertEqual([profile['id'] for profile in profiles], [ids[2], ids[1]])
+        self.assertEqual(profiles[0]['duration_ms'], 30)
+        self.assertIsNone(store.read('FlatViewSet.list', ids[0]))
+
+    def test_view_names_cannot_leave_the_directory(self):
+        store = ProfileStore(self.directory / 'profiles', max_per_view=2)
+        (self.directory / 'profiles').mkdir()
+        (self.directory / 'secret.folded').write_text('a 1\n')
+        (self.directory / '1-1-1ms-slow.folded').write_text('a 1\n')
+        for name in ('..', '.', ''):
+            self.assertIsNone(store.read(name, 'secret'))
+            self.assertEqual(store.list(name), [])
+        self.assertIsNone(store.save('..', Counter({'a': 1}), 0.01, 'sampled'))
+        self.assertEqual(sorted(path.name for path in self.directory.glob('*.folded')),
+                         ['1-1-1ms-slow.folded', 'secret.folded'])
+
+
+class MetricsAccessTests(TestCase):
+    """/api/metrics/ is open to ALLOWED_IPS by connecting address, and to administrators"""
+
+    def setUp(self):
+        reset_limiter()
+        self.addCleanup(reset_limiter)
+        self.admin = User.objects.create_superuser('metrics_admin', 'metrics@example.com', 'Metrics-pass-1')
+
+    def test_forwarded_for_does_not_open_the_allowlist(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_administrator_token(self):
+        token = Token.objects.create(user=self.admin)
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+        resident = User.objects.create_user('metrics_resident', 'r@example.com', 'Metrics-pass-1')
+        response = self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.5',
+                                   HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=resident).key}')
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricsProcessFileTests(TestCase):
+    """Per-process metric files in MULTIPROCESS_DIR (api.metrics)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_files_of_exited_processes_are_dropped(self):
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        key = ['nconnect_test_total', []]
+        process_file_path(self.directory, exited.pid).write_text(json.dumps([[*key, 5]]))
+        process_file_path(self.directory, os.getppid()).write_text(json.dumps([[*key, 2]]))
+        with override_settings(METRICS={'MULTIPROCESS_DIR': str(self.directory)}):
+            merged = metrics_registry.collect_all_processes()
+            self.assertEqual(merged[('nconnect_test_total', ())], 2)
+            self.assertFalse(process_file_path(self.directory, exited.pid).exists())
+            self.assertTrue(process_file_path(self.directory).exists())
+            remove_process_file()
+        self.assertEqual([path.name for path in self.directory.iterdir()], [f'metrics_{os.getppid()}.json'])
+
+
+class ActivityLogPaginationTests(ApiTestCase):
+    """KeysetPagination (api.pagination) on the activity log list and timeline"""
+
+    def setUp(self):
+        super().setUp()
+        self.flat = Flat.objects.create(flat_number='K1', building='K')
+        self.complaint = Complaint.objects.create(author=self.resident, flat=self.flat, title='Leak', description='Water')
+        self.start = timezone.now() - timedelta(days=1)
+
+    def create_logs(self, count, user, target, action='update', step=timedelta(minutes=1)):
+        return [
+            ActivityLog.objects.create(
+                user=user, action=action, description='Logged', content_object=target, timestamp=self.start + n * step
+            ).pk
+            for n in range(count)
+        ]
+
+    def collect(self, url):
+        """ids of every page, following next links; fails on a repeated row"""
+        ids, pages = [], 0
+        while url:
+            response = self.clients['admin'].get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            ids.extend(row['id'] for row in body['results'])
+            url, pages = body['next'], pages + 1
+        self.assertEqual(len(ids), len(set(ids)))
+        return ids, pages
+
+    def newest_first(self, queryset):
+        return list(queryset.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+    def test_cursors_walk_every_row_once(self):
+        self.create_logs(7, self.resident, self.complaint)
+        ids, pages = self.collect('/api/activity-logs/?page_size=3')
+        self.assertEqual(ids, self.newest_first(ActivityLog.objects.all()))
+        self.assertEqual(pages, 3)
+
+    def test_rows_with_the_same_timestamp_are_not_skipped(self):
+        self.create_logs(3, self.resident, self.complaint)
+        # Five entries in one instant straddle the page boundaries
+        self.create_logs(5, self.admin, self.flat, step=timedelta(0))
+        ids, pages = self.collect('/api/activity-logs/?page_size=2')
+        self.assertEqual(ids, self.newest_first(ActivityLog.objects.all()))
+        self.assertEqual(pages, 4)
+
+    def test_malformed_cursors_are_rejected(self):
+        def encode(raw):
+            return base64.urlsafe_b64encode(raw).decode()
+
+        self.create_logs(1, self.resident, self.complaint)
+        for cursor in ['not base64!', encode(b'no separator'), encode(b'yesterday|1'), encode(b'2025-01-01T00:00:00|x'),
+                       encode(b'2025-01-01T00:00:00|1|2'), encode(b'\xff\xfe|1')]:
+            response = self.clients['admin'].get(f'/api/activity-logs/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+    def test_filters_combine_and_survive_the_cursor(self):
+        self.create_logs(4, self.resident, self.complaint)
+        self.create_logs(3, self.resident, self.complaint, action='delete')
+        self.create_logs(3, self.admin, self.complaint)
+        self.create_logs(3, self.resident, self.flat)
+        other = Complaint.objects.create(author=self.resident, flat=self.flat, title='Noise', description='Loud')
+        self.create_logs(2, self.resident, other)
+
+        complaint_type = ContentType.objects.get_for_model(Complaint)
+        combinations = [
+            (f'user={self.resident.pk}', {'user': self.resident}),
+            (f'user={self.resident.pk}&action=update', {'user': self.resident, 'action': 'update'}),
+            ('content_type=api.complaint', {'content_type': complaint_type}),
+            (f'content_type={complaint_type.pk}&object_id={self.complaint.pk}',
+             {'content_type': complaint_type, 'object_id': self.complaint.pk}),
+            (f'user={self.resident.pk}&action=update&content_type=api.Complaint&object_id={self.complaint.pk}',
+             {'user': self.resident, 'action': 'update', 'content_type': complaint_type, 'object_id': self.complaint.pk}),
+            (f'user={self.admin.pk}&content_type=api.flat', {'user': self.admin, 'content_type__model': 'flat'}),
+        ]
+        for query, lookups in combinations:
+            ids, _ = self.collect(f'/api/activity-logs/?page_size=2&{query}')
+            self.assertEqual(ids, self.newest_first(ActivityLog.objects.filter(**lookups)), query)
+
+        for query in ['user=me', 'object_id=first', 'content_type=api.nothing', 'content_type=999999']:
+            self.assertEqual(self.clients['admin'].get(f'/api/activity-logs/?{query}').status_code, 400, query)
+
+    def test_timeline_pages_through_one_object(self):
+        self.create_logs(5, self.resident, self.complaint)
+        self.create_logs(2, self.admin, self.flat, step=timedelta(0))
+        ids, pages = self.collect(f'/api/activity-logs/timeline/api.complaint/{self.complaint.pk}/?page_size=2')
+        self.assertEqual(ids, self.newest_first(ActivityLog.objects.filter(content_type__model='complaint')))
+        self.assertEqual(pages, 3)
+
+        ids, _ = self.collect(f'/api/activity-logs/timeline/api.flat/{self.flat.pk}/')
+        self.assertEqual(ids, self.newest_first(ActivityLog.objects.filter(user=self.admin)))
+        response = self.clients['admin'].get(f'/api/activity-logs/timeline/api.nothing/{self.flat.pk}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.clients['resident'].get(f'/api/activity-logs/timeline/api.flat/{self.flat.pk}/').status_code, 403)
+
+
+class ActivityLogWriterTests(TestCase):
+    """Buffered ActivityLog inserts (api.activity)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('writer', 'writer@example.com', 'Writer-pass-1')
+        self.writer = ActivityLogWriter(batch_size=2, flush_interval=60, max_queue=100, retries=2, retry_delay=0)
+
+    def queue(self, count):
+        for n in range(count):
+            self.writer.queue.put(ActivityLog(user=self.user, action='create', description=f'Entry {n}'))
+
+    def test_flush_writes_everything_queued_in_batches(self):
+        self.queue(5)
+        with self.assertNumQueries(3):
+            self.writer.flush()
+        self.assertEqual(ActivityLog.objects.filter(user=self.user).count(), 5)
+        self.assertTrue(self.writer.queue.empty())
+
+    def test_failed_batches_are_retried(self):
+        self.queue(2)
+        real_bulk_create = ActivityLog.objects.bulk_create
+        failures = [OperationalError('database table is locked')] * 2
+        def flaky_bulk_create(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return real_bulk_create(*args, **kwargs)
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', flaky_bulk_create), \
+                self.assertLogs('api.activity', 'WARNING'):
+            self.writer.flush()
+        self.assertEqual(ActivityLog.objects.filter(user=self.user).count(), 2)
+
+    def test_persistent_failures_fall_back_to_single_inserts(self):
+        self.queue(2)
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=OperationalError('locked')), \
+                self.assertLogs('api.activity', 'WARNING'):
+            self.writer.flush()
+        self.assertEqual(ActivityLog.objects.filter(user=self.user).count(), 2)
+
+    def test_unwritable_entries_are_requeued_or_logged_in_full(self):
+        entries = [ActivityLog(user=self.user, action='create', description='Locked out')]
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=OperationalError('locked')), \
+                mock.patch.object(ActivityLog, 'save', side_effect=OperationalError('locked')), \
+                self.assertLogs('api.activity', 'WARNING') as logs:
+            # From the writer thread: back into the queue for the next batch
+            self.assertEqual(self.writer._write(entries), [])
+            self.assertIs(self.writer.queue.get_nowait(), entries[0])
+            # At shutdown there is no next batch
+            self.writer.queue.put(entries[0])
+            self.writer.flush()
+        self.assertIn("description='Locked out'", logs.output[-1])
+        self.assertTrue(self.writer.queue.empty())
+
+
+class ActivityLogWriterShutdownTests(TransactionTestCase):
+    """The writer thread's own connection writes here, so no test transaction is held open"""
+
+    def test_flush_writes_the_batch_the_thread_holds(self):
+        user = User.objects.create_user('shutdown', 'shutdown@example.com', 'Writer-pass-1')
+        writer = ActivityLogWriter(batch_size=100, flush_interval=60, max_queue=100)
+        for n in range(10):
+            writer.enqueue(ActivityLog(user=user, action='create', description=f'Entry {n}'))
+        # The thread has taken them off the queue and waits for more
+        deadline = time.monotonic() + 5
+        while not writer.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(writer.queue.empty())
+        self.assertEqual(ActivityLog.objects.filter(user=user).count(), 0)
+
+        writer.flush()
+        self.assertEqual(ActivityLog.objects.filter(user=user).count(), 10)
+        self.assertFalse(writer._thread)
+        writer.enqueue(ActivityLog(user=user, action='create', description='After'))
+        writer.flush()
+        self.assertEqual(ActivityLog.objects.filter(user=user).count(), 11)
+
+
+class ActivityLogArchiveTests(TestCase):
+    """Moving old activity logs into archive segments (api.archive)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ACTIVITY_LOG_RETENTION={'ARCHIVE_DIR': directory.name, 'CHUNK_SIZE': 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('archived', 'archived@example.com', 'Archive-pass-1')
+        self.now = datetime(2026, 6, 1, tzinfo=dt_timezone.utc)
+
+    def log(self, days_ago, description):
+        return ActivityLog.objects.create(user=self.user, action='create', description=description,
+                                          timestamp=self.now - timedelta(days=days_ago))
+
+    def archived(self):
+        return [row['description'] for row in query_archive(limit=1000)]
+
+    def test_old_rows_move_to_monthly_segments(self):
+        for days_ago in (200, 150, 120, 10):
+            self.log(days_ago, f'{days_ago} days')
+        self.assertEqual(archive_activity_logs(hot_days=90, now=self.now), 3)
+        self.assertEqual(self.archived(), ['200 days', '150 days', '120 days'])
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['10 days'])
+
+        # Inserted late with an older timestamp, as the buffered writer can
+        self.log(300, 'late')
+        self.assertEqual(archive_activity_logs(hot_days=90, now=self.now), 1)
+        self.assertIn('late', self.archived())
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_interrupted_run_resumes_without_duplicates(self):
+        for days_ago in (200, 150, 120):
+            self.log(days_ago, f'{days_ago} days')
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=OperationalError('locked')):
+            with self.assertRaises(OperationalError):
+                archive_activity_logs(hot_days=90, now=self.now)
+        # The first chunk is in the archive but still in the database
+        self.assertEqual(self.archived(), ['200 days', '150 days'])
+        self.assertEqual(ActivityLog.objects.count(), 3)
+
+        self.assertEqual(archive_activity_logs(hot_days=90, now=self.now), 3)
+        self.assertEqual(self.archived(), ['200 days', '150 days', '120 days'])
+        self.assertFalse(ActivityLog.objects.exists())
+
+    def test_interrupted_append_is_truncated_on_resume(self):
+        for days_ago in (200, 150, 120):
+            self.log(days_ago, f'{days_ago} days')
+        append = ActivityLogArchive.append
+
+        def crash_after_first_member(archive, manifest, month, rows):
+            append(archive, manifest, month, rows)
+            raise OSError('killed')
+
+        # Dies after writing the first member but before the manifest records it
+        with mock.patch.object(ActivityLogArchive, 'append', autospec=True, side_effect=crash_after_first_member):
+            with self.assertRaises(OSError):
+                archive_activity_logs(hot_days=90, now=self.now)
+
+        self.assertEqual(archive_activity_logs(hot_days=90, now=self.now), 3)
+        self.assertEqual(self.archived(), ['200 days', '150 days', '120 days'])
+        manifest = ActivityLogArchive(get_retention_config()['ARCHIVE_DIR']).load_manifest()
+        self.assertNotIn('pending', manifest)
+        self.assertEqual(sum(segment['rows'] for segment in manifest['segments'].values()), 3)
@@ -10,11 +10,22 @@ router.register(r'complaints', views.ComplaintViewSet, basename='complaint')
 router.register(r'bills', views.MaintenanceBillViewSet, basename='bill')
 router.register(r'camera-requests', views.CameraAccessRequestViewSet, basename='camerarequest')
 router.register(r'notifications', views.NotificationViewSet, basename='notification')
+router.register(r'activity-logs', views.ActivityLogViewSet, basename='activitylog')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('user-status/', views.UserStatusView.as_view(), name='user-status'),
+    path('me/overview/', views.MeOverviewView.as_view(), name='me-overview'),
+    path('me/events/', views.notification_event_stream, name='me-events'),
     path('profile/update/', views.ProfileUpdateView.as_view(), name='profile-update'),
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin/events/', views.admin_event_stream, name='admin-events'),
+    path('events/ticket/', views.StreamTicketView.as_view(), name='stream-ticket'),
+    path('admin/stats/daily/', views.DailyStatsView.as_view(), name='admin-daily-stats'),
+    path('admin/performance/', views.PerformanceStatsView.as_view(), name='admin-performance'),
+    path('admin/activity-archive/', views.ActivityLogArchiveView.as_view(), name='admin-activity-archive'),
+    path('admin/profiles/', views.ProfileListView.as_view(), name='admin-profiles'),
+    path('admin/profiles/<str:view_name>/<str:profile_id>/', views.ProfileDetailView.as_view(), name='admin-profile-detail'),
     path('bills/<int:bill_id>/receipt/', views.generate_receipt_pdf, name='receipt-pdf'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
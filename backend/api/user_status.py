@@ -0,0 +1,99 @@
+"""
+Cached payload for UserStatusView.
+
+The payload is cached per user and dropped by the post_save/post_delete
+receivers in api.signals whenever the User or its UserProfile changes.
+Status checks are folded into one 'login' ActivityLog row per session: the
+row is created when a session starts and its description is refreshed at
+most once per SESSION_UPDATE_INTERVAL.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .activity import log_activity
+from .metrics import record_cache_lookup
+from .models import ActivityLog, UserProfile
+
+
+DEFAULT_USER_STATUS = {
+    'CACHE_TIMEOUT': 300,
+    'SESSION_IDLE_TIMEOUT': 30 * 60,
+    'SESSION_UPDATE_INTERVAL': 5 * 60,
+}
+
+
+def get_user_status_config():
+    config = dict(DEFAULT_USER_STATUS)
+    config.update(getattr(settings, 'USER_STATUS', {}))
+    return config
+
+
+def status_cache_key(user_id):
+    return f'user_status:{user_id}'
+
+
+def session_cache_key(user_id):
+    return f'user_status_session:{user_id}'
+
+
+def invalidate_user_status(user_id):
+    cache.delete(status_cache_key(user_id))
+
+
+def get_user_status(user):
+    key = status_cache_key(user.pk)
+    payload = cache.get(key)
+    record_cache_lookup('user_status', payload is not None)
+    if payload is None:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        payload = {
+            'id': user.id,
+            'is_superuser': user.is_superuser,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'force_password_change': profile.force_password_change,
+            'phone_number': profile.phone_number,
+            'bio': profile.bio,
+            'avatar': profile.avatar.url if profile.avatar else None,
+            'email_verified': profile.email_verified,
+            'phone_verified': profile.phone_verified,
+            'two_factor_enabled': profile.two_factor_enabled,
+        }
+        cache.set(key, payload, get_user_status_config()['CACHE_TIMEOUT'])
+    return payload
+
+
+def record_status_check(user, ip_address, user_agent):
+    """Fold a status check into the user's current login session"""
+    config = get_user_status_config()
+    key = session_cache_key(user.pk)
+    now = timezone.now()
+    session = cache.get(key)
+
+    if session is None or (now - session['last_seen']).total_seconds() > config['SESSION_IDLE_TIMEOUT']:
+        # New session; written synchronously because later checks update this row
+        entry = log_activity(
+            strict=True,
+            user=user,
+            action='login',
+            description=f'User {user.username} checked status',
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        session = {'log_id': entry.pk, 'started': now, 'last_seen': now, 'checks': 1, 'updated': now}
+    else:
+        session['last_seen'] = now
+        session['checks'] += 1
+        if (now - session['updated']).total_seconds() >= config['SESSION_UPDATE_INTERVAL']:
+            ActivityLog.objects.filter(pk=session['log_id']).update(
+                description=(
+                    f"User {user.username} checked status {session['checks']} times, "
+                    f"last at {now.isoformat()}"
+                )
+            )
+            session['updated'] = now
+
+    cache.set(key, session, config['SESSION_IDLE_TIMEOUT'])
@@ -1,26 +1,60 @@
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.cache import get_conditional_response
 from django.db import transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from rest_framework import viewsets, permissions, status, filters
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from rest_framework import exceptions, viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError, PermissionDenied
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.authtoken.models import Token
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed, ValidationError, PermissionDenied
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import io
+import os
 from datetime import datetime, timedelta
 import logging
 
 from .models import *
 from .serializers import *
+from .activity import log_activity
+from .archive import parse_time_filter, query_archive
+from .audience import notification_audience_q
+from .billing import BillingRule, generate_bills
+from .conditional import ConditionalGetMixin
+from .dashboard import get_dashboard_snapshot
+from .events import get_event_stream_config, hub, issue_stream_ticket, stream_subscription, stream_ticket_user_id
+from .expiry import live_notifications_q
+from .fastread import FastListMixin
+from .fieldsets import SparseFieldsetQuerysetMixin
+from .middleware import get_client_ip
+from .inbox import (
+    announce_notification, announce_unread_count, get_inbox_config, is_read_expression, mark_read,
+    notification_topics, open_notification_stream, unread_count,
+)
+from .metrics import get_metrics_config, pdf_generation_seconds, registry as metrics_registry
+from .outbox import enqueue_notification
+from .overview import build_overview, overview_etag
+from .pagination import KeysetPagination
+from .performance import view_stats
+from .profiler import get_profile_store
+from .renderers import StreamingListMixin
+from .response_cache import ResponseCacheMixin, response_cache
+from .rollups import TRACKED_ENTITIES, daily_series
+from .user_status import get_user_status, record_status_check
 
 logger = logging.getLogger(__name__)
 
@@ -56,41 +90,31 @@ class UserStatusView(APIView):
 
     def get(self, request):
         user = request.user
-        profile, created = UserProfile.objects.get_or_create(user=user)
 
-        # Log activity
-        ActivityLog.objects.create(
-            user=user,
-            action='login',
-            description=f'User {user.username} checked status',
+        # Log activity, folded into the current login session
+        record_status_check(
+            user,
             ip_address=self.get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
 
-        return Response({
-            'id': user.id,
-            'is_superuser': user.is_superuser,
-            'username': user.username,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'force_password_change': profile.force_password_change,
-            'phone_number': profile.phone_number,
-            'bio': profile.bio,
-            'avatar': profile.avatar.url if profile.avatar else None,
-            'email_verified': profile.email_verified,
-            'phone_verified': profile.phone_verified,
-            'two_factor_enabled': profile.two_factor_enabled,
-        })
+        return Response(get_user_status(user))
 
-    @staticmethod
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    get_client_ip = staticmethod(get_client_ip)
+
+
+class MeOverviewView(APIView):
+    """Everything the resident dashboard shows on load, in one response; polls send If-None-Match"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        etag = overview_etag(request.user, request.accepted_media_type)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(build_overview(request.user))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 class ProfileUpdateView(APIView):
@@ -112,7 +136,7 @@ class ProfileUpdateView(APIView):
             serializer.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=user,
                 action='update',
                 description=f'User {user.username} updated profile',
@@ -130,56 +154,96 @@ class AdminDashboardView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        # Get dashboard statistics
-        stats = {
-            'total_users': User.objects.filter(is_active=True).count(),
-            'total_flats': Flat.objects.count(),
-            'occupied_flats': Flat.objects.filter(is_occupied=True).count(),
-            'total_vehicles': Vehicle.objects.filter(is_active=True).count(),
-            'pending_complaints': Complaint.objects.filter(status__in=['open', 'in_progress']).count(),
-            'overdue_bills': MaintenanceBill.objects.filter(
-                due_date__lt=timezone.now().date(),
-                status='unpaid'
-            ).count(),
-            'pending_camera_requests': CameraAccessRequest.objects.filter(status='pending').count(),
-            'active_notifications': Notification.objects.filter(
-                is_active=True,
-                expires_at__gt=timezone.now()
-            ).count(),
-        }
-
-        # Recent activities
-        recent_activities = ActivityLog.objects.select_related('user').order_by('-timestamp')[:10]
-        activities_data = ActivityLogSerializer(recent_activities, many=True).data
-
-        # Monthly statistics
-        current_month = timezone.now().month
-        current_year = timezone.now().year
-
-        monthly_stats = {
-            'new_users_this_month': User.objects.filter(
-                date_joined__month=current_month,
-                date_joined__year=current_year
-            ).count(),
-            'complaints_this_month': Complaint.objects.filter(
-                created_at__month=current_month,
-                created_at__year=current_year
-            ).count(),
-            'bills_generated_this_month': MaintenanceBill.objects.filter(
-                created_at__month=current_month,
-                created_at__year=current_year
-            ).count(),
-        }
+        # Cached snapshot, dropped by model signals (see api.dashboard)
+        return Response(get_dashboard_snapshot())
+
+
+class DailyStatsView(APIView):
+    """Objects created per day from the rollup table (?entity=complaint&start=&end=&status=)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        entity = params.get('entity')
+        if entity not in [tracked.name for tracked in TRACKED_ENTITIES]:
+            return Response({'error': 'Unknown entity'}, status=400)
+
+        try:
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else timezone.localdate()
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else end - timedelta(days=29)
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+        return Response({
+            'entity': entity,
+            'start': start,
+            'end': end,
+            'results': daily_series(entity, start, end, params.get('status')),
+        })
+
+
+class PerformanceStatsView(APIView):
+    """Per-view latency percentiles and DB/serializer/render averages for this process"""
+    permission_classes = [IsAdminUser]
 
+    def get(self, request):
         return Response({
-            'stats': stats,
-            'monthly_stats': monthly_stats,
-            'recent_activities': activities_data
+            'pid': os.getpid(),
+            'views': view_stats.snapshot(),
+            'response_cache': response_cache.stats(),
         })
 
+    def delete(self, request):
+        view_stats.reset()
+        response_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfileListView(APIView):
+    """Stored request profiles, newest first; filter with ?view=FlatViewSet.list"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'results': get_profile_store().list(request.query_params.get('view'))})
+
+
+class ProfileDetailView(APIView):
+    """A stored profile in collapsed-stack format, ready for flamegraph.pl or speedscope"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, view_name, profile_id):
+        content = get_profile_store().read(view_name, profile_id)
+        if content is None:
+            return Response({'error': 'Profile not found'}, status=404)
+        return HttpResponse(content, content_type='text/plain; charset=utf-8')
+
+
+class ActivityLogArchiveView(APIView):
+    """Query archived activity logs by user, action and time range (?user=&action=&start=&end=&limit=)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            user_id = int(params['user']) if params.get('user') else None
+            limit = min(int(params.get('limit', 100)), 1000)
+            start = parse_time_filter(params.get('start'))
+            end = parse_time_filter(params.get('end'))
+        except ValueError:
+            return Response({'error': 'Invalid filter value'}, status=400)
+
+        results = query_archive(
+            user_id=user_id,
+            action=params.get('action') or None,
+            start=start,
+            end=end,
+            limit=limit
+        )
+        return Response({'results': results})
+
 
 # Main ViewSets
-class UserManagementViewSet(viewsets.ModelViewSet):
+class UserManagementViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().select_related('profile')
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
@@ -235,7 +299,7 @@ class UserManagementViewSet(viewsets.ModelViewSet):
                 )
 
                 # Log activity
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action='assign_flat',
                     description=f'Assigned flat {flat.flat_number} to {user.username} as {assignment_type}',
@@ -298,7 +362,7 @@ class UserManagementViewSet(viewsets.ModelViewSet):
                     flat.save()
 
                 # Log activity
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action='remove_tenant',
                     description=f'Removed {user.username} from flat {flat.flat_number}',
@@ -328,7 +392,8 @@ class UserManagementViewSet(viewsets.ModelViewSet):
             user.profile.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
+                strict=True,
                 user=request.user,
                 action='password_change',
                 description=f'Admin reset password for {user.username}',
@@ -345,8 +410,9 @@ class UserManagementViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Failed to reset password'}, status=500)
 
 
-class FlatViewSet(viewsets.ModelViewSet):
+class FlatViewSet(ConditionalGetMixin, ResponseCacheMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = FlatSerializer
+    response_dependencies = [User]
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['flat_number', 'building']
@@ -356,13 +422,13 @@ class FlatViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return Flat.objects.all().select_related('owner').prefetch_related('tenants')
+            return self.optimize_queryset(Flat.objects.all())
 
         # This will return flats where the user is either the owner OR one of the tenants.
         # It handles the case where a user might be a tenant in one flat and own another.
-        return Flat.objects.filter(
+        return self.optimize_queryset(Flat.objects.filter(
             Q(owner=user) | Q(tenants=user)
-        ).distinct().select_related('owner').prefetch_related('tenants')
+        ).distinct())
 
     def perform_create(self, serializer):
         if not self.request.user.is_superuser:
@@ -371,7 +437,7 @@ class FlatViewSet(viewsets.ModelViewSet):
         flat = serializer.save()
 
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=self.request.user,
             action='create',
             description=f'Created flat {flat.flat_number}',
@@ -380,8 +446,9 @@ class FlatViewSet(viewsets.ModelViewSet):
         )
 
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(ConditionalGetMixin, ResponseCacheMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = VehicleSerializer
+    response_dependencies = [User]
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['vehicle_number', 'brand', 'model', 'color']
@@ -391,15 +458,15 @@ class VehicleViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return Vehicle.objects.all().select_related('resident')
-        return Vehicle.objects.filter(resident=user).select_related('resident')
+            return self.optimize_queryset(Vehicle.objects.all())
+        return self.optimize_queryset(Vehicle.objects.filter(resident=user))
 
     def perform_create(self, serializer):
         try:
             vehicle = serializer.save(resident=self.request.user)
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=self.request.user,
                 action='create',
                 description=f'Registered vehicle {vehicle.vehicle_number}',
@@ -461,8 +528,9 @@ class VehicleViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Search failed'}, status=500)
 
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(ConditionalGetMixin, ResponseCacheMixin, FastListMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = ComplaintSerializer
+    response_dependencies = [Flat, User]
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -473,11 +541,11 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return Complaint.objects.all().select_related('author', 'flat', 'resolved_by')
+            return self.optimize_queryset(Complaint.objects.all())
 
-        return Complaint.objects.filter(
+        return self.optimize_queryset(Complaint.objects.filter(
             Q(flat__owner=user) | Q(author=user) | Q(flat__tenants=user)
-        ).distinct().select_related('author', 'flat', 'resolved_by')
+        ).distinct())
 
     def perform_create(self, serializer):
         # ✅ FIX: Changed from .get('flat') to .get('flat_id') to match the serializer
@@ -498,7 +566,7 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             complaint = serializer.save(author=self.request.user, flat=flat)
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=self.request.user,
                 action='create',
                 description=f'Filed complaint: {complaint.title}',
@@ -553,7 +621,7 @@ class ComplaintViewSet(viewsets.ModelViewSet):
                 complaint.save()
 
                 # Log activity
-                ActivityLog.objects.create(
+                log_activity(
                     user=request.user,
                     action='update',
                     description=f'Updated complaint {complaint.id} status to {new_status}',
@@ -569,8 +637,9 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Failed to update complaint status'}, status=500)
 
 
-class MaintenanceBillViewSet(viewsets.ModelViewSet):
+class MaintenanceBillViewSet(ConditionalGetMixin, ResponseCacheMixin, FastListMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = MaintenanceBillSerializer
+    response_dependencies = [Flat, User]
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -580,11 +649,11 @@ class MaintenanceBillViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return MaintenanceBill.objects.all().select_related('flat__owner', 'verified_by')
+            return self.optimize_queryset(MaintenanceBill.objects.all())
 
-        return MaintenanceBill.objects.filter(
+        return self.optimize_queryset(MaintenanceBill.objects.filter(
             Q(flat__owner=user) | Q(flat__tenants=user)
-        ).distinct().select_related('flat__owner', 'verified_by')
+        ).distinct())
 
     def perform_create(self, serializer):
         if not self.request.user.is_superuser:
@@ -595,7 +664,7 @@ class MaintenanceBillViewSet(viewsets.ModelViewSet):
             bill = serializer.save()
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=self.request.user,
                 action='create',
                 description=f'Created maintenance bill for flat {bill.flat.flat_number}',
@@ -611,9 +680,24 @@ class MaintenanceBillViewSet(viewsets.ModelViewSet):
                 raise ValidationError(e.message_dict)
             raise ValidationError("Failed to create maintenance bill")
 
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def generate(self, request):
+        """Create a month's bills for all flats, or a filtered set, from billing rules (api.billing)"""
+        if not request.user.is_superuser:
+            raise PermissionDenied("Only administrators can generate maintenance bills")
+        serializer = BillingRunSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        summary = generate_bills(
+            data['bill_month'], data['bill_year'], [BillingRule(**rule) for rule in data['rules']], request.user,
+            flats=serializer.get_flats(), due_date=data.get('due_date'),
+        )
+        return Response(summary, status=status.HTTP_201_CREATED if summary['created'] else status.HTTP_200_OK)
+
 
-class CameraAccessRequestViewSet(viewsets.ModelViewSet):
+class CameraAccessRequestViewSet(ConditionalGetMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = CameraAccessRequestSerializer
+    response_dependencies = [Flat, User]
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -623,11 +707,11 @@ class CameraAccessRequestViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
-            return CameraAccessRequest.objects.all().select_related('requester', 'flat', 'processed_by')
+            return self.optimize_queryset(CameraAccessRequest.objects.all())
 
-        return CameraAccessRequest.objects.filter(
+        return self.optimize_queryset(CameraAccessRequest.objects.filter(
             Q(flat__owner=user) | Q(requester=user) | Q(flat__tenants=user)
-        ).distinct().select_related('requester', 'flat', 'processed_by')
+        ).distinct())
 
     def perform_create(self, serializer):
         # ✅ FIX: Changed from .get('flat') to .get('flat_id') to match the serializer
@@ -647,7 +731,7 @@ class CameraAccessRequestViewSet(viewsets.ModelViewSet):
             camera_request = serializer.save(requester=self.request.user)
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=self.request.user,
                 action='create',
                 description=f'Requested camera access for flat {flat.flat_number}',
@@ -661,36 +745,121 @@ class CameraAccessRequestViewSet(viewsets.ModelViewSet):
             raise ValidationError("Failed to request camera access")
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class ActivityLogViewSet(ConditionalGetMixin, StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Activity log browser with keyset pagination on (timestamp, id).
+    Filters: ?user=<id>&action=<action>&content_type=<app_label.model or id>&object_id=<id>
+    """
+    serializer_class = ActivityLogEntrySerializer
+    # object_repr renders the logged objects
+    response_dependencies = [User, Flat, Vehicle, Complaint, MaintenanceBill, CameraAccessRequest, Notification]
+    permission_classes = [IsAdminUser]
+    pagination_class = KeysetPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        # content_object is resolved with one query per content type on the
+        # page; the querysets below join what each model's __str__ reads
+        queryset = ActivityLog.objects.select_related('user', 'content_type').prefetch_related(
+            GenericPrefetch('content_object', [
+                Flat.objects.all(),
+                Vehicle.objects.select_related('resident'),
+                Complaint.objects.select_related('flat'),
+                MaintenanceBill.objects.select_related('flat'),
+                CameraAccessRequest.objects.select_related('requester', 'flat'),
+                Notification.objects.all(),
+                User.objects.all(),
+            ])
+        )
+        if self.action != 'list':
+            return queryset
+
+        params = self.request.query_params
+        try:
+            if params.get('user'):
+                queryset = queryset.filter(user_id=int(params['user']))
+            if params.get('action'):
+                queryset = queryset.filter(action=params['action'])
+            if params.get('content_type'):
+                queryset = queryset.filter(content_type=self.resolve_content_type(params['content_type']))
+            if params.get('object_id'):
+                queryset = queryset.filter(object_id=int(params['object_id']))
+        except (ValueError, ContentType.DoesNotExist):
+            # ValidationError here is Django's, rebound by the star imports above
+            raise exceptions.ValidationError('Invalid filter value')
+        return queryset
+
+    @staticmethod
+    def resolve_content_type(value):
+        if value.isdigit():
+            return ContentType.objects.get_for_id(int(value))
+        app_label, _, model = value.partition('.')
+        return ContentType.objects.get_by_natural_key(app_label, model.lower())
+
+    @action(detail=False, methods=['get'], url_path=r'timeline/(?P<content_type>[\w.]+)/(?P<object_id>\d+)')
+    def timeline(self, request, content_type=None, object_id=None):
+        """All activity for one object, newest first"""
+        try:
+            ct = self.resolve_content_type(content_type)
+        except ContentType.DoesNotExist:
+            return Response({'error': 'Unknown content type'}, status=404)
+
+        queryset = self.get_queryset().filter(content_type=ct, object_id=int(object_id))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class NotificationViewSet(ConditionalGetMixin, ResponseCacheMixin, FastListMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
+    # Flats decide which audiences a resident belongs to; the user's own read marks render as is_read
+    response_dependencies = [User, Flat]
+    user_response_dependencies = [NotificationRead]
+    # is_expired flips without a write, so entries are kept briefly
+    response_cache_timeout = 60
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['notification_type', 'priority', 'is_active']
+    filterset_fields = ['notification_type', 'priority', 'is_active', 'audience', 'audience_building']
     ordering = ['-created_at']
 
     def get_queryset(self):
         user = self.request.user
+        notifications = Notification.objects.annotate(is_read=is_read_expression(user))
         if user.is_superuser:
-            return Notification.objects.all().select_related('created_by').prefetch_related('recipients', 'read_by')
+            return self.optimize_queryset(notifications)
+
+        # Expired notifications are left out here, before api.expiry deactivates them
+        return self.optimize_queryset(notifications.filter(self.audience_q, live_notifications_q()))
+
+    @cached_property
+    def audience_q(self):
+        # get_queryset() runs more than once per request; look the user's flats up once
+        return notification_audience_q(self.request.user)
 
-        return Notification.objects.filter(
-            Q(recipients=user) | Q(recipients__isnull=True),
-            is_active=True
-        ).distinct().select_related('created_by').prefetch_related('recipients', 'read_by')
+    def get_conditional_aggregates(self, queryset):
+        # is_expired flips when expires_at passes
+        aggregates = super().get_conditional_aggregates(queryset)
+        aggregates['expired'] = Max('expires_at', filter=Q(expires_at__lte=timezone.now()))
+        return aggregates
+
+    def get_fast_annotations(self):
+        return {'is_read': is_read_expression(self.request.user)}
 
     def perform_create(self, serializer):
         if not self.request.user.is_superuser:
             raise PermissionDenied("Only administrators can create notifications")
 
         try:
-            notification = serializer.save(created_by=self.request.user)
-
-            # Add all users as recipients if none specified
-            if not notification.recipients.exists():
-                notification.recipients.set(User.objects.filter(is_active=True))
+            with transaction.atomic():
+                notification = serializer.save(created_by=self.request.user)
+                if notification.send_email or notification.send_sms:
+                    # Committed with the notification; delivery itself runs in deliver_notifications
+                    enqueue_notification(notification)
+                # Recipients are saved by now
+                transaction.on_commit(lambda: announce_notification(notification))
 
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=self.request.user,
                 action='create',
                 description=f'Created notification: {notification.title}',
@@ -703,12 +872,171 @@ class NotificationViewSet(viewsets.ModelViewSet):
             logger.error(f"Error creating notification: {str(e)}")
             raise ValidationError("Failed to create notification")
 
+    def read_changed(self):
+        """The new unread count, also sent to the user's other open streams"""
+        count = unread_count(self.request.user)
+        announce_unread_count(self.request.user, count)
+        return count
+
+    def unread_notifications(self):
+        # Inactive and expired notifications are not counted as unread (api.inbox)
+        return self.get_queryset().filter(live_notifications_q())
+
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark notification as read"""
         notification = self.get_object()
-        notification.read_by.add(request.user)
-        return Response({'status': 'Notification marked as read'})
+        marked = mark_read(request.user, self.unread_notifications().filter(pk=notification.pk))
+        return Response({
+            'status': 'Notification marked as read',
+            'unread_count': self.read_changed() if marked else unread_count(request.user),
+        })
+
+    @action(detail=False, methods=['post'], url_path='mark_read')
+    def mark_read_bulk(self, request):
+        """Mark the notifications listed in ids as read"""
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list of notification ids'}, status=400)
+        try:
+            ids = {int(pk) for pk in ids}
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a non-empty list of notification ids'}, status=400)
+
+        marked = mark_read(request.user, self.unread_notifications().filter(pk__in=ids))
+        return Response({'marked': marked, 'unread_count': self.read_changed() if marked else unread_count(request.user)})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        """Mark every notification created up to `before` (default: now) as read"""
+        try:
+            before = parse_time_filter(request.data.get('before')) or timezone.now()
+        except (TypeError, ValueError):
+            return Response({'error': 'before must be an ISO date or datetime'}, status=400)
+
+        marked = mark_read(request.user, self.unread_notifications().filter(created_at__lte=before))
+        return Response({'marked': marked, 'unread_count': self.read_changed() if marked else unread_count(request.user)})
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Active notifications the user has not read (maintained per user, see api.inbox)"""
+        return Response({'unread_count': unread_count(request.user)})
+
+
+# Prometheus scrape endpoint
+def _metrics_user(request):
+    # A plain Django view: DRF's TokenAuthentication does not run by itself
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None
+    return authenticated[0] if authenticated else request.user
+
+
+def metrics(request):
+    """
+    Metrics in Prometheus text format; open to ALLOWED_IPS (the connecting
+    address, see api.middleware.get_client_ip) and to administrators signed in
+    with a session or an Authorization: Token header.
+    """
+    if get_client_ip(request) not in get_metrics_config()['ALLOWED_IPS'] and not _metrics_user(request).is_superuser:
+        return HttpResponse("Permission denied", status=403)
+    return HttpResponse(
+        metrics_registry.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+# Server-sent event streams (serve through nconnect_backend.asgi, see api.events)
+class StreamTicketView(APIView):
+    """A short-lived ticket for opening event streams: EventSource cannot send the token header"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({
+            'ticket': issue_stream_ticket(request.user),
+            'expires_in': get_event_stream_config()['TICKET_MAX_AGE'],
+        })
+
+
+@sync_to_async
+def _stream_user(token_key=None, ticket=None):
+    if token_key:
+        token = Token.objects.select_related('user').filter(key=token_key).first()
+        user = token.user if token else None
+    else:
+        user_id = stream_ticket_user_id(ticket)
+        user = User.objects.filter(pk=user_id).first() if user_id else None
+    return user if user and user.is_active else None
+
+
+async def _authenticate_stream(request):
+    """Token from the Authorization header, a stream ticket (?ticket=), or the session user"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        return await _stream_user(token_key=header[6:].strip())
+    if request.GET.get('ticket'):
+        return await _stream_user(ticket=request.GET['ticket'])
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def _requires_asgi(request):
+    # Under WSGI the response would hold a worker thread and never send a byte
+    if isinstance(request, ASGIRequest):
+        return None
+    return HttpResponse("Event streams need the ASGI server: python server.py --asgi", status=501)
+
+
+def _event_stream_response(frames):
+    response = StreamingHttpResponse(frames, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def admin_event_stream(request):
+    """Live dashboard deltas: new complaints, paid bills, pending camera requests and stat counter changes"""
+    unavailable = _requires_asgi(request)
+    if unavailable:
+        return unavailable
+    user = await _authenticate_stream(request)
+    if user is None:
+        return HttpResponse("Authentication required", status=401)
+    if not user.is_superuser:
+        return HttpResponse("Permission denied", status=403)
+    return _event_stream_response(stream_subscription(hub.subscribe({'admin'})))
+
+
+async def notification_event_stream(request):
+    """
+    The user's new notifications and unread count changes as they happen.
+    Reconnects resume after Last-Event-ID (or ?cursor=), see api.inbox.
+    """
+    unavailable = _requires_asgi(request)
+    if unavailable:
+        return unavailable
+    user = await _authenticate_stream(request)
+    if user is None:
+        return HttpResponse("Authentication required", status=401)
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return HttpResponse("Invalid cursor", status=400)
+
+    subscription = hub.subscribe(notification_topics(user))
+    try:
+        stream, prelude = await sync_to_async(open_notification_stream)(user, cursor)
+    except BaseException:
+        subscription.close()
+        raise
+    return _event_stream_response(stream_subscription(
+        subscription, prelude, stream.frame,
+        poll=sync_to_async(stream.catch_up), poll_interval=get_inbox_config()['STREAM_POLL_INTERVAL'],
+    ))
 
 
 # PDF Receipt Generation
@@ -730,47 +1058,48 @@ def generate_receipt_pdf(request, bill_id):
         return HttpResponse("Bill not found or not paid", status=404)
 
     # Generate PDF
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-
-    # Header
-    p.setFont("Helvetica-Bold", 20)
-    p.drawString(2 * 72, height - 2 * 72, "N-Connect Society Management")
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(2 * 72, height - 2.5 * 72, "Payment Receipt")
-
-    # Receipt details
-    p.setFont("Helvetica", 12)
-    y = height - 4 * 72
-
-    details = [
-        f"Receipt No: NCR{bill.id:06d}",
-        f"Date: {bill.payment_date.strftime('%d-%b-%Y %I:%M %p') if bill.payment_date else 'N/A'}",
-        f"Flat: {bill.flat.flat_number}",
-        f"Bill Type: {bill.get_bill_type_display()}",
-        f"Bill Period: {bill.bill_month:02d}/{bill.bill_year}",
-        f"Amount: ₹{bill.amount}",
-        f"Late Fee: ₹{bill.late_fee}",
-        f"Discount: ₹{bill.discount}",
-        f"Total Amount: ₹{bill.total_amount}",
-        f"Payment Mode: {bill.get_payment_mode_display() if bill.payment_mode else 'N/A'}",
-        f"Transaction ID: {bill.transaction_id or 'N/A'}",
-        f"Verified By: {bill.verified_by.username if bill.verified_by else 'System'}",
-        f"Verified On: {bill.verified_at.strftime('%d-%b-%Y') if bill.verified_at else 'N/A'}"
-    ]
-
-    for detail in details:
-        p.drawString(2 * 72, y, detail)
-        y -= 20
-
-    # Footer
-    p.setFont("Helvetica-Italic", 10)
-    p.drawString(2 * 72, 2 * 72, "This is a computer-generated receipt.")
-    p.drawString(2 * 72, 1.7 * 72, f"Generated on: {timezone.now().strftime('%d-%b-%Y %I:%M %p')}")
-
-    p.showPage()
-    p.save()
+    with pdf_generation_seconds.time():
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=letter)
+        width, height = letter
+
+        # Header
+        p.setFont("Helvetica-Bold", 20)
+        p.drawString(2 * 72, height - 2 * 72, "N-Connect Society Management")
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(2 * 72, height - 2.5 * 72, "Payment Receipt")
+
+        # Receipt details
+        p.setFont("Helvetica", 12)
+        y = height - 4 * 72
+
+        details = [
+            f"Receipt No: NCR{bill.id:06d}",
+            f"Date: {bill.payment_date.strftime('%d-%b-%Y %I:%M %p') if bill.payment_date else 'N/A'}",
+            f"Flat: {bill.flat.flat_number}",
+            f"Bill Type: {bill.get_bill_type_display()}",
+            f"Bill Period: {bill.bill_month:02d}/{bill.bill_year}",
+            f"Amount: ₹{bill.amount}",
+            f"Late Fee: ₹{bill.late_fee}",
+            f"Discount: ₹{bill.discount}",
+            f"Total Amount: ₹{bill.total_amount}",
+            f"Payment Mode: {bill.get_payment_mode_display() if bill.payment_mode else 'N/A'}",
+            f"Transaction ID: {bill.transaction_id or 'N/A'}",
+            f"Verified By: {bill.verified_by.username if bill.verified_by else 'System'}",
+            f"Verified On: {bill.verified_at.strftime('%d-%b-%Y') if bill.verified_at else 'N/A'}"
+        ]
+
+        for detail in details:
+            p.drawString(2 * 72, y, detail)
+            y -= 20
+
+        # Footer
+        p.setFont("Helvetica-Italic", 10)
+        p.drawString(2 * 72, 2 * 72, "This is a computer-generated receipt.")
+        p.drawString(2 * 72, 1.7 * 72, f"Generated on: {timezone.now().strftime('%d-%b-%Y %I:%M %p')}")
+
+        p.showPage()
+        p.save()
 
     buffer.seek(0)
     response = HttpResponse(buffer, content_type='application/pdf')
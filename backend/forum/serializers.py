@@ -1,26 +1,37 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from api.fieldsets import SparseFieldsetMixin
 from .models import ForumCategory, ForumPost, ForumComment
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name']
 
 
-class ForumCategorySerializer(serializers.ModelSerializer):
+class ForumCategoryStubSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ForumCategory
+        fields = ['id', 'name', 'color']
+
+
+class ForumCategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     posts_count = serializers.SerializerMethodField()
 
     class Meta:
         model = ForumCategory
         fields = ['id', 'name', 'description', 'color', 'is_active', 'posts_count', 'created_at']
+        field_relations = {'posts_count': ['posts']}
 
     def get_posts_count(self, obj):
+        # ForumCategoryViewSet annotates the count; nested categories use the prefetched posts
+        if hasattr(obj, 'posts_count'):
+            return obj.posts_count
         return obj.posts.count()
 
 
-class ForumCommentSerializer(serializers.ModelSerializer):
+class ForumCommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
     vote_score = serializers.ReadOnlyField()
     replies = serializers.SerializerMethodField()
@@ -28,27 +39,34 @@ class ForumCommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ForumComment
         fields = ['id', 'content', 'author', 'vote_score', 'is_edited', 'created_at', 'updated_at', 'replies']
+        field_relations = {
+            'vote_score': ['upvotes', 'downvotes'],
+            'replies': ['replies__author', 'replies__upvotes', 'replies__downvotes'],
+        }
 
     def get_replies(self, obj):
-        if obj.parent is None:
+        if obj.parent_id is None:
             replies = obj.replies.all()[:5]
             return ForumCommentSerializer(replies, many=True).data
         return []
 
 
-class ForumPostSerializer(serializers.ModelSerializer):
+class ForumPostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = AuthorSerializer(read_only=True)
-    category = ForumCategorySerializer(read_only=True)
+    category = ForumCategoryStubSerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
     vote_score = serializers.ReadOnlyField()
     comment_count = serializers.ReadOnlyField()
-    comments = ForumCommentSerializer(many=True, read_only=True)
+    # Comment ids by default; ?expand=comments embeds the comment tree
+    comments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = ForumPost
         fields = ['id', 'title', 'content', 'author', 'category', 'category_id', 'post_type',
                   'is_pinned', 'is_locked', 'vote_score', 'comment_count', 'views',
                   'created_at', 'updated_at', 'comments']
+        expandable_fields = {'category': ForumCategorySerializer, 'comments': ForumCommentSerializer}
+        field_relations = {'vote_score': ['upvotes', 'downvotes'], 'comment_count': ['comments']}
 
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
@@ -0,0 +1,7 @@
+from api.conditional import track_changes
+
+from .models import ForumCategory, ForumComment, ForumPost
+
+
+# Conditional GET validators (api.conditional)
+track_changes(ForumCategory, ForumPost, ForumComment)
@@ -1,3 +1,56 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
 
-# Create your tests here.
+from api.testing import TEST_PASSWORD, QueryBudgetTestCase
+
+from . import urls as forum_urls
+from .models import ForumCategory, ForumComment, ForumPost
+
+
+FORUM_QUERY_BUDGETS = {
+    'forum-category-list': 4,
+    'forum-category-detail': 3,
+    'forum-post-list': 7,
+    'forum-post-detail': 6,
+    'forum-comment-list': 10,
+    'forum-comment-detail': 6,
+    'forum-post-list:expand': 15,
+}
+
+
+class ForumQueryBudgetTests(QueryBudgetTestCase):
+    def seed(self, count):
+        category, _ = ForumCategory.objects.get_or_create(name='General')
+        for _ in range(count):
+            n = ForumPost.objects.count()
+            author = User.objects.create_user(f'poster{n}', f'poster{n}@example.com', TEST_PASSWORD)
+            post = ForumPost.objects.create(
+                title=f'Parking rules {n}', content='Please read the new rules', author=author, category=category
+            )
+            post.upvotes.add(author, self.resident)
+            post.downvotes.add(self.admin)
+            comment = ForumComment.objects.create(post=post, author=author, content='Agreed')
+            comment.upvotes.add(self.resident)
+            reply = ForumComment.objects.create(post=post, author=self.resident, content='Thanks', parent=comment)
+            reply.downvotes.add(author)
+
+    def router_endpoints(self):
+        endpoints = []
+        for prefix, viewset, basename in forum_urls.router.registry:
+            model = viewset.serializer_class.Meta.model
+            endpoints.append((f'{basename}-list', 'resident', lambda b=basename: reverse(f'{b}-list')))
+            endpoints.append((
+                f'{basename}-detail', 'resident',
+                lambda b=basename, m=model: reverse(f'{b}-detail', args=[m.objects.order_by('created_at').last().pk])
+            ))
+        return endpoints
+
+    def test_every_router_endpoint_has_a_budget(self):
+        names = {name for name, role, url in self.router_endpoints()}
+        self.assertEqual(names - set(FORUM_QUERY_BUDGETS), set())
+
+    def test_query_counts_do_not_grow_with_page_size(self):
+        endpoints = self.router_endpoints() + [
+            ('forum-post-list:expand', 'resident', lambda: reverse('forum-post-list') + '?expand=comments,category'),
+        ]
+        self.assertQueryBudgets(endpoints, FORUM_QUERY_BUDGETS)
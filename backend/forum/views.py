@@ -1,7 +1,10 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.contrib.auth.models import User
 from django.db.models import Count
+from api.conditional import ConditionalGetMixin
+from api.fieldsets import SparseFieldsetQuerysetMixin
 from .models import ForumCategory, ForumPost, ForumComment
 from .serializers import ForumCategorySerializer, ForumPostSerializer, ForumCommentSerializer
 
@@ -14,22 +17,27 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             return True
         return obj.author == request.user
 
-class ForumCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ForumCategoryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     A viewset for viewing forum categories.
     """
     queryset = ForumCategory.objects.filter(is_active=True).annotate(posts_count=Count('posts'))
     serializer_class = ForumCategorySerializer
+    response_dependencies = [ForumPost]
     permission_classes = [permissions.IsAuthenticated]
 
-class ForumPostViewSet(viewsets.ModelViewSet):
+class ForumPostViewSet(ConditionalGetMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing forum posts.
     """
-    queryset = ForumPost.objects.all().select_related('author', 'category').prefetch_related('comments', 'upvotes', 'downvotes')
+    queryset = ForumPost.objects.all()
     serializer_class = ForumPostSerializer
+    response_dependencies = [User, ForumCategory, ForumComment]
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
 
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
     def perform_create(self, serializer):
         category_id = self.request.data.get('category_id')
         category = ForumCategory.objects.get(id=category_id)
@@ -60,14 +68,18 @@ class ForumPostViewSet(viewsets.ModelViewSet):
         return Response({'status': 'vote updated', 'score': post.vote_score})
 
 
-class ForumCommentViewSet(viewsets.ModelViewSet):
+class ForumCommentViewSet(ConditionalGetMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing forum comments.
     """
-    queryset = ForumComment.objects.all().select_related('author', 'post')
+    queryset = ForumComment.objects.all()
     serializer_class = ForumCommentSerializer
+    response_dependencies = [User]
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
 
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
     def perform_create(self, serializer):
         post_id = self.request.data.get('post_id')
         post = ForumPost.objects.get(id=post_id)
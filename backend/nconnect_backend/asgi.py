@@ -3,6 +3,11 @@ ASGI config for nconnect_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the server-sent event endpoints (api/admin/events/, api/me/events/)
+through this module, e.g. ``python server.py --asgi``: each open stream is then
+a suspended coroutine on the event loop rather than a blocked worker thread.
+Under WSGI those endpoints answer 501.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 
 # FIXED MIDDLEWARE - Removed problematic AccountMiddleware
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -45,6 +47,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.SecurityMiddleware',
     # Removed: 'allauth.account.middleware.AccountMiddleware',
 ]
 
@@ -108,6 +111,11 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.MessagePackRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -115,6 +123,160 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Reverse proxies whose X-Forwarded-For is believed (api.middleware.get_client_ip).
+# Requests from any other address are identified by REMOTE_ADDR alone.
+TRUSTED_PROXIES = []
+
+# Rate limiting (api.middleware.SecurityMiddleware), per client IP
+# SQLiteBackend shares counters between all processes on one host. For a
+# multi-host deployment use 'api.ratelimit.CacheBackend' on a Redis/Memcached cache.
+RATE_LIMIT = {
+    'BACKEND': 'api.ratelimit.SQLiteBackend',
+    'OPTIONS': {'path': BASE_DIR / 'ratelimit.sqlite3'},
+    'LIMIT': 100,
+    'WINDOW': 60,
+    'COSTS': {
+        'receipt-pdf': 10,
+    },
+}
+
+# Sampling profiler (api.middleware.ProfilingMiddleware). Profiles are stored
+# in collapsed-stack format under DIRECTORY and listed at /api/admin/profiles/
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': 0.01,
+    'SLOW_THRESHOLD': 1.0,
+    'DIRECTORY': BASE_DIR / 'profiles',
+}
+
+# Prometheus metrics at /api/metrics/. Set METRICS_MULTIPROCESS_DIR when
+# running several worker processes (server.py --processes) so a scrape of any
+# one of them reports the sum over all of them. ALLOWED_IPS are matched against
+# the connecting address (see TRUSTED_PROXIES); administrators can also scrape
+# with a session or an Authorization: Token header.
+METRICS = {
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROCESS_DIR'),
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# ActivityLog entries are buffered and bulk-inserted by a background thread
+# (api.activity). STRICT_ACTIONS are always written inside the request.
+ACTIVITY_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'STRICT_ACTIONS': ['password_change'],
+}
+
+# ActivityLog retention (api.archive): rows older than HOT_DAYS are moved into
+# monthly gzip JSONL segments by `manage.py archive_activity_logs`
+ACTIVITY_LOG_RETENTION = {
+    'HOT_DAYS': 90,
+    'CHUNK_SIZE': 5000,
+    'ARCHIVE_DIR': BASE_DIR / 'archive' / 'activity_logs',
+}
+
+# AdminDashboardView snapshot (api.dashboard), refreshed on model signals or after CACHE_TTL seconds
+ADMIN_DASHBOARD = {
+    'CACHE_TTL': 30,
+}
+
+# UserStatusView payload cache (api.user_status). Entries are invalidated by
+# User/UserProfile signals in the process that saved them, so use a shared
+# cache backend when running several processes.
+USER_STATUS = {
+    'CACHE_TIMEOUT': 300,
+    'SESSION_IDLE_TIMEOUT': 30 * 60,
+    'SESSION_UPDATE_INTERVAL': 5 * 60,
+}
+
+# Resident dashboard bootstrap (api.overview): rows returned per collection
+ME_OVERVIEW = {
+    'LIMITS': {
+        'complaints': 20,
+        'bills': 24,
+        'notifications': 30,
+    },
+}
+
+# ETag / Last-Modified on api and forum list and detail endpoints (api.conditional).
+# Model change versions live in the cache; use a shared backend with several processes.
+CONDITIONAL_GET = {
+    'ENABLED': True,
+}
+
+# Rendered list responses of flats, vehicles, complaints, bills and notifications
+# (api.response_cache), keyed on the model versions of api.conditional. Entries
+# are kept in a per-process LRU of MAX_BYTES; name a cache alias in SHARED_CACHE
+# to share them between processes. The versions live in CACHES['default'], so
+# enable this only with a default cache all server processes share (Redis,
+# Memcached, database): with the per-process default, check api.E001 fails.
+RESPONSE_CACHE = {
+    'ENABLED': False,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'TIMEOUT': 300,
+    'SHARED_CACHE': None,
+}
+
+# Pages of at least STREAM_MIN_ROWS rows (activity log with ?page_size=) are
+# serialized and written STREAM_CHUNK_ROWS at a time (api.renderers)
+RENDERERS = {
+    'STREAM_MIN_ROWS': 200,
+    'STREAM_CHUNK_ROWS': 100,
+}
+
+# Per-user unread notification counts (api.inbox), kept in the cache and
+# recounted after UNREAD_COUNT_TIMEOUT seconds or when notifications change.
+# Notification streams check the database after STREAM_POLL_INTERVAL quiet
+# seconds, which delivers notifications saved by other server processes.
+INBOX = {
+    'UNREAD_COUNT_TIMEOUT': 300,
+    'STREAM_POLL_INTERVAL': 10,
+}
+
+# Email/SMS delivery of notifications (api.outbox). Messages are queued in the
+# database and sent by `manage.py deliver_notifications`; RATE_LIMITS are
+# messages per second per channel in each delivery process.
+OUTBOX = {
+    'WORKERS': 2,
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RATE_LIMITS': {'email': 20, 'sms': 5},
+    'SMS_BACKEND': 'api.outbox.ConsoleSMSBackend',
+}
+
+# Notification expiry (api.expiry): `manage.py expire_notifications` deactivates
+# expired notifications in batches of BATCH_SIZE; with --archive it also moves
+# inactive ones older than ARCHIVE_AFTER_DAYS into monthly gzip JSONL segments
+NOTIFICATION_EXPIRY = {
+    'BATCH_SIZE': 1000,
+    'ARCHIVE_AFTER_DAYS': 180,
+    'ARCHIVE_DIR': BASE_DIR / 'archive' / 'notifications',
+}
+
+# Monthly bill generation (api.billing, POST /api/bills/generate/ and
+# `manage.py generate_bills`): flats per chunk and the default due day
+BILLING = {
+    'BATCH_SIZE': 1000,
+    'DUE_DAY': 10,
+}
+
+# values()-based list path for complaints, bills and notifications (api.fastread).
+# Output is identical to the serializers; disable to fall back to them.
+FAST_READ = {
+    'ENABLED': True,
+}
+
+# Server-sent event streams (api.events). They need the ASGI server
+# (python server.py --asgi) and answer 501 under Waitress. Events only reach
+# clients connected to the process that saved the change; serve them from one
+# ASGI process. Browsers open streams with a ?ticket= from api/events/ticket/.
+EVENT_STREAM = {
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE': 15,
+    'TICKET_MAX_AGE': 60,
+}
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
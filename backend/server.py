@@ -1,8 +1,57 @@
+import argparse
+import multiprocessing
+import signal
+import socket
+import sys
+
 from waitress import serve
 from nconnect_backend.wsgi import application
 
+
+def exit_on_sigterm():
+    # Turn SIGTERM into a normal exit so atexit hooks (ActivityLog buffer,
+    # metrics files) get to flush
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def run_worker(sock):
+    exit_on_sigterm()
+    serve(application, sockets=[sock])
+
+
 if __name__ == '__main__':
-    print("🚀 Starting N-Connect with Waitress...")
-    print("📍 Admin: http://127.0.0.1:8000/admin/")
-    print("📍 API: http://127.0.0.1:8000/api/")
-    serve(application, host='127.0.0.1', port=8000)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Worker processes sharing one listening socket')
+    parser.add_argument('--asgi', action='store_true',
+                        help='Serve nconnect_backend.asgi with uvicorn; needed for the event streams')
+    args = parser.parse_args()
+
+    print(f"🚀 Starting N-Connect with {'uvicorn' if args.asgi else 'Waitress'}...")
+    print(f"📍 Admin: http://{args.host}:{args.port}/admin/")
+    print(f"📍 API: http://{args.host}:{args.port}/api/")
+
+    if args.asgi:
+        # Streams are coroutines here; with several processes each one only
+        # pushes events for writes it handled (see api.events)
+        import uvicorn
+        uvicorn.run('nconnect_backend.asgi:application', host=args.host, port=args.port,
+                    workers=args.processes, lifespan='off')
+    elif args.processes == 1:
+        exit_on_sigterm()
+        serve(application, host=args.host, port=args.port)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((args.host, args.port))
+        sock.listen(1024)
+
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=run_worker, args=(sock,)) for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        print(f"📍 Workers: {args.processes}")
+        for worker in workers:
+            worker.join()
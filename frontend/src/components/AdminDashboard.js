@@ -2,6 +2,25 @@ import React, { useState, useEffect } from 'react';
 import API_CONFIG from '../config/apiConfig';
 import './AdminDashboard.css';
 
+// Dashboard counters moved by the stats.changed deltas of each entity and status
+const STAT_COUNTERS = {
+  user: { active: 'total_users' },
+  complaint: { open: 'pending_complaints', in_progress: 'pending_complaints' },
+  camera_request: { pending: 'pending_camera_requests' },
+  vehicle: { active: 'total_vehicles' },
+  notification: { active: 'active_notifications' },
+};
+
+const applyStatChanges = (stats, entity, changes) => {
+  if (!stats) return stats;
+  const next = { ...stats };
+  changes.forEach(({ status, delta }) => {
+    const counter = (STAT_COUNTERS[entity] || {})[status];
+    if (counter) next[counter] = Math.max((next[counter] || 0) + delta, 0);
+  });
+  return next;
+};
+
 const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
   const [activeTab, setActiveTab] = useState('dashboard');
   const [stats, setStats] = useState(null);
@@ -61,20 +80,132 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
     notification_type: 'general'
   });
 
-  // Auto-refresh data every 30 seconds
+  // Set when the server cannot stream events (501 without the ASGI server)
+  const [pollFallback, setPollFallback] = useState(false);
+
+  // Auto-refresh data every 30 seconds, only when there is no event stream
   useEffect(() => {
+    if (!pollFallback) return undefined;
     const interval = setInterval(() => {
+      loadDashboardStats();
       loadActiveTabData();
     }, 30000);
 
     return () => clearInterval(interval);
-  }, [activeTab]);
+  }, [activeTab, pollFallback]);
 
   useEffect(() => {
     loadDashboardData();
     loadActiveTabData();
   }, [activeTab, token]);
 
+  useEffect(() => {
+    // The admin stream carries new complaints, paid bills, pending camera
+    // requests and counter deltas. It opens with a short-lived ticket, so
+    // each reconnect asks for a new one and reloads what it may have missed.
+    let events = null;
+    let retry = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const connect = async () => {
+      let url;
+      try {
+        const response = await fetch(`${API_CONFIG.BASE_URL}/events/ticket/`, { method: 'POST', headers: API_CONFIG.getHeaders(token) });
+        if (!response.ok) throw new Error(`ticket request failed: ${response.status}`);
+        const { ticket } = await response.json();
+        url = `${API_CONFIG.BASE_URL}/admin/events/?ticket=${encodeURIComponent(ticket)}`;
+      } catch (error) {
+        console.error('Error opening admin event stream:', error);
+        retry = setTimeout(connect, 30000);
+        return;
+      }
+      if (closed) return;
+
+      let opened = false;
+      events = new EventSource(url);
+      events.onopen = () => {
+        opened = true;
+        if (reconnecting) loadDashboardData();
+        reconnecting = false;
+      };
+      events.addEventListener('complaint.created', (event) => {
+        const { id } = JSON.parse(event.data);
+        loadNewRow(`complaints/${id}/`, setComplaints);
+      });
+      events.addEventListener('camera_request.pending', (event) => {
+        const { id } = JSON.parse(event.data);
+        loadNewRow(`camera-requests/${id}/`, setCameraRequests);
+      });
+      events.addEventListener('bill.paid', (event) => {
+        const { id } = JSON.parse(event.data);
+        setBills(prev => prev.map(bill => bill.id === id ? { ...bill, status: 'paid' } : bill));
+      });
+      events.addEventListener('stats.changed', (event) => {
+        const { entity, changes } = JSON.parse(event.data);
+        // Overdue bills depend on due dates as well, so take a fresh snapshot
+        if (entity === 'bill') {
+          loadDashboardStats();
+          return;
+        }
+        setStats(prev => applyStatChanges(prev, entity, changes));
+      });
+      events.addEventListener('resync', () => loadDashboardData());
+      events.onerror = async () => {
+        events.close();
+        if (closed) return;
+        if (!opened) {
+          // EventSource hides the status code: ask once whether this server can stream at all
+          const probe = new AbortController();
+          try {
+            const response = await fetch(url, { signal: probe.signal });
+            probe.abort();
+            if (response.status === 501) {
+              setPollFallback(true);
+              return;
+            }
+          } catch (error) {
+            console.error('Error probing admin event stream:', error);
+          }
+        }
+        reconnecting = true;
+        retry = setTimeout(connect, opened ? 5000 : 30000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (events) events.close();
+    };
+  }, [token]);
+
+  const loadNewRow = async (path, setter) => {
+    try {
+      const response = await fetch(`${API_CONFIG.BASE_URL}/${path}`, {
+        headers: API_CONFIG.getHeaders(token)
+      });
+      if (!response.ok) return;
+      const row = await response.json();
+      setter(prev => prev.some(item => item.id === row.id) ? prev : [row, ...prev]);
+    } catch (error) {
+      console.error(`Error loading ${path}:`, error);
+    }
+  };
+
+  const loadDashboardStats = async () => {
+    try {
+      const response = await fetch(`${API_CONFIG.BASE_URL}/admin/dashboard/`, {
+        headers: API_CONFIG.getHeaders(token)
+      });
+      const data = await response.json();
+      setStats(data.stats || null);
+    } catch (error) {
+      console.error('Error loading dashboard stats:', error);
+    }
+  };
+
   const loadActiveTabData = () => {
     switch (activeTab) {
       case 'users':
@@ -107,6 +238,7 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
     try {
       // Load all data for dashboard stats
       await Promise.all([
+        loadDashboardStats(),
         loadUsers(),
         loadFlats(),
         loadVehicles(),
@@ -366,7 +498,7 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
           message: notificationForm.message,
           priority: notificationForm.priority,
           notification_type: notificationForm.notification_type,
-          recipients: users.map(u => u.id)
+          audience: 'all'
         })
       });
 
@@ -529,7 +661,7 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
     (filterStatus === '' || bill.status === filterStatus)
   );
 
-  // Calculate stats for dashboard
+  // Calculate stats for dashboard; the server's snapshot wins once it has loaded
   const stats_calculated = {
     total_users: users.length,
     total_flats: flats.length,
@@ -539,7 +671,8 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
     overdue_bills: bills.filter(b => b.status === 'overdue').length,
     pending_camera_requests: cameraRequests.filter(r => r.status === 'pending').length,
     active_notifications: notifications.length,
-    total_revenue: bills.reduce((total, bill) => total + parseFloat(bill.amount || '0'), 0)
+    total_revenue: bills.reduce((total, bill) => total + parseFloat(bill.amount || '0'), 0),
+    ...(stats || {})
   };
 
   return (
@@ -1495,7 +1628,9 @@ const AdminDashboard = ({ token, username, userStatus, onLogout }) => {
                             <div className="notification-meta">
                               <span>📅 Sent: {new Date(notification.created_at).toLocaleDateString()}</span>
                               <span>👤 By: {notification.created_by.username}</span>
-                              <span>👥 Recipients: {notification.recipients.length}</span>
+                              <span>👥 Audience: {notification.audience === 'users'
+                                ? `${notification.recipients.length} selected users`
+                                : [notification.audience, notification.audience_building, notification.audience_floor != null && `floor ${notification.audience_floor}`].filter(Boolean).join(' · ')}</span>
                             </div>
                           </div>
                           <div className="notification-badges">
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import API_CONFIG from '../config/apiConfig';
 import {
   FaChartBar, FaHome, FaClipboardList, FaMoneyBillAlt, FaCar,
@@ -10,6 +10,8 @@ import {
 } from 'react-icons/fa';
 import './UserDashboard.css'; // Your updated CSS file
 
+const TABS = ['dashboard', 'flats', 'complaints', 'bills', 'vehicles', 'camera-requests', 'notifications', 'profile'];
+
 const UserDashboard = ({ token, username, userStatus, onLogout }) => {
   const getTabFromHash = () => window.location.hash.replace('#', '') || 'dashboard';
 
@@ -20,6 +22,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
   const [bills, setBills] = useState([]);
   const [cameraRequests, setCameraRequests] = useState([]);
   const [notifications, setNotifications] = useState([]);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [loading, setLoading] = useState(false);
 
   // Sidebar now starts closed by default
@@ -31,29 +34,37 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
   const [cameraRequestForm, setCameraRequestForm] = useState({ reason: '', requested_date: '', duration_hours: 1, flat_id: '' });
   const [profileForm, setProfileForm] = useState({ first_name: userStatus?.first_name || '', last_name: userStatus?.last_name || '', email: userStatus?.email || '', phone: '', emergency_contact: '', emergency_contact_name: '' });
   const [searchTerm, setSearchTerm] = useState('');
+  const streamOpen = useRef(false);
+
+  const overviewTag = useRef('');
 
-  const loadActiveTabData = useCallback(() => {
-    const currentTab = getTabFromHash();
-    switch (currentTab) {
-      case 'dashboard':
-        loadFlats();
-        loadComplaints();
-        loadBills();
-        loadNotifications();
-        break;
-      case 'flats': loadFlats(); break;
-      case 'vehicles': loadVehicles(); break;
-      case 'complaints': loadComplaints(); break;
-      case 'bills': loadBills(); break;
-      case 'camera-requests': loadCameraRequests(); break;
-      case 'notifications': loadNotifications(); break;
-      default:
-        if (currentTab !== 'dashboard') {
-          window.location.hash = 'dashboard';
-        }
-        break;
+  // Every tab shows part of one overview, revalidated with its ETag so an unchanged
+  // one comes back as an empty 304. The unread count arrives over the event stream
+  // while it is open, so refreshes can skip it
+  const loadOverview = useCallback(async (withUnreadCount = true) => {
+    if (!TABS.includes(getTabFromHash())) {
+      window.location.hash = 'dashboard';
+      return;
+    }
+    if (withUnreadCount) loadUnreadCount();
+    try {
+      const headers = API_CONFIG.getHeaders(token);
+      if (overviewTag.current) headers['If-None-Match'] = overviewTag.current;
+      const response = await fetch(`${API_CONFIG.BASE_URL}/me/overview/`, { headers });
+      if (response.status === 304) return;
+      if (!response.ok) throw new Error(`overview request failed: ${response.status}`);
+      const overview = await response.json();
+      overviewTag.current = response.headers.get('ETag') || '';
+      setFlats(overview.flats.results);
+      setVehicles(overview.vehicles.results);
+      setComplaints(overview.complaints.results);
+      setBills(overview.bills.results);
+      setCameraRequests(overview.camera_requests.results);
+      setNotifications(overview.notifications.results);
+    } catch (error) {
+      console.error('Error loading overview:', error);
     }
-  }, [token, username, userStatus]);
+  }, [token]);
 
   useEffect(() => {
     const handleHashChange = () => setActiveTab(getTabFromHash());
@@ -62,13 +73,68 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
   }, []);
 
   useEffect(() => {
-    loadActiveTabData();
-  }, [activeTab, loadActiveTabData]);
+    loadOverview();
+  }, [activeTab, loadOverview]);
 
   useEffect(() => {
-    const interval = setInterval(loadActiveTabData, 30000); // Auto-refresh data
+    const interval = setInterval(() => {
+      if (!document.hidden) loadOverview(!streamOpen.current); // Auto-refresh data
+    }, 30000);
     return () => clearInterval(interval);
-  }, [loadActiveTabData]);
+  }, [loadOverview]);
+
+  useEffect(() => {
+    // Streams open with a short-lived ticket rather than the token, so each
+    // reconnect asks for a new one and resumes from the last event id seen.
+    // While the stream is down the 30s refresh polls the unread count as well.
+    let events = null;
+    let retry = null;
+    let cursor = '';
+    let closed = false;
+
+    const connect = async () => {
+      try {
+        const response = await fetch(`${API_CONFIG.BASE_URL}/events/ticket/`, { method: 'POST', headers: API_CONFIG.getHeaders(token) });
+        if (!response.ok) throw new Error(`ticket request failed: ${response.status}`);
+        const { ticket } = await response.json();
+        if (closed) return;
+        events = new EventSource(`${API_CONFIG.BASE_URL}/me/events/?ticket=${encodeURIComponent(ticket)}&cursor=${cursor}`);
+      } catch (error) {
+        console.error('Error opening notification stream:', error);
+        retry = setTimeout(connect, 30000);
+        return;
+      }
+      events.addEventListener('notification', (event) => {
+        cursor = event.lastEventId || cursor;
+        const notification = JSON.parse(event.data);
+        setNotifications(prev => prev.some(n => n.id === notification.id) ? prev : [notification, ...prev]);
+      });
+      events.addEventListener('unread_count', (event) => {
+        cursor = event.lastEventId || cursor;
+        setUnreadCount(JSON.parse(event.data).unread_count);
+      });
+      events.addEventListener('resync', (event) => {
+        cursor = event.lastEventId || cursor;
+        loadOverview();
+      });
+      events.onopen = () => { streamOpen.current = true; };
+      events.onerror = () => {
+        // A server without the ASGI stream answers 501: retry slowly and keep polling
+        const wasOpen = streamOpen.current;
+        streamOpen.current = false;
+        events.close();
+        retry = setTimeout(connect, wasOpen ? 5000 : 30000);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      streamOpen.current = false;
+      clearTimeout(retry);
+      if (events) events.close();
+    };
+  }, [token]);
 
   useEffect(() => {
     if (flats.length > 0) {
@@ -77,23 +143,16 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     }
   }, [flats]);
 
-  const fetchData = async (url, setter) => {
+  const loadUnreadCount = async () => {
     try {
-      const response = await fetch(url, { headers: API_CONFIG.getHeaders(token) });
+      const response = await fetch(`${API_CONFIG.BASE_URL}/notifications/unread_count/`, { headers: API_CONFIG.getHeaders(token) });
       const data = await response.json();
-      setter(Array.isArray(data) ? data : data.results || []);
+      setUnreadCount(data.unread_count || 0);
     } catch (error) {
-      console.error(`Error loading data from ${url}:`, error);
+      console.error('Error loading unread notification count:', error);
     }
   };
 
-  const loadFlats = () => fetchData(`${API_CONFIG.BASE_URL}/flats/?resident=${userStatus.id}`, setFlats);
-  const loadVehicles = () => fetchData(`${API_CONFIG.BASE_URL}/vehicles/?resident__username=${username}`, setVehicles);
-  const loadComplaints = () => fetchData(`${API_CONFIG.BASE_URL}/complaints/?author__username=${username}`, setComplaints);
-  const loadBills = () => fetchData(`${API_CONFIG.BASE_URL}/bills/?flat__owner__username=${username}`, setBills);
-  const loadCameraRequests = () => fetchData(`${API_CONFIG.BASE_URL}/camera-requests/?requester__username=${username}`, setCameraRequests);
-  const loadNotifications = () => fetchData(`${API_CONFIG.BASE_URL}/notifications/`, setNotifications);
-
   const postFormData = async (url, formData, onSuccess, method = 'POST') => {
     setLoading(true);
     const headers = API_CONFIG.getHeaders(token);
@@ -120,7 +179,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     postFormData(`${API_CONFIG.BASE_URL}/complaints/`, formData, () => {
       alert('Complaint submitted successfully!');
       setComplaintForm({ title: '', description: '', priority: 'medium', category: 'maintenance', flat_id: flats.length > 0 ? flats[0].id : '' });
-      loadComplaints();
+      loadOverview();
     });
   };
 
@@ -131,7 +190,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     postFormData(`${API_CONFIG.BASE_URL}/vehicles/`, formData, () => {
       alert('Vehicle registered successfully!');
       setVehicleForm({ vehicle_number: '', vehicle_type: 'car', brand: '', color: '' });
-      loadVehicles();
+      loadOverview();
     });
   };
 
@@ -142,7 +201,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     postFormData(`${API_CONFIG.BASE_URL}/camera-requests/`, formData, () => {
       alert('Camera access request submitted successfully!');
       setCameraRequestForm({ reason: '', requested_date: '', duration_hours: 1, flat_id: flats.length > 0 ? flats[0].id : '' });
-      loadCameraRequests();
+      loadOverview();
     });
   };
 
@@ -161,13 +220,14 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     formData.append('payment_date', new Date().toISOString());
     postFormData(`${API_CONFIG.BASE_URL}/bills/${billId}/`, formData, () => {
       alert('Bill payment processed successfully!');
-      loadBills();
+      loadOverview();
     }, 'PATCH');
   };
 
   const markNotificationAsRead = async (notificationId) => {
     try {
       setNotifications(notifications.map(n => n.id === notificationId ? { ...n, is_read: true } : n));
+      setUnreadCount(count => Math.max(count - 1, 0));
       await fetch(`${API_CONFIG.BASE_URL}/notifications/${notificationId}/mark_read/`, {
         method: 'POST',
         headers: API_CONFIG.getHeaders(token)
@@ -177,6 +237,20 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     }
   };
 
+  const markAllNotificationsAsRead = async () => {
+    try {
+      const response = await fetch(`${API_CONFIG.BASE_URL}/notifications/mark_all_read/`, {
+        method: 'POST',
+        headers: API_CONFIG.getHeaders(token)
+      });
+      const data = await response.json();
+      setNotifications(notifications.map(n => ({ ...n, is_read: true })));
+      setUnreadCount(data.unread_count || 0);
+    } catch (error) {
+      console.error('Error marking notifications as read:', error);
+    }
+  };
+
   const filteredComplaints = complaints.filter(c => c.title.toLowerCase().includes(searchTerm.toLowerCase()) || c.category.toLowerCase().includes(searchTerm.toLowerCase()));
   const filteredBills = bills.filter(b => b.bill_type.toLowerCase().includes(searchTerm.toLowerCase()));
   const filteredNotifications = notifications.filter(n => n.title.toLowerCase().includes(searchTerm.toLowerCase()) || n.message.toLowerCase().includes(searchTerm.toLowerCase()));
@@ -188,7 +262,8 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
     total_bills: bills.length,
     unpaid_bills: bills.filter(b => b.status !== 'paid').length,
     total_vehicles: vehicles.length,
-    unread_notifications: notifications.filter(n => !n.is_read).length
+    // Counted by the server; the list only holds the first page
+    unread_notifications: unreadCount
   };
 
   const handleTabClick = (tabId) => {
@@ -372,8 +447,8 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
                           {flat.area_sqft && <div className="info-item"><span><FaRulerCombined /></span><span>Area: {flat.area_sqft} sq ft</span></div>}
                           {flat.monthly_rent && <div className="info-item"><span><FaMoneyBillAlt /></span><span>Rent: ₹{flat.monthly_rent}/month</span></div>}
                           <div className="ownership-info">
-                            {flat.owner && <div className="info-item owner"><span><FaUserCircle /></span><span>Owner: {flat.owner.username}</span></div>}
-                            {flat.tenants && flat.tenants.length > 0 && <div className="info-item tenants"><span><FaUsers /></span><span>Tenants: {flat.tenants.map(t => t.username).join(', ')}</span></div>}
+                            {flat.owner_username && <div className="info-item owner"><span><FaUserCircle /></span><span>Owner: {flat.owner_username}</span></div>}
+                            {flat.tenants && flat.tenants.length > 0 && <div className="info-item tenants"><span><FaUsers /></span><span>Tenants: {flat.tenants.join(', ')}</span></div>}
                           </div>
                         </div>
                       </div>
@@ -493,7 +568,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
                             <h4>{bill.bill_type.charAt(0).toUpperCase() + bill.bill_type.slice(1)} Bill</h4>
                             <p className="bill-amount">₹{bill.amount}</p>
                             <div className="bill-meta">
-                              <span><FaHome /> Flat {bill.flat.flat_number}</span>
+                              <span><FaHome /> Flat {bill.flat_number}</span>
                               <span><FaCalendarAlt /> Period: {String(bill.bill_month).padStart(2, '0')}/{bill.bill_year}</span>
                               <span><FaClock /> Due: {new Date(bill.due_date).toLocaleDateString()}</span>
                               {bill.payment_date && <span><FaCheckCircle /> Paid: {new Date(bill.payment_date).toLocaleDateString()}</span>}
@@ -634,7 +709,7 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
                       <div key={request.id} className="request-item">
                         <div className="request-header">
                           <div className="request-info">
-                            <h4>Camera Access for Flat {request.flat.flat_number}</h4>
+                            <h4>Camera Access for Flat {request.flat_number}</h4>
                             <p>{request.reason}</p>
                             <div className="request-meta">
                               <span><FaCalendarAlt /> Date: {new Date(request.requested_date).toLocaleDateString()}</span>
@@ -672,6 +747,9 @@ const UserDashboard = ({ token, username, userStatus, onLogout }) => {
               </div>
               <div className="content-card">
                 <h3 className="card-title">All Notifications ({filteredNotifications.length})</h3>
+                {unreadCount > 0 && (
+                  <button onClick={markAllNotificationsAsRead} className="primary-btn">Mark all as read</button>
+                )}
                 {filteredNotifications.length === 0 ? (
                   <div className="empty-state">
                     <div className="empty-icon"><FaBell /></div>